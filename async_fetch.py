@@ -0,0 +1,351 @@
+import asyncio
+from collections import defaultdict
+import gzip
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import queue
+import threading
+import time
+from typing import Callable, Iterable, Optional
+from unittest import TestCase
+from urllib.parse import urlsplit
+
+import httpx
+
+import logger
+from logger import Level
+from html_cache import HtmlCache
+from page_states import (
+    UNCHANGED,
+    PageStates,
+    conditional_headers,
+    is_unchanged,
+    page_state,
+)
+from static_html import extract_fields_from_html
+from test_utils import test_setup
+from utils.worker_pool import progress_message
+
+try:
+    import h2  # noqa: F401, httpx only speaks HTTP/2 when h2 is installed
+
+    _HTTP2_AVAILABLE = True
+except ImportError:
+    _HTTP2_AVAILABLE = False
+
+_USER_AGENT = "Mozilla/5.0 (X11; Linux x86_64; rv:94.0) Gecko/20100101 Firefox/94.0"
+
+
+class AsyncFetcher:
+    """
+    Keep-alive connection pool over httpx with a cap on concurrent requests per host.
+    Bodies are read as a stream and decompressed chunk by chunk, so max_bytes can stop
+    an oversized page without holding it in memory.
+    """
+
+    def __init__(
+        self,
+        max_connections=200,
+        per_host=16,
+        timeout=30.0,
+        max_bytes=5 * 1024 * 1024,
+        http2=True,
+    ):
+        self.per_host = per_host
+        self.max_bytes = max_bytes
+        self._host_limits = defaultdict(lambda: asyncio.Semaphore(self.per_host))
+        self._client = httpx.AsyncClient(
+            http2=http2 and _HTTP2_AVAILABLE,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+            ),
+            timeout=timeout,
+            headers={"User-Agent": _USER_AGENT},
+            follow_redirects=True,
+        )
+
+    async def fetch(self, url) -> str:
+        return (await self.fetch_page(url))[0]
+
+    async def fetch_page(self, url, headers=None):
+        """
+        Returns (page html, response headers), the html is None when conditional headers
+        got a 304 Not Modified back.
+        """
+        async with self._host_limits[urlsplit(url).netloc]:
+            async with self._client.stream("GET", url, headers=headers) as response:
+                if response.status_code == 304:
+                    return None, response.headers
+                response.raise_for_status()
+                body = bytearray()
+                async for chunk in response.aiter_bytes():
+                    body += chunk
+                    if len(body) > self.max_bytes:
+                        raise ValueError("Response body too large: " + url)
+                encoding = response.encoding or "utf-8"
+        return body.decode(encoding, errors="replace"), response.headers
+
+    async def close(self):
+        await self._client.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+        return False
+
+
+async def gather_coaches(
+    coach_scraper,
+    source_urls: Iterable[str],
+    handle_result: Callable[[str, object, object], None],
+    in_flight=200,
+    per_host=16,
+    timeout=30.0,
+    total: Optional[int] = None,
+    progress_seconds=30.0,
+    page_states: Optional[PageStates] = None,
+    html_cache: Optional[HtmlCache] = None,
+):
+    """
+    Fetches up to in_flight profile pages at once and runs each body through
+    coach_scraper.gather_coach_data(source_url, data=...). Caching, parsing and gathering
+    a page run in worker threads so the event loop only ever waits on the network, and
+    results go through a queue to one writer thread calling handle_result(source_url,
+    coach_data, state). coach_data is None when the fetch or the gather failed. Returns
+    the number of coaches gathered. Should handle_result raise, the crawl stops and the
+    error is raised here.
+
+    With page_states, pages stored before are fetched conditionally. A page the server
+    reports not modified, or whose extracted fields hash the same, isn't gathered and
+    handle_result gets UNCHANGED instead. state is the page's new state, handle_result sets
+    it once the coach is stored. Every fetched page is also put in html_cache when given.
+    """
+    log = logger.get_logger()
+    urls = iter(source_urls)
+    done = 0
+    succeeded = 0
+    start = time.monotonic()
+    last_progress = start
+    results = queue.Queue()
+    writer_errors = []
+
+    def write_results():
+        while True:
+            result = results.get()
+            if result is None:
+                return
+            if writer_errors:
+                continue
+            try:
+                handle_result(*result)
+            except BaseException as e:
+                writer_errors.append(e)
+
+    def process_page(source_url, page_html, headers, previous):
+        if html_cache is not None:
+            html_cache.put(source_url, page_html)
+        fields = extract_fields_from_html(
+            page_html, coach_scraper.FIELDS, base_url=source_url
+        )
+        state = page_state(headers, fields)
+        if is_unchanged(previous, state):
+            return UNCHANGED, state
+        return coach_scraper.gather_coach_data(source_url, data=fields), state
+
+    writer = threading.Thread(target=write_results, name="gather-writer", daemon=True)
+    writer.start()
+    try:
+        async with AsyncFetcher(
+            max_connections=in_flight, per_host=per_host, timeout=timeout
+        ) as fetcher:
+
+            async def work():
+                nonlocal done, succeeded, last_progress
+                # Workers share the iterator, safe since the loop is single threaded.
+                for source_url in urls:
+                    if writer_errors:
+                        return
+                    coach_data = None
+                    state = None
+                    try:
+                        previous = page_states.get(source_url) if page_states else None
+                        page_html, headers = await fetcher.fetch_page(
+                            source_url, conditional_headers(previous)
+                        )
+                        if page_html is None:
+                            coach_data, state = UNCHANGED, previous
+                        else:
+                            coach_data, state = await asyncio.to_thread(
+                                process_page, source_url, page_html, headers, previous
+                            )
+                    except Exception as e:
+                        # Any page that can't be fetched, parsed or gathered only fails itself.
+                        log.log(
+                            "Could not fetch coach page: " + source_url + " " + repr(e),
+                            Level.ERROR,
+                        )
+                    results.put((source_url, coach_data, state))
+                    done += 1
+                    if coach_data is not None:
+                        succeeded += 1
+
+                    now = time.monotonic()
+                    if now - last_progress >= progress_seconds:
+                        last_progress = now
+                        log.log(
+                            progress_message(
+                                "Coaches", done, succeeded, total, now - start
+                            ),
+                            Level.SUMMARY,
+                        )
+
+            await asyncio.gather(*(work() for _ in range(in_flight)))
+    finally:
+        results.put(None)
+        await asyncio.to_thread(writer.join)
+    if writer_errors:
+        raise writer_errors[0]
+
+    log.log(
+        progress_message("Coaches", done, succeeded, total, time.monotonic() - start),
+        Level.SUMMARY,
+    )
+    return succeeded
+
+
+def fetch_and_gather(coach_scraper, source_urls, handle_result, **kwargs):
+    return asyncio.run(
+        gather_coaches(coach_scraper, source_urls, handle_result, **kwargs)
+    )
+
+
+class _CountingHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    lock = threading.Lock()
+    active = 0
+    peak = 0
+
+    def do_GET(self):
+        cls = type(self)
+        with cls.lock:
+            cls.active += 1
+            cls.peak = max(cls.peak, cls.active)
+        time.sleep(0.05)
+        with cls.lock:
+            cls.active -= 1
+
+        body = gzip.compress(("<html><body>" + self.path + "</body></html>").encode())
+        if self.path.startswith("/large"):
+            body = gzip.compress(b"x" * 4096)
+        if self.path.startswith("/empty"):
+            body = gzip.compress(b"")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _TestServer(ThreadingHTTPServer):
+    # The default backlog of 5 drops connections past it, their retries take a second.
+    request_queue_size = 128
+
+
+class _TestAsyncFetcher(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.SERVER = _TestServer(("127.0.0.1", 0), _CountingHandler)
+        threading.Thread(target=cls.SERVER.serve_forever, daemon=True).start()
+        cls.BASE_URL = "http://127.0.0.1:" + str(cls.SERVER.server_address[1])
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.SERVER.shutdown()
+        cls.SERVER.server_close()
+
+    def setUp(self):
+        test_setup()
+        _CountingHandler.peak = 0
+
+    def test_fetch_decompresses(self):
+        async def fetch():
+            async with AsyncFetcher() as fetcher:
+                return await fetcher.fetch(self.BASE_URL + "/coach")
+
+        self.assertEqual(asyncio.run(fetch()), "<html><body>/coach</body></html>")
+
+    def test_per_host_cap(self):
+        async def fetch_all():
+            async with AsyncFetcher(per_host=3) as fetcher:
+                return await asyncio.gather(
+                    *(fetcher.fetch(self.BASE_URL + "/" + str(i)) for i in range(12))
+                )
+
+        bodies = asyncio.run(fetch_all())
+        self.assertEqual(len(bodies), 12)
+        self.assertLessEqual(_CountingHandler.peak, 3)
+        self.assertGreater(_CountingHandler.peak, 1)
+
+    def test_max_bytes(self):
+        async def fetch():
+            async with AsyncFetcher(max_bytes=1024) as fetcher:
+                return await fetcher.fetch(self.BASE_URL + "/large")
+
+        with self.assertRaises(ValueError):
+            asyncio.run(fetch())
+
+    def test_failed_pages_do_not_stop_the_crawl(self):
+        # Imported here, the scraper imports this module.
+        from sites.life_coach_school.lcs_scraper import LifeCoachSchoolCoachScraper
+
+        results = {}
+        # Empty bodies can't be parsed, the profiles without a coach can't be gathered.
+        urls = [self.BASE_URL + "/empty/" + str(i) for i in range(10)]
+        urls += [self.BASE_URL + "/coach/" + str(i) for i in range(10)]
+        start = time.monotonic()
+        gathered = asyncio.run(
+            gather_coaches(
+                LifeCoachSchoolCoachScraper(None, extract_in_browser=False),
+                urls,
+                lambda source_url, coach_data, state: results.__setitem__(
+                    source_url, coach_data
+                ),
+                in_flight=20,
+                per_host=20,
+            )
+        )
+        self.assertEqual(gathered, 0)
+        self.assertEqual(sorted(results), sorted(urls))
+        self.assertTrue(all(coach_data is None for coach_data in results.values()))
+        # Failed gathers don't sleep between tries they won't make.
+        self.assertLess(time.monotonic() - start, 2.0)
+
+    def test_slow_pages_do_not_stall_the_loop(self):
+        class _SlowScraper:
+            FIELDS = {}
+
+            def gather_coach_data(self, source_url, data=None):
+                time.sleep(0.3)
+                return source_url
+
+        writer_threads = set()
+
+        def handle_result(source_url, coach_data, state):
+            writer_threads.add(threading.current_thread())
+
+        urls = [self.BASE_URL + "/coach/" + str(i) for i in range(10)]
+        start = time.monotonic()
+        gathered = fetch_and_gather(
+            _SlowScraper(), urls, handle_result, in_flight=10, per_host=10
+        )
+        self.assertEqual(gathered, 10)
+        # Ten gathers of 0.3s one after the other would take 3s.
+        self.assertLess(time.monotonic() - start, 1.5)
+        self.assertEqual(len(writer_threads), 1)
+        self.assertIsNot(writer_threads.pop(), threading.main_thread())
@@ -0,0 +1,46 @@
+"""
+CoachData constructions per second with the logger at SUMMARY and at DETAIL_PLUS, the
+messages go to os.devnull so only building and filtering them is measured.
+
+Run from the repository root: python -m benchmarks.coach_data_logging [constructions]
+"""
+
+import os
+import sys
+import time
+
+import logger
+from logger import Level
+from coach.data import CoachData, CoachCert
+
+
+def _constructions_per_second(count):
+    start = time.perf_counter()
+    for i in range(count):
+        CoachData(
+            source_url="http://coachdir.com/coach/" + str(i),
+            full_name="Coach Middle Bench",
+            first_name="Coach",
+            last_name="Bench",
+            coach_cert=CoachCert.LIFE,
+            niche_description="Coach, Bench, Things",
+            website_url="coachbench.com",
+            email="coach.bench@coachbench.com",
+            phone="(555) 555-0100",
+            instagram_url="@coachbench",
+            linkedin_url="https://www.linkedin.com/in/coachbench/",
+        )
+    return count / (time.perf_counter() - start)
+
+
+def main(count=20000):
+    with open(os.devnull, "w") as devnull:
+        logger.initialize_logger(Level.SUMMARY, log_file=devnull)
+        for level in (Level.SUMMARY, Level.DETAIL_PLUS):
+            logger.get_logger().log_level = level
+            rate = _constructions_per_second(count)
+            print("{:12}: {:>10,.0f} CoachData/s".format(level.name, rate))
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,59 @@
+"""
+Memory and pickled bytes per CoachData held in a list, and constructions per second, with
+the logger at SUMMARY (records are logged to os.devnull).
+
+Run from the repository root: python -m benchmarks.coach_data_size [records]
+"""
+
+import os
+import pickle
+import sys
+import time
+import tracemalloc
+
+import logger
+from logger import Level
+from coach.data import CoachData, CoachCert
+
+
+def _coaches(count):
+    return [
+        CoachData(
+            source_url="http://coachdir.com/coach/" + str(i),
+            full_name="Coach Middle Bench",
+            first_name="Coach",
+            last_name="Bench",
+            coach_cert=CoachCert.LIFE,
+            niche_description="Coach, Bench, Things",
+            website_url="coachbench.com",
+            email="coach.bench@coachbench.com",
+            phone="(555) 555-0100",
+            instagram_url="@coachbench",
+        )
+        for i in range(count)
+    ]
+
+
+def main(count=50000):
+    with open(os.devnull, "w") as devnull:
+        logger.initialize_logger(Level.SUMMARY, log_file=devnull)
+
+        start = time.perf_counter()
+        _coaches(count)
+        rate = count / (time.perf_counter() - start)
+
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        coaches = _coaches(count)
+        held = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+
+        pickled = sum(len(pickle.dumps(coach)) for coach in coaches)
+
+    print("constructions: {:>10,.0f} CoachData/s".format(rate))
+    print("in memory:     {:>10,.0f} bytes/record".format(held / count))
+    print("pickled:       {:>10,.0f} bytes/record".format(pickled / count))
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,59 @@
+"""
+Rows per second of the per-row write_coach_to_csv against a CoachCsvWriter session.
+
+Run from the repository root: python -m benchmarks.csv_writer [rows]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from coach.data import CoachData, CoachCert
+from coach.data_writer import CoachCsvWriter, write_coach_to_csv
+from test_utils import test_setup
+
+
+def _coaches(count):
+    coach = CoachData(
+        source_url="coachdir.com/coach",
+        full_name="Coach Middle Bench",
+        first_name="Coach",
+        last_name="Bench",
+        coach_cert=CoachCert.LIFE,
+        niche_description="Coach, Bench, Things",
+        website_url="coachbench.com",
+        email="coach.bench@coachbench.com",
+    )
+    return [coach] * count
+
+
+def _rows_per_second(write_all, rows):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        csv_file_path = os.path.join(temp_dir, "bench.csv")
+        start = time.perf_counter()
+        write_all(csv_file_path)
+        return rows / (time.perf_counter() - start)
+
+
+def main(rows=20000):
+    test_setup()
+    coaches = _coaches(rows)
+
+    def per_row(csv_file_path):
+        for coach in coaches:
+            write_coach_to_csv(coach, csv_file_path)
+
+    def session(csv_file_path):
+        with CoachCsvWriter(csv_file_path) as csv_writer:
+            for coach in coaches:
+                csv_writer.write_coach(coach)
+
+    per_row_rate = _rows_per_second(per_row, rows)
+    session_rate = _rows_per_second(session, rows)
+    print("write_coach_to_csv: {:>12,.0f} rows/s".format(per_row_rate))
+    print("CoachCsvWriter:     {:>12,.0f} rows/s".format(session_rate))
+    print("speedup:            {:>12.1f}x".format(session_rate / per_row_rate))
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
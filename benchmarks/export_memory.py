@@ -0,0 +1,100 @@
+"""
+Peak RSS of `python -m coach.export` over stores of growing size, which should stay flat
+since records are streamed. Stores are built under ./output/bench_export and removed
+afterwards. Building and every export run in their own processes, a forked child's peak
+RSS starts from its parent's, so this process has to stay small.
+
+Run from the repository root: python -m benchmarks.export_memory [largest store]
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+import time
+
+from coach.data import CoachData, CoachCert
+from coach.data_writer import close_coach_data, write_coach_data
+
+_BENCH_PATH = os.path.join("output", "bench_export")
+_EXPORT_SCRIPT = """
+import resource, sys
+from coach import export
+export.main(sys.argv[1:])
+print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+_FILL_SCRIPT = """
+import os, sys
+import logger
+from benchmarks.export_memory import _fill_store
+with open(os.devnull, "w") as devnull:
+    logger.initialize_logger(logger.Level.SUMMARY, log_file=devnull)
+    _fill_store(sys.argv[1], int(sys.argv[2]), int(sys.argv[3]))
+"""
+
+
+def _fill_store(store_path, start, stop):
+    for i in range(start, stop):
+        write_coach_data(
+            CoachData(
+                source_url="https://thelifecoachschool.com/coach/" + str(i),
+                full_name="Coach Middle Bench",
+                first_name="Coach",
+                last_name="Bench",
+                coach_cert=CoachCert.LIFE,
+                niche_description="Coach, Bench, Things",
+                website_url="coachbench.com",
+                email="coach.bench@coachbench.com",
+                instagram_url="@coachbench",
+            ),
+            store_path,
+        )
+    close_coach_data(store_path)
+
+
+def _run_fill_store(store_path, start, stop):
+    subprocess.run(
+        [sys.executable, "-c", _FILL_SCRIPT, store_path, str(start), str(stop)],
+        check=True,
+    )
+
+
+def _export_peak_kib(store_path, output_path, output_format):
+    result = subprocess.run(
+        [sys.executable, "-c", _EXPORT_SCRIPT, output_path]
+        + ["--store", store_path, "--format", output_format],
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    return int(result.stdout.strip().splitlines()[-1])
+
+
+def main(largest=1000000):
+    shutil.rmtree(_BENCH_PATH, ignore_errors=True)
+    os.makedirs(_BENCH_PATH)
+    store_path = os.path.join(_BENCH_PATH, "store")
+    try:
+        stored = 0
+        size = 1000
+        print("{:>10} {:>7} {:>12} {:>8}".format("records", "format", "peak RSS", "s"))
+        while size <= largest:
+            # The store grows in place, each size adds to the records of the last.
+            _run_fill_store(store_path, stored, size)
+            stored = size
+            for output_format in ("csv", "jsonl"):
+                output_path = os.path.join(_BENCH_PATH, "export." + output_format)
+                start = time.perf_counter()
+                peak = _export_peak_kib(store_path, output_path, output_format)
+                print(
+                    "{:>10,} {:>7} {:>9,} KiB {:>8.1f}".format(
+                        size, output_format, peak, time.perf_counter() - start
+                    )
+                )
+            size *= 10
+    finally:
+        shutil.rmtree(_BENCH_PATH, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
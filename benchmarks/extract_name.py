@@ -0,0 +1,54 @@
+"""
+Names per second through extract_name, best of repeats runs.
+
+Run from the repository root: python -m benchmarks.extract_name [names] [repeats]
+"""
+
+import random
+import sys
+import time
+
+from coach.validation import name
+
+_PREFIXES = ["", "", "", "Dr. ", "Mr. ", "Mrs ", "Rev. ", "d.r. "]
+_FIRST = ["Daniel", "Jane", "Anusha", "Vanessa", "Parley", "Jeremy", "Jacob"]
+_MIDDLE = ["", "", "R. ", "Lee "]
+_LAST = ["Abbatiello", "Long", "Streubel", "Foerster", "Acker", "More"]
+_SUFFIXES = ["", "", ", PCC", ", Ph.D., MCC", " MBA", ", PCC, Rev."]
+
+
+def _names(count):
+    rand = random.Random(18)
+    return [
+        rand.choice(_PREFIXES)
+        + rand.choice(_FIRST)
+        + " "
+        + rand.choice(_MIDDLE)
+        + rand.choice(_LAST)
+        + rand.choice(_SUFFIXES)
+        for _ in range(count)
+    ]
+
+
+def _best_rate(run, count, repeats):
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return count / best
+
+
+def main(count=1000000, repeats=5):
+    names = _names(count)
+
+    def run():
+        for full_name in names:
+            name.extract_name(full_name)
+
+    print("extract_name: {:>12,.0f} names/s".format(_best_rate(run, count, repeats)))
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,13 @@
+import logger
+from config_dir import config
+
+
+def cli_setup():
+    """
+    Loads the config and a SUMMARY logger for a command line tool, unless the caller (a
+    test, or the process that forked this one) already has them.
+    """
+    if not config.is_config_loaded():
+        config.load_config("config_dir/config.ini")
+    if not logger.does_logger_exist():
+        logger.initialize_logger(logger.Level.SUMMARY)
@@ -1,8 +1,8 @@
 from enum import Enum
 from unittest import TestCase
-from uuid import uuid4
 import re
 import csv
+import pickle
 
 import logger
 from logger import Level
@@ -12,8 +12,8 @@ from coach.validation.email import *
 from coach.validation.phone import *
 from coach.validation.social import *
 from coach.validation.url import *
+from coach.validation import pipeline
 from test_utils import test_setup
-from utils import are_any
 
 
 class CoachCert(Enum):
@@ -36,6 +36,26 @@ class CoachCert(Enum):
 
 
 class CoachData:
+    FIELDS = (
+        "source_url",
+        "first_name",
+        "last_name",
+        "full_name",
+        "coach_cert",
+        "niche_description",
+        "website_url",
+        "email",
+        "phone",
+        "instagram_url",
+        "linkedin_url",
+        "twitter_url",
+    )
+    # Slots keep a record to its fields, no per instance __dict__, logger or log list.
+    __slots__ = FIELDS + ("_diagnostics",)
+    _SORTED_FIELDS = sorted(FIELDS)
+    # When set, every logged message is also kept on the record, see logs.
+    KEEP_DIAGNOSTICS = False
+
     def __init__(
         self,
         source_url,
@@ -56,9 +76,7 @@ class CoachData:
             - source url is not present or is not a valid url.
             - certification is not None or a certification enum value.
         """
-        self._logger = logger.get_logger()
-        self._logs = []
-        self._uuid = str(uuid4())
+        self._diagnostics = None
 
         self.log(Level.DETAIL_PLUS, "Constructor started.")
 
@@ -85,131 +103,95 @@ class CoachData:
 
         self.coach_cert = coach_cert
         self.niche_description = niche_description
-        self.website_url = validate_url_or_default(website_url)
-        self.email = validate_email_or_default(email)
-        self.phone = validate_phone_or_default(phone)
-        if self.website_url != website_url:
-            self.log(
-                Level.ERROR,
-                "Input error: website '"
-                + website_url
-                + "' changed to '"
-                + self.website_url
-                + "'",
-            )
-        if self.email != email:
-            self.log(
-                Level.ERROR,
-                "Input error: email '" + email + "' changed to '" + self.email + "'",
-            )
-        if self.phone != phone:
-            self.log(
-                Level.ERROR,
-                "Input error: phone '" + phone + "' changed to '" + self.phone + "'",
-            )
-        self.instagram_url = self.populate_social_media_url(
-            ["instagram.com", "instagr.am"], instagram_url
+        self.website_url = self._clean(pipeline.clean_website, website_url)
+        self.email = self._clean(pipeline.clean_email, email)
+        self.phone = self._clean(pipeline.clean_phone, phone)
+        self.instagram_url = self._clean(
+            pipeline.clean_social_media_field, "instagram_url", instagram_url
+        )
+        self.linkedin_url = self._clean(
+            pipeline.clean_social_media_field, "linkedin_url", linkedin_url
         )
-        self.linkedin_url = self.populate_social_media_url(
-            ["linkedin.com", "linked.in"], linkedin_url, handle_prefix="in"
+        self.twitter_url = self._clean(
+            pipeline.clean_social_media_field, "twitter_url", twitter_url
         )
-        self.twitter_url = self.populate_social_media_url(["twitter.com"], twitter_url)
 
-        self.data_snapshot()
+        if logger.get_logger().is_enabled(Level.SUMMARY):
+            self.data_snapshot()
 
         self.log(Level.DETAIL_PLUS, "Constructor done.")
 
     def get_data_elements(self):
-        return [
-            x
-            for x in dir(self)
-            if not x.startswith("__")
-            and not x.startswith("_")
-            and not callable(getattr(self, x))
-        ]
+        return list(CoachData._SORTED_FIELDS)
 
     def data_snapshot(self, log=True):
         data_elements = self.get_data_elements()
-        data_elements_log = "[ "
-        for data_element in data_elements:
-            data_elements_log += (
-                data_element + "='" + str(getattr(self, data_element)) + "', "
+        data_elements_log = (
+            "[ "
+            + ", ".join(
+                data_element + "='" + str(getattr(self, data_element)) + "'"
+                for data_element in data_elements
             )
-        data_elements_log = data_elements_log[0:-2]
-        data_elements_log += " ]"
+            + " ]"
+        )
         if log:
             self.log(Level.SUMMARY, data_elements_log)
         return data_elements_log
 
+    def _clean(self, clean_field, *args):
+        """
+        Runs one cached step of the field pipeline and logs what it reported.
+        """
+        cleaned, entry = clean_field(*args)
+        if entry is not None:
+            log_level, message, message_args = entry
+            self.log(log_level, message, *message_args)
+        return cleaned
+
     def populate_social_media_url(self, site_urls, social_media, handle_prefix=""):
         if not isinstance(site_urls, list) or len(site_urls) == 0:
             raise ValueError(
                 "This is likely a programmer error, site_urls always need to be provided."
             )
 
-        if not social_media:
-            return ""
-
-        for i in range(0, len(site_urls)):
-            site_urls[i] = site_urls[i].lower()
-
-        social_media = social_media.strip()
-        if validate_url(social_media):  # is url
-            if are_any.within(site_urls, social_media.lower()):
-                return social_media
-            else:
-                message = (
-                    "Social media url '"
-                    + social_media
-                    + "' doesn't match provided sites: "
-                    + str(site_urls)
-                )
-                self.log(Level.ERROR, message)
-                return ""
-        elif validate_handle(social_media):  # is not url, is handle
-            if social_media[0] == "@":
-                social_media = social_media[1:]
-            if handle_prefix:
-                handle_prefix = "/" + handle_prefix
-
-            # social media url isn't too important, just pick the first one
-            constructed_url = (
-                "https://" + site_urls[0] + handle_prefix + "/" + social_media
-            )
+        return self._clean(
+            pipeline.clean_social_media,
+            tuple(site_url.lower() for site_url in site_urls),
+            social_media,
+            handle_prefix,
+        )
 
-            self.log(
-                Level.DETAIL,
-                "From handle '"
-                + social_media
-                + "' constructed url '"
-                + constructed_url
-                + "'",
-            )
-            return constructed_url
-        else:
-            self.log(
-                Level.ERROR,
-                "Social media was ignored for not being a valid site or handle '"
-                + social_media
-                + "'.",
-            )
-            return ""
+    def log(self, log_level, message, *args):
+        """
+        Filtered messages are neither formatted nor kept, see Logger.log for args.
+        """
+        coach_logger = logger.get_logger()
+        if not coach_logger.is_enabled(log_level):
+            return
+        message = logger.render_message(message, args)
+        if CoachData.KEEP_DIAGNOSTICS:
+            if self._diagnostics is None:
+                self._diagnostics = []
+            self._diagnostics.append((log_level, message))
+        coach_logger.log(
+            "[ Coach Data #" + format(id(self), "x") + " ] " + message, log_level
+        )
 
-    def log(self, log_level, message):
-        self._logs.append((log_level, message))
-        self._logger.log("[ Coach Data #" + self._uuid + " ] " + message, log_level)
+    @property
+    def logs(self):
+        if self._diagnostics is None:
+            return []
+        return self._diagnostics
 
     def __getstate__(self):
-        state = self.__dict__.copy()
-        # Remove the unpicklable entries.
-        del state["_logs"]
-        del state["_logger"]
-        return state
+        # The same field dict the __dict__ based records were pickled with.
+        return {name: getattr(self, name) for name in CoachData.FIELDS}
 
-    def __setstate__(self, d):
-        d["_logger"] = logger.get_logger()
-        d["_logs"] = []
-        self.__dict__ = d
+    def __setstate__(self, state):
+        # Older records also carry their _uuid, diagnostics are not restored.
+        self._diagnostics = None
+        for name in CoachData.FIELDS:
+            setattr(self, name, state.get(name, None if name == "coach_cert" else ""))
 
 
 class TestCoachData(TestCase):
@@ -296,10 +278,76 @@ class TestCoachData(TestCase):
                 )
 
 
+_LEGACY_PICKLE = (
+    b"\x80\x04\x95\x8f\x01\x00\x00\x00\x00\x00\x00\x8c\ncoach.data\x94\x8c\tCoachData"
+    b"\x94\x93\x94)\x81\x94}\x94(\x8c\x05_uuid\x94\x8c$bbe8388a-583e-4bdd-8324-780e00365dea"
+    b"\x94\x8c\nsource_url\x94\x8c http://coachdir.com/coach/legacy\x94\x8c\nfirst_name\x94"
+    b"\x8c\x06Legacy\x94\x8c\tlast_name\x94\x8c\x05Coach\x94\x8c\tfull_name\x94\x8c\x13"
+    b"Legacy Middle Coach\x94\x8c\ncoach_cert\x94h\x00\x8c\tCoachCert\x94\x93\x94K\x03\x85"
+    b"\x94R\x94\x8c\x11niche_description\x94\x8c\x00\x94\x8c\x0bwebsite_url\x94h\x15\x8c"
+    b"\x05email\x94\x8c\x13legacy@coachdir.com\x94\x8c\x05phone\x94h\x15\x8c\rinstagram_url"
+    b"\x94h\x15\x8c\x0clinkedin_url\x94h\x15\x8c\x0btwitter_url\x94\x8c\x1a"
+    b"https://twitter.com/legacy\x94ub."
+)
+
+
+class TestCoachDataRecord(TestCase):
+    def setUp(self):
+        test_setup()
+
+    def test_slotted(self):
+        cd = CoachData(TestCoachData.SOME_URL)
+        self.assertFalse(hasattr(cd, "__dict__"))
+        with self.assertRaises(AttributeError):
+            cd.nickname = "coach"
+
+    def test_load_legacy_pickle(self):
+        cd = pickle.loads(_LEGACY_PICKLE)
+        self.assertEqual(cd.source_url, "http://coachdir.com/coach/legacy")
+        self.assertEqual(cd.full_name, "Legacy Middle Coach")
+        self.assertEqual(cd.coach_cert, CoachCert.MASTER)
+        self.assertEqual(cd.twitter_url, "https://twitter.com/legacy")
+        self.assertEqual(cd.logs, [])
+
+    def test_pickle_round_trip(self):
+        cd = CoachData(
+            TestCoachData.SOME_URL,
+            first_name="Coach",
+            last_name="Bench",
+            full_name="Coach Bench",
+            coach_cert=CoachCert.LIFE,
+            email="coach@bench.com",
+        )
+        loaded = pickle.loads(pickle.dumps(cd, protocol=pickle.HIGHEST_PROTOCOL))
+        self.assertEqual(loaded.data_snapshot(log=False), cd.data_snapshot(log=False))
+
+    def test_diagnostics_kept_on_request(self):
+        cd = CoachData(TestCoachData.SOME_URL, email=TestCoachData.NON_URL)
+        self.assertIsNone(cd._diagnostics)
+
+        CoachData.KEEP_DIAGNOSTICS = True
+        try:
+            cd = CoachData(TestCoachData.SOME_URL, email=TestCoachData.NON_URL)
+        finally:
+            CoachData.KEEP_DIAGNOSTICS = False
+        self.assertIn(
+            (Level.ERROR, "Input error: email 'badurl' changed to ''"), cd.logs
+        )
+
+
 class TestCoachDataSocialMedia(TestCase):
     def setUp(self):
         test_setup()
 
+    def test_site_urls_not_modified(self):
+        site_urls = ["Twitter.com"]
+        cd = CoachData(TestCoachData.SOME_URL)
+        self.assertEqual(
+            cd.populate_social_media_url(site_urls, TestCoachData.SOME_HANDLE),
+            "https://twitter.com/" + TestCoachData.SOME_USER,
+        )
+        self.assertEqual(site_urls, ["Twitter.com"])
+
     def test_invalid_social_media(self):
         cd = CoachData(TestCoachData.SOME_URL, twitter_url="test@gmail.com")
         self.assertEqual(
@@ -1,12 +1,17 @@
+from contextlib import closing
 from unittest import TestCase
 import csv
 import pickle
 import os
+import shutil
+import sqlite3
+import time
 
 from config_dir import config
 from coach.data import CoachData, CoachCert
+from coach.sqlite_store import CoachSqliteStore, is_sqlite_path
 from test_utils import test_setup
-from utils.files import atomic_write
+from utils.record_log import RecordLog
 
 HEADER_ROW = [
     "First Name",
@@ -23,28 +28,112 @@ HEADER_ROW = [
 ]
 
 
+_COACH_DATA_LOGS = {}
+
+
+def _is_pickled_coach_data(coach_data_storage_path):
+    # A migration cut short after moving the pickled file aside only has its log left.
+    return os.path.isfile(coach_data_storage_path) or (
+        not os.path.exists(coach_data_storage_path)
+        and os.path.isdir(coach_data_storage_path + ".migrating")
+    )
+
+
+def _migrate_pickled_coach_data(coach_data_storage_path):
+    """
+    Older runs stored every coach as one pickled list in a single file, move those
+    records into a record log at the same path. The log is built in path.migrating and
+    only moved into place once complete, the pickled file is kept as path.legacy.
+    """
+    legacy_path = coach_data_storage_path + ".legacy"
+    migrating_path = coach_data_storage_path + ".migrating"
+    if os.path.isfile(coach_data_storage_path):
+        if os.path.isdir(migrating_path):
+            shutil.rmtree(migrating_path)
+        with open(coach_data_storage_path, "rb") as legacy_file:
+            coach_data_list = pickle.load(legacy_file)
+        record_log = RecordLog(migrating_path)
+        for coach_data in coach_data_list:
+            record_log.append(
+                pickle.dumps(coach_data, protocol=pickle.HIGHEST_PROTOCOL)
+            )
+        record_log.sync()
+        record_log.close()
+        os.replace(coach_data_storage_path, legacy_path)
+    os.replace(migrating_path, coach_data_storage_path)
+    return RecordLog(coach_data_storage_path)
+
+
+def _get_coach_data_log(coach_data_storage_path):
+    """
+    The RecordLog, or the CoachSqliteStore for a path with a SQLITE_SUFFIXES suffix, that
+    stores coaches at coach_data_storage_path.
+    """
+    global _COACH_DATA_LOGS
+    if coach_data_storage_path not in _COACH_DATA_LOGS:
+        if is_sqlite_path(coach_data_storage_path):
+            _COACH_DATA_LOGS[coach_data_storage_path] = CoachSqliteStore(
+                coach_data_storage_path
+            )
+        elif _is_pickled_coach_data(coach_data_storage_path):
+            _COACH_DATA_LOGS[coach_data_storage_path] = _migrate_pickled_coach_data(
+                coach_data_storage_path
+            )
+        else:
+            _COACH_DATA_LOGS[coach_data_storage_path] = RecordLog(
+                coach_data_storage_path
+            )
+    return _COACH_DATA_LOGS[coach_data_storage_path]
+
+
 def write_coach_data(coach_data, coach_data_storage_path=None):
     if coach_data_storage_path is None:
         coach_data_storage_path = config.read("GENERAL", "COACH_DATA_STORAGE_PATH")
 
-    coach_data_list = None
+    coach_data_log = _get_coach_data_log(coach_data_storage_path)
+    if isinstance(coach_data_log, CoachSqliteStore):
+        coach_data_log.upsert(coach_data)
+        return
+    coach_data_log.append(pickle.dumps(coach_data, protocol=pickle.HIGHEST_PROTOCOL))
 
-    def init_coach_data_file(coach_data_file):
-        pickle.dump([], coach_data_file, protocol=pickle.HIGHEST_PROTOCOL)
 
-    def read_coach_data_file(coach_data_file):
-        nonlocal coach_data_list
-        coach_data_list = pickle.load(coach_data_file)
-        coach_data_list.append(coach_data)
+def read_coach_data(coach_data_storage_path=None):
+    """
+    Every coach written to a record log in write order, a coach written twice is read
+    twice. A CoachSqliteStore keeps only the latest row of each source_url.
+    """
+    if coach_data_storage_path is None:
+        coach_data_storage_path = config.read("GENERAL", "COACH_DATA_STORAGE_PATH")
 
-    def modify_coach_data_file(coach_data_file):
-        nonlocal coach_data_list
-        pickle.dump(
-            coach_data_list, coach_data_file, protocol=pickle.HIGHEST_PROTOCOL
-        )
+    coach_data_log = _get_coach_data_log(coach_data_storage_path)
+    if isinstance(coach_data_log, CoachSqliteStore):
+        yield from coach_data_log
+        return
+    for payload in coach_data_log:
+        yield pickle.loads(payload)
 
-    atomic_write(coach_data_storage_path, init_file=init_coach_data_file, read_file=read_coach_data_file, modify_file=modify_coach_data_file)
 
+def flush_coach_data(coach_data_storage_path=None):
+    """
+    Makes every coach written so far survive a killed process, call it before marking the
+    coaches processed. RecordLog appends already are, a CoachSqliteStore commits its batch.
+    """
+    if coach_data_storage_path is None:
+        coach_data_storage_path = config.read("GENERAL", "COACH_DATA_STORAGE_PATH")
+
+    coach_data_log = _COACH_DATA_LOGS.get(coach_data_storage_path)
+    if isinstance(coach_data_log, CoachSqliteStore):
+        coach_data_log.flush()
+
+
+def close_coach_data(coach_data_storage_path=None):
+    if coach_data_storage_path is None:
+        coach_data_storage_path = config.read("GENERAL", "COACH_DATA_STORAGE_PATH")
+
+    global _COACH_DATA_LOGS
+    record_log = _COACH_DATA_LOGS.pop(coach_data_storage_path, None)
+    if record_log is not None:
+        record_log.close()
 
 
 def write_header_row(csv_file_path=None):
@@ -56,24 +145,98 @@ def write_header_row(csv_file_path=None):
         csv_writer.writerow(HEADER_ROW)
 
 
+def coach_to_csv_row(coach):
+    return [
+        coach.first_name,
+        coach.last_name,
+        coach.full_name,
+        str(coach.coach_cert),
+        coach.niche_description,
+        coach.website_url,
+        coach.email,
+        coach.instagram_url,
+        coach.twitter_url,
+        coach.linkedin_url,
+        coach.source_url,
+    ]
+
+
 def write_coach_to_csv(coach, csv_file_path):
     with open(csv_file_path, "a+") as csv_file:
         csv_writer = csv.writer(csv_file)
-        csv_writer.writerow(
-            [
-                coach.first_name,
-                coach.last_name,
-                coach.full_name,
-                str(coach.coach_cert),
-                coach.niche_description,
-                coach.website_url,
-                coach.email,
-                coach.instagram_url,
-                coach.twitter_url,
-                coach.linkedin_url,
-                coach.source_url,
-            ]
+        csv_writer.writerow(coach_to_csv_row(coach))
+
+
+class CoachCsvWriter:
+    """
+    Keeps the csv file open for a whole crawl and buffers rows, flushing once flush_rows
+    rows are pending or flush_seconds have passed since the last flush (checked on write).
+    The header is only written when the file is new or empty. Use as a context manager so
+    buffered rows are flushed even when the crawl raises.
+
+    A crawl marks its coaches processed from on_flush, called after every flush with the
+    keys given to write_coach since the last one, so a killed crawl never skipped a coach
+    whose row it lost.
+    """
+
+    def __init__(
+        self, csv_file_path=None, flush_rows=None, flush_seconds=None, on_flush=None
+    ):
+        if csv_file_path is None:
+            csv_file_path = config.read("GENERAL", "CSV_FILE_PATH")
+        if flush_rows is None:
+            flush_rows = int(config.read("GENERAL", "CSV_FLUSH_ROWS"))
+        if flush_seconds is None:
+            flush_seconds = float(config.read("GENERAL", "CSV_FLUSH_SECONDS"))
+
+        self.csv_file_path = csv_file_path
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+        self.on_flush = on_flush
+        self._rows = []
+        self._keys = []
+        self._last_flush = time.monotonic()
+
+        is_new = (
+            not os.path.isfile(csv_file_path) or os.path.getsize(csv_file_path) == 0
         )
+        self._csv_file = open(csv_file_path, "a+", newline="")
+        self._csv_writer = csv.writer(self._csv_file)
+        if is_new:
+            self._rows.append(HEADER_ROW)
+
+    def write_coach(self, coach, key=None):
+        self._rows.append(coach_to_csv_row(coach))
+        if key is not None:
+            self._keys.append(key)
+        if (
+            len(self._rows) >= self.flush_rows
+            or time.monotonic() - self._last_flush >= self.flush_seconds
+        ):
+            self.flush()
+
+    def flush(self):
+        if self._rows:
+            self._csv_writer.writerows(self._rows)
+            self._rows = []
+        self._csv_file.flush()
+        self._last_flush = time.monotonic()
+        if self.on_flush is not None:
+            keys, self._keys = self._keys, []
+            self.on_flush(keys)
+
+    def close(self):
+        if self._csv_file.closed:
+            return
+        self.flush()
+        self._csv_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
 
 
 class WriteCoachesTest(TestCase):
@@ -98,8 +261,15 @@ class WriteCoachesTest(TestCase):
         with open(config.read("TEST", "TEST_CSV_FILE_PATH"), "w+") as test_csv_file:
             test_csv_file.write("")
         coach_data_storage_path = config.read("TEST", "TEST_COACH_DATA_STORAGE_PATH")
-        if os.path.exists(coach_data_storage_path):
+        close_coach_data(coach_data_storage_path)
+        if os.path.isdir(coach_data_storage_path):
+            shutil.rmtree(coach_data_storage_path)
+        elif os.path.exists(coach_data_storage_path):
             os.remove(coach_data_storage_path)
+        if os.path.exists(coach_data_storage_path + ".legacy"):
+            os.remove(coach_data_storage_path + ".legacy")
+        if os.path.isdir(coach_data_storage_path + ".migrating"):
+            shutil.rmtree(coach_data_storage_path + ".migrating")
 
     def test_write_to_csv(self):
         global HEADER_ROW
@@ -168,6 +338,46 @@ class WriteCoachesTest(TestCase):
             csv_file_contents = csv_file.read()
             self.assertEqual(expected_csv_data, csv_file_contents)
 
+    def test_csv_writer_session(self):
+        global HEADER_ROW
+        csv_file_path = config.read("TEST", "TEST_CSV_FILE_PATH")
+        coaches = [
+            CoachData(
+                source_url="coachdir.com/coach_" + str(i),
+                full_name="Coach Number" + str(i),
+                first_name="Coach",
+                last_name="Number" + str(i),
+                coach_cert=CoachCert.LIFE,
+                niche_description="Coach, Things",
+            )
+            for i in range(5)
+        ]
+
+        flushed = []
+        with CoachCsvWriter(
+            csv_file_path, flush_rows=2, flush_seconds=60, on_flush=flushed.append
+        ) as writer:
+            for i, coach in enumerate(coaches[:3]):
+                writer.write_coach(coach, i)
+        # The header fills the first flush early, closing flushes once more.
+        self.assertEqual(flushed, [[0], [1, 2], []])
+        # Reopening an existing file must not repeat the header.
+        with self.assertRaises(RuntimeError):
+            with CoachCsvWriter(
+                csv_file_path, flush_rows=100, flush_seconds=60
+            ) as writer:
+                for coach in coaches[3:]:
+                    writer.write_coach(coach)
+                raise RuntimeError("Crawl failure.")
+
+        expected_csv_data = (
+            ",".join(HEADER_ROW)
+            + "\n"
+            + "".join(self.coach_data_to_expected_csv_row(coach) for coach in coaches)
+        )
+        with open(csv_file_path, "r") as csv_file:
+            self.assertEqual(expected_csv_data, csv_file.read())
+
     def test_write_coach(self):
         raw_data_1 = {
             "source_url": "coachdir.com/coach_one",
@@ -199,21 +409,97 @@ class WriteCoachesTest(TestCase):
         cd1 = CoachData(**raw_data_1)
         coach_data_storage_path = config.read("TEST", "TEST_COACH_DATA_STORAGE_PATH")
         write_coach_data(cd1, coach_data_storage_path=coach_data_storage_path)
-        with open(coach_data_storage_path, "rb") as coach_data_storage:
-            cd_list = pickle.load(coach_data_storage)
-            self.assertEqual(len(cd_list), 1)
-            self.assertEqual(cd_list[0].first_name, "Coach")
-            self.assertEqual(cd_list[0].last_name, "One")
-            self.assertEqual(cd_list[0].instagram_url, "https://instagram.com/coachone")
+        cd_list = list(read_coach_data(coach_data_storage_path))
+        self.assertEqual(len(cd_list), 1)
+        self.assertEqual(cd_list[0].first_name, "Coach")
+        self.assertEqual(cd_list[0].last_name, "One")
+        self.assertEqual(cd_list[0].instagram_url, "https://instagram.com/coachone")
 
         cd2 = CoachData(**raw_data_2)
         write_coach_data(cd2, coach_data_storage_path=coach_data_storage_path)
-        with open(coach_data_storage_path, "rb") as coach_data_storage:
-            cd_list = pickle.load(coach_data_storage)
-            self.assertEqual(len(cd_list), 2)
-            self.assertEqual(cd_list[0].first_name, "Coach")
-            self.assertEqual(cd_list[0].last_name, "One")
-            self.assertEqual(cd_list[0].instagram_url, "https://instagram.com/coachone")
-            self.assertEqual(cd_list[1].first_name, "Coach")
-            self.assertEqual(cd_list[1].last_name, "Two")
-            self.assertEqual(cd_list[1].instagram_url, "https://instagram.com/coachtwo")
+        close_coach_data(coach_data_storage_path)
+        cd_list = list(read_coach_data(coach_data_storage_path))
+        self.assertEqual(len(cd_list), 2)
+        self.assertEqual(cd_list[0].first_name, "Coach")
+        self.assertEqual(cd_list[0].last_name, "One")
+        self.assertEqual(cd_list[0].instagram_url, "https://instagram.com/coachone")
+        self.assertEqual(cd_list[1].first_name, "Coach")
+        self.assertEqual(cd_list[1].last_name, "Two")
+        self.assertEqual(cd_list[1].instagram_url, "https://instagram.com/coachtwo")
+
+    def test_migrate_pickled_coach_data(self):
+        cd = CoachData(
+            source_url="coachdir.com/coach_one",
+            full_name="Coach One",
+            first_name="Coach",
+            last_name="One",
+        )
+        coach_data_storage_path = config.read("TEST", "TEST_COACH_DATA_STORAGE_PATH")
+        with open(coach_data_storage_path, "wb") as coach_data_storage:
+            pickle.dump([cd], coach_data_storage, protocol=pickle.HIGHEST_PROTOCOL)
+
+        write_coach_data(cd, coach_data_storage_path=coach_data_storage_path)
+        cd_list = list(read_coach_data(coach_data_storage_path))
+        self.assertEqual(len(cd_list), 2)
+        self.assertEqual(cd_list[0].source_url, "coachdir.com/coach_one")
+        self.assertTrue(os.path.isdir(coach_data_storage_path))
+
+    def test_interrupted_migration(self):
+        coaches = [
+            CoachData(source_url="coachdir.com/coach_" + str(i), full_name="Coach")
+            for i in range(3)
+        ]
+        coach_data_storage_path = config.read("TEST", "TEST_COACH_DATA_STORAGE_PATH")
+        with open(coach_data_storage_path, "wb") as coach_data_storage:
+            pickle.dump(coaches, coach_data_storage, protocol=pickle.HIGHEST_PROTOCOL)
+        # A crash while building the log leaves part of it, it is built again.
+        partial_log = RecordLog(coach_data_storage_path + ".migrating")
+        partial_log.append(pickle.dumps(coaches[0]))
+        partial_log.close()
+        self.assertEqual(len(list(read_coach_data(coach_data_storage_path))), 3)
+        close_coach_data(coach_data_storage_path)
+
+        # A crash after the pickled file was moved aside, the complete log is moved in.
+        os.replace(coach_data_storage_path, coach_data_storage_path + ".migrating")
+        self.assertEqual(
+            [cd.source_url for cd in read_coach_data(coach_data_storage_path)],
+            [cd.source_url for cd in coaches],
+        )
+        self.assertFalse(os.path.exists(coach_data_storage_path + ".migrating"))
+        self.assertTrue(os.path.isfile(coach_data_storage_path + ".legacy"))
+
+    def test_write_coach_to_sqlite(self):
+        sqlite_path = config.read("TEST", "TEST_SQLITE_PATH")
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.isfile(sqlite_path + suffix):
+                os.remove(sqlite_path + suffix)
+        for last_name, email in [("One", ""), ("Two", ""), ("One", "one@coach.com")]:
+            write_coach_data(
+                CoachData(
+                    source_url="coachdir.com/coach_" + last_name.lower(),
+                    full_name="Coach " + last_name,
+                    first_name="Coach",
+                    last_name=last_name,
+                    email=email,
+                ),
+                coach_data_storage_path=sqlite_path,
+            )
+        # Flushed rows are committed for any other connection, as a killed crawl would leave.
+        flush_coach_data(sqlite_path)
+        with closing(sqlite3.connect(sqlite_path)) as other_connection:
+            self.assertEqual(
+                other_connection.execute("SELECT COUNT(*) FROM coaches").fetchone()[0],
+                2,
+            )
+        close_coach_data(sqlite_path)
+
+        # The second coach_one record replaced the first one in place.
+        cd_list = list(read_coach_data(sqlite_path))
+        close_coach_data(sqlite_path)
+        self.assertEqual(
+            [(cd.last_name, cd.email) for cd in cd_list],
+            [("One", "one@coach.com"), ("Two", "")],
+        )
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.isfile(sqlite_path + suffix):
+                os.remove(sqlite_path + suffix)
@@ -0,0 +1,304 @@
+"""
+Exports stored coaches to CSV or JSON Lines, one record at a time.
+
+Run from the repository root:
+    python -m coach.export OUTPUT [--store STORE] [--format csv|jsonl]
+        [--fields FIELD,...] [--site HOST] [--cert CERT,...] [--split-rows N]
+
+Records stream from the store through the filters into the output, so memory doesn't
+grow with the store. FIELD is a CoachData field, CSV columns keep their HEADER_ROW names.
+HOST matches the site host of source_url or a domain above it (coachingfederation.org
+takes in apps.coachingfederation.org), CERT is a CoachCert name or NONE. With --split-rows
+the output is split into numbered files of at most N records.
+"""
+
+import argparse
+import csv
+import json
+import os
+import shutil
+from typing import Dict, Iterable, Iterator, List, Optional
+from unittest import TestCase
+
+from config_dir import config
+import logger
+from logger import Level
+from coach.data import CoachData, CoachCert
+from coach.data_writer import (
+    HEADER_ROW,
+    close_coach_data,
+    coach_to_csv_row,
+    read_coach_data,
+    write_coach_data,
+)
+from coach.validation.url import website_host
+from cli_utils import cli_setup
+from test_utils import test_setup
+
+# The CoachData field of every HEADER_ROW column, in coach_to_csv_row order.
+CSV_FIELDS = [
+    "first_name",
+    "last_name",
+    "full_name",
+    "coach_cert",
+    "niche_description",
+    "website_url",
+    "email",
+    "instagram_url",
+    "twitter_url",
+    "linkedin_url",
+    "source_url",
+]
+CSV_HEADERS = dict(zip(CSV_FIELDS, HEADER_ROW))
+CSV_HEADERS["phone"] = "Phone"
+FORMATS = ("csv", "jsonl")
+
+
+def filter_coaches(
+    coaches: Iterable[CoachData], site=None, certs=None
+) -> Iterator[CoachData]:
+    """
+    Coaches whose source_url is on site (a host or any of its subdomains, www. ignored) and
+    whose certification is one of certs (CoachCert members, None for none), either filter
+    is off when not given.
+    """
+    if site is not None:
+        site = website_host(site)
+    for coach in coaches:
+        if site is not None:
+            host = website_host(coach.source_url)
+            if host != site and not host.endswith("." + site):
+                continue
+        if certs is not None and coach.coach_cert not in certs:
+            continue
+        yield coach
+
+
+def coach_record(coach: CoachData, fields) -> Dict[str, Optional[str]]:
+    record = {}
+    for field in fields:
+        value = getattr(coach, field)
+        if field == "coach_cert":
+            value = value.name if value is not None else None
+        record[field] = value
+    return record
+
+
+class _SplitOutput:
+    """
+    Opens output_path, or numbered files next to it once split_rows records are written.
+    """
+
+    def __init__(self, output_path, split_rows=None):
+        self.output_path = output_path
+        self.split_rows = split_rows
+        self.paths = []
+        self.file = None
+        self._rows = 0
+
+    def next_row(self):
+        """
+        True when the row starts a new file.
+        """
+        started = self.file is None or (
+            self.split_rows is not None and self._rows >= self.split_rows
+        )
+        if started:
+            self.close()
+            path = self.output_path
+            if self.split_rows is not None:
+                base, extension = os.path.splitext(self.output_path)
+                path = "{}-{:05d}{}".format(base, len(self.paths) + 1, extension)
+            self.file = open(path, "w", newline="")
+            self.paths.append(path)
+            self._rows = 0
+        self._rows += 1
+        return started
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+def export_coaches(
+    coaches: Iterable[CoachData],
+    output_path,
+    output_format="csv",
+    fields: Optional[List[str]] = None,
+    split_rows=None,
+) -> List[str]:
+    """
+    Writes coaches to output_path as csv or jsonl, returns the paths written. fields
+    defaults to the HEADER_ROW columns for csv and every CoachData field for jsonl.
+    """
+    if output_format not in FORMATS:
+        raise ValueError("Unknown export format: " + str(output_format))
+    if fields is None:
+        fields = CSV_FIELDS if output_format == "csv" else list(CoachData.FIELDS)
+    for field in fields:
+        if field not in CoachData.FIELDS:
+            raise ValueError("Not a CoachData field: " + field)
+
+    output = _SplitOutput(output_path, split_rows)
+    csv_writer = None
+    try:
+        for coach in coaches:
+            started = output.next_row()
+            if output_format == "jsonl":
+                output.file.write(json.dumps(coach_record(coach, fields)) + "\n")
+                continue
+            if started:
+                csv_writer = csv.writer(output.file)
+                csv_writer.writerow([CSV_HEADERS[field] for field in fields])
+            if fields == CSV_FIELDS:
+                csv_writer.writerow(coach_to_csv_row(coach))
+            else:
+                row = coach_record(coach, fields)
+                if "coach_cert" in row:
+                    row["coach_cert"] = str(coach.coach_cert)
+                csv_writer.writerow(row.values())
+        if not output.paths:
+            # Nothing matched, a csv still gets its header.
+            output.next_row()
+            if output_format == "csv":
+                csv.writer(output.file).writerow([CSV_HEADERS[f] for f in fields])
+    finally:
+        output.close()
+    return output.paths
+
+
+def _read_certs(value):
+    certs = set()
+    for name in value.split(","):
+        name = name.strip().upper()
+        certs.add(None if name == "NONE" else CoachCert[name])
+    return certs
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("output")
+    parser.add_argument("--store")
+    parser.add_argument("--format", choices=FORMATS)
+    parser.add_argument("--fields")
+    parser.add_argument("--site")
+    parser.add_argument("--cert")
+    parser.add_argument("--split-rows", type=int)
+    args = parser.parse_args(argv)
+
+    cli_setup()
+
+    output_format = args.format
+    if output_format is None:
+        output_format = "jsonl" if args.output.endswith(".jsonl") else "csv"
+    fields = None
+    if args.fields:
+        fields = [field.strip() for field in args.fields.split(",")]
+    exported = 0
+
+    def counted(coaches):
+        nonlocal exported
+        for coach in coaches:
+            exported += 1
+            yield coach
+
+    coaches = filter_coaches(
+        read_coach_data(args.store),
+        site=args.site,
+        certs=_read_certs(args.cert) if args.cert else None,
+    )
+    paths = export_coaches(
+        counted(coaches), args.output, output_format, fields, args.split_rows
+    )
+    logger.get_logger().log(
+        "Exported {} coaches to {}.", Level.SUMMARY, exported, ", ".join(paths)
+    )
+    return paths
+
+
+class TestExport(TestCase):
+    def setUp(self):
+        # Imported here, the exporter itself doesn't need selenium.
+        from sites.coaching_federation.cf_scraper import FederationSearchSession
+
+        test_setup()
+        self.store_path = config.read("TEST", "TEST_COACH_DATA_STORAGE_PATH")
+        self.output_dir = config.read("TEST", "TEST_EXPORT_PATH")
+        self._remove()
+        os.makedirs(self.output_dir)
+        certs = [CoachCert.MASTER, CoachCert.LIFE, None]
+        for i in range(6):
+            if i % 2:
+                source_url = "https://thelifecoachschool.com/coach/" + str(i)
+            else:
+                source_url = FederationSearchSession.COACH_HREF_PREFIX + str(i)
+            write_coach_data(
+                CoachData(
+                    source_url,
+                    first_name="Coach",
+                    last_name="Number" + str(i),
+                    full_name="Coach Number" + str(i),
+                    coach_cert=certs[i % 3],
+                    email="coach" + str(i) + "@bench.com",
+                ),
+                self.store_path,
+            )
+        close_coach_data(self.store_path)
+
+    def tearDown(self):
+        self._remove()
+
+    def _remove(self):
+        close_coach_data(self.store_path)
+        for path in (self.store_path, self.output_dir):
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+
+    def test_default_csv_matches_csv_writer_rows(self):
+        output_path = os.path.join(self.output_dir, "coaches.csv")
+        paths = main([output_path, "--store", self.store_path])
+        self.assertEqual(paths, [output_path])
+        with open(output_path, "r", newline="") as csv_file:
+            rows = list(csv.reader(csv_file))
+        self.assertEqual(rows[0], HEADER_ROW)
+        self.assertEqual(
+            rows[1:], [coach_to_csv_row(cd) for cd in read_coach_data(self.store_path)]
+        )
+
+    def test_filtered_jsonl_fields(self):
+        output_path = os.path.join(self.output_dir, "coaches.jsonl")
+        main(
+            [output_path, "--store", self.store_path]
+            + ["--fields", "email,coach_cert", "--site", "coachingfederation.org"]
+            + ["--cert", "master,none"]
+        )
+        with open(output_path, "r") as jsonl_file:
+            records = [json.loads(line) for line in jsonl_file]
+        self.assertEqual(
+            records,
+            [
+                {"email": "coach0@bench.com", "coach_cert": "MASTER"},
+                {"email": "coach2@bench.com", "coach_cert": None},
+            ],
+        )
+
+    def test_split_csv(self):
+        output_path = os.path.join(self.output_dir, "coaches.csv")
+        paths = main(
+            [output_path, "--store", self.store_path]
+            + ["--fields", "last_name,phone", "--split-rows", "4"]
+        )
+        self.assertEqual(
+            [os.path.basename(path) for path in paths],
+            ["coaches-00001.csv", "coaches-00002.csv"],
+        )
+        with open(paths[1], "r", newline="") as csv_file:
+            rows = list(csv.reader(csv_file))
+        self.assertEqual(
+            rows, [["Last Name", "Phone"], ["Number4", ""], ["Number5", ""]]
+        )
+
+
+if __name__ == "__main__":
+    main()
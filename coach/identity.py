@@ -0,0 +1,291 @@
+from collections import defaultdict
+import os
+import pickle
+import shutil
+from typing import Optional
+from unittest import TestCase
+from urllib.parse import urlsplit
+
+from config_dir import config
+import logger
+from logger import Level
+from coach.data import CoachData
+from coach.data_writer import close_coach_data, read_coach_data, write_coach_data
+from coach.validation.name import extract_name
+from coach.validation.url import website_host
+from test_utils import test_setup
+from utils.record_log import RecordLog
+
+# Key kinds that on their own identify one coach, a name alone may be shared.
+STRONG_KINDS = ("source_url", "email", "host")
+
+# Hosts many coaches have a page on, there only the path tells one coach from another.
+SHARED_HOSTS = frozenset(
+    [
+        "facebook.com",
+        "instagram.com",
+        "linkedin.com",
+        "twitter.com",
+        "youtube.com",
+        "linktr.ee",
+        "calendly.com",
+        "medium.com",
+        "sites.google.com",
+        "wix.com",
+        "squarespace.com",
+        "wordpress.com",
+        "weebly.com",
+        "thelifecoachschool.com",
+        "apps.coachingfederation.org",
+    ]
+)
+
+
+def website_key(website_url):
+    """
+    The host of a coach's website, with the path as well on a SHARED_HOSTS host. A bare
+    shared host has no key.
+    """
+    host = website_host(website_url)
+    if host not in SHARED_HOSTS:
+        return host
+    if "//" not in website_url:
+        website_url = "//" + website_url
+    path = urlsplit(website_url.strip()).path.lower().strip("/")
+    return host + "/" + path if path else ""
+
+
+def identity_keys(
+    source_url="", email="", website_url="", full_name="", first_name="", last_name=""
+):
+    """
+    The (kind, value) keys a coach can be recognized by across sources.
+    """
+    keys = []
+    if source_url:
+        keys.append(("source_url", source_url.strip().rstrip("/").lower()))
+    if email:
+        keys.append(("email", email.strip().lower()))
+    host = website_key(website_url)
+    if host:
+        keys.append(("host", host))
+    if full_name and not (first_name and last_name):
+        first_name, last_name = extract_name(full_name)
+    if first_name and last_name:
+        keys.append(("name", first_name.lower() + " " + last_name.lower()))
+    return keys
+
+
+def coach_identity_keys(coach_data: CoachData):
+    return identity_keys(
+        source_url=coach_data.source_url,
+        email=coach_data.email,
+        website_url=coach_data.website_url,
+        first_name=coach_data.first_name,
+        last_name=coach_data.last_name,
+    )
+
+
+class IdentityIndex:
+    """
+    Every stored coach by source url, email, website host and name, persisted as a
+    RecordLog of (source_url, keys) records. The first open builds it from the coach data
+    store. A key claimed by more than one coach (a shared host, a common name) is
+    ambiguous and never matches.
+    """
+
+    def __init__(self, index_path=None, coach_data_storage_path=None):
+        if index_path is None:
+            index_path = config.read("GENERAL", "IDENTITY_INDEX_PATH")
+        if coach_data_storage_path is None:
+            coach_data_storage_path = config.read("GENERAL", "COACH_DATA_STORAGE_PATH")
+        self.logger = logger.get_logger()
+        self._owners = defaultdict(set)
+
+        is_new = not os.path.isdir(index_path)
+        self._record_log = RecordLog(index_path)
+        for payload in self._record_log:
+            source_url, keys = pickle.loads(payload)
+            self._claim(source_url, keys)
+        if is_new and os.path.exists(coach_data_storage_path):
+            for coach_data in read_coach_data(coach_data_storage_path):
+                self.add(coach_data)
+            self._record_log.sync()
+            self.logger.log(
+                "Built identity index from " + coach_data_storage_path, Level.SUMMARY
+            )
+
+    def add(self, coach_data: CoachData):
+        keys = coach_identity_keys(coach_data)
+        self._record_log.append(
+            pickle.dumps(
+                (coach_data.source_url, keys), protocol=pickle.HIGHEST_PROTOCOL
+            )
+        )
+        self._claim(coach_data.source_url, keys)
+
+    def match(self, match_on_name=False, **listing) -> Optional[str]:
+        """
+        Source url of the known coach the listing data (identity_keys arguments) points
+        at, or None. Strong keys are tried first. Different people share names, so with
+        match_on_name the name only picks one of the coaches another listed key is
+        ambiguous between, it never matches on its own.
+        """
+        keys = identity_keys(**listing)
+        for kind in STRONG_KINDS:
+            for key in keys:
+                if key[0] == kind and len(self._owners.get(key, ())) == 1:
+                    return next(iter(self._owners[key]))
+        if not match_on_name:
+            return None
+        claimed = set()
+        for key in keys:
+            if key[0] != "name":
+                claimed |= self._owners.get(key, set())
+        for key in keys:
+            if key[0] == "name":
+                candidates = self._owners.get(key, set()) & claimed
+                if len(candidates) == 1:
+                    return next(iter(candidates))
+        return None
+
+    def knows_source_url(self, source_url):
+        return bool(self._owners.get(identity_keys(source_url=source_url)[0]))
+
+    def close(self):
+        self._record_log.close()
+
+    def _claim(self, source_url, keys):
+        for key in keys:
+            self._owners[key].add(source_url)
+
+
+def skip_known_objects(
+    persistent_processor,
+    identity_index,
+    listing,
+    match_on_name=False,
+    skip_own_url=True,
+):
+    """
+    Marks processed every unprocessed object of a PersistentProcessor whose listing data,
+    listing(key, value) giving identity_keys arguments, matches a known coach, so its
+    profile isn't fetched. Without skip_own_url a coach known only by its own source url is
+    kept, to be revisited. Returns how many were skipped.
+    """
+    log = logger.get_logger()
+    unprocessed = list(persistent_processor.get_unprocessed())
+    skipped = 0
+    for key in unprocessed:
+        listed = listing(key, persistent_processor.objects_dict[key])
+        known_url = identity_index.match(match_on_name=match_on_name, **listed)
+        if known_url is None:
+            continue
+        if not skip_own_url and identity_keys(source_url=known_url) == identity_keys(
+            source_url=listed.get("source_url", "")
+        ):
+            continue
+        log.log("Skipping {}, already known as {}", Level.DETAIL, key, known_url)
+        persistent_processor.object_processed(key)
+        skipped += 1
+    if unprocessed:
+        log.log(
+            "Skipped {} of {} coaches already known ({:.1%}).",
+            Level.SUMMARY,
+            skipped,
+            len(unprocessed),
+            skipped / len(unprocessed),
+        )
+    return skipped
+
+
+class TestIdentityIndex(TestCase):
+    def setUp(self):
+        test_setup()
+        self.index_path = config.read("TEST", "TEST_IDENTITY_INDEX_PATH")
+        self.storage_path = config.read("TEST", "TEST_COACH_DATA_STORAGE_PATH")
+        self._remove()
+
+    def tearDown(self):
+        self._remove()
+
+    def _remove(self):
+        close_coach_data(self.storage_path)
+        for path in (self.index_path, self.storage_path):
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+
+    def _coach(self, source_url, full_name, email="", website_url=""):
+        first_name, last_name = full_name.split()
+        return CoachData(
+            source_url,
+            first_name=first_name,
+            last_name=last_name,
+            full_name=full_name,
+            email=email,
+            website_url=website_url,
+        )
+
+    def test_match_across_sources(self):
+        write_coach_data(
+            self._coach(
+                "https://apps.coachingfederation.org/coach?coachcstkey=1",
+                "Vanessa Foerster",
+                email="Vanessa@Foerster.com",
+                website_url="https://www.vanessafoerster.com",
+            ),
+            self.storage_path,
+        )
+        close_coach_data(self.storage_path)
+
+        index = IdentityIndex(self.index_path, self.storage_path)
+        federation_url = "https://apps.coachingfederation.org/coach?coachcstkey=1"
+        self.assertEqual(index.match(email="vanessa@foerster.com"), federation_url)
+        self.assertEqual(
+            index.match(website_url="vanessafoerster.com/contact"), federation_url
+        )
+        # Someone else can have the same name.
+        self.assertIsNone(
+            index.match(match_on_name=True, full_name="Dr. Vanessa Foerster")
+        )
+        self.assertTrue(index.knows_source_url(federation_url + "/"))
+        index.close()
+
+    def test_ambiguous_keys_never_match(self):
+        index = IdentityIndex(self.index_path, self.storage_path)
+        index.add(
+            self._coach(
+                "http://lcs.com/coach/1",
+                "John Smith",
+                website_url="coachcollective.com",
+            )
+        )
+        index.add(
+            self._coach(
+                "http://lcs.com/coach/2", "Jane Doe", website_url="coachcollective.com"
+            )
+        )
+        index.add(
+            self._coach("http://lcs.com/coach/3", "Jane Roe", website_url="wix.com/jr")
+        )
+        self.assertIsNone(index.match(website_url="coachcollective.com"))
+        # The name picks one of the coaches sharing the host.
+        self.assertEqual(
+            index.match(
+                match_on_name=True,
+                website_url="coachcollective.com",
+                full_name="Jane Doe",
+            ),
+            "http://lcs.com/coach/2",
+        )
+        index.close()
+
+        reopened = IdentityIndex(self.index_path, self.storage_path)
+        self.assertEqual(
+            reopened.match(website_url="https://www.wix.com/jr/"),
+            "http://lcs.com/coach/3",
+        )
+        # Only the path tells coaches on a shared host apart.
+        self.assertIsNone(reopened.match(website_url="wix.com"))
+        self.assertIsNone(reopened.match(website_url="wix.com/jd"))
+        reopened.close()
@@ -0,0 +1,217 @@
+"""
+Exports a coach data store to Parquet.
+
+Run from the repository root:
+    python -m coach.parquet_export PARQUET_FILE [--store STORE] [--row-group-size N]
+
+Records are streamed from the store one row group at a time, so memory stays at one row
+group whatever the store's size. coach_cert and source, the site host of source_url, are dictionary encoded.
+Every row group keeps column statistics, so read_coach_parquet only decodes the columns
+and row groups a projection and filters need.
+"""
+
+import argparse
+import os
+import shutil
+from typing import Iterator, List
+from unittest import TestCase
+
+from config_dir import config
+import logger
+from logger import Level
+from coach.data import CoachData, CoachCert
+from coach.data_writer import close_coach_data, read_coach_data, write_coach_data
+from coach.validation.url import website_host
+from cli_utils import cli_setup
+from test_utils import test_setup
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+STRING_COLUMNS = [field for field in CoachData.FIELDS if field != "coach_cert"]
+DICTIONARY_COLUMNS = ["coach_cert", "source"]
+
+
+def coach_schema():
+    columns = [pa.field(name, pa.string()) for name in STRING_COLUMNS]
+    columns += [
+        pa.field(name, pa.dictionary(pa.int32(), pa.string()))
+        for name in DICTIONARY_COLUMNS
+    ]
+    return pa.schema(columns)
+
+
+def coach_batch(coaches: List[CoachData], schema):
+    """
+    One RecordBatch of coaches, a missing certification is null.
+    """
+    columns = {
+        name: [getattr(coach, name) for coach in coaches] for name in STRING_COLUMNS
+    }
+    columns["coach_cert"] = [
+        str(coach.coach_cert) if coach.coach_cert is not None else None
+        for coach in coaches
+    ]
+    columns["source"] = [website_host(coach.source_url) for coach in coaches]
+    return pa.RecordBatch.from_arrays(
+        [
+            (
+                pa.array(columns[field.name], pa.string()).dictionary_encode()
+                if pa.types.is_dictionary(field.type)
+                else pa.array(columns[field.name], field.type)
+            )
+            for field in schema
+        ],
+        schema=schema,
+    )
+
+
+def _batched(coaches, batch_size) -> Iterator[List[CoachData]]:
+    batch = []
+    for coach in coaches:
+        batch.append(coach)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def write_coach_parquet(
+    parquet_file_path,
+    coach_data_storage_path=None,
+    row_group_size=50000,
+):
+    """
+    Streams every stored coach into a Parquet file, returns the number of rows written.
+    """
+    if pq is None:
+        raise RuntimeError("Parquet export needs pyarrow installed.")
+    schema = coach_schema()
+    rows = 0
+    with pq.ParquetWriter(
+        parquet_file_path,
+        schema,
+        use_dictionary=DICTIONARY_COLUMNS,
+        compression="zstd",
+        write_statistics=True,
+    ) as parquet_writer:
+        for coaches in _batched(
+            read_coach_data(coach_data_storage_path), row_group_size
+        ):
+            parquet_writer.write_batch(coach_batch(coaches, schema))
+            rows += len(coaches)
+    return rows
+
+
+def read_coach_parquet(parquet_file_path, columns=None, filters=None):
+    """
+    pyarrow Table of an exported file. columns projects, filters (pyarrow DNF, for example
+    [("coach_cert", "=", "Master Certified Coach")]) skip row groups by their statistics
+    before any rows are decoded.
+    """
+    if pq is None:
+        raise RuntimeError("Parquet export needs pyarrow installed.")
+    return pq.read_table(parquet_file_path, columns=columns, filters=filters)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("output")
+    parser.add_argument("--store")
+    parser.add_argument("--row-group-size", type=int, default=50000)
+    args = parser.parse_args(argv)
+
+    cli_setup()
+
+    rows = write_coach_parquet(
+        args.output,
+        args.store,
+        row_group_size=args.row_group_size,
+    )
+    logger.get_logger().log(
+        "Exported {} coaches to {}.", Level.SUMMARY, rows, args.output
+    )
+    return rows
+
+
+class TestParquetExport(TestCase):
+    def setUp(self):
+        test_setup()
+        if pq is None:
+            self.skipTest("pyarrow is not installed.")
+        self.store_path = config.read("TEST", "TEST_COACH_DATA_STORAGE_PATH")
+        self.parquet_path = config.read("TEST", "TEST_PARQUET_PATH")
+        self._remove()
+
+    def tearDown(self):
+        self._remove()
+
+    def _remove(self):
+        close_coach_data(self.store_path)
+        if os.path.isdir(self.store_path):
+            shutil.rmtree(self.store_path)
+        if os.path.isfile(self.parquet_path):
+            os.remove(self.parquet_path)
+
+    def _write_store(self, count):
+        certs = [CoachCert.MASTER, CoachCert.LIFE, None]
+        for i in range(count):
+            host = "thelifecoachschool.com" if i % 2 else "apps.coachingfederation.org"
+            write_coach_data(
+                CoachData(
+                    "https://" + host + "/coach/" + str(i),
+                    first_name="Coach",
+                    last_name="Number" + str(i),
+                    full_name="Coach Number" + str(i),
+                    coach_cert=certs[i % 3],
+                ),
+                self.store_path,
+            )
+        close_coach_data(self.store_path)
+
+    def test_round_trip_in_row_groups(self):
+        self._write_store(25)
+        rows = write_coach_parquet(
+            self.parquet_path, self.store_path, row_group_size=10
+        )
+        self.assertEqual(rows, 25)
+
+        metadata = pq.ParquetFile(self.parquet_path).metadata
+        self.assertEqual(metadata.num_rows, 25)
+        self.assertEqual(metadata.num_row_groups, 3)
+        table = read_coach_parquet(self.parquet_path)
+        self.assertTrue(pa.types.is_dictionary(table.schema.field("coach_cert").type))
+        self.assertEqual(
+            table.column("source_url").to_pylist()[:2],
+            [
+                "https://apps.coachingfederation.org/coach/0",
+                "https://thelifecoachschool.com/coach/1",
+            ],
+        )
+        self.assertEqual(
+            table.column("coach_cert").to_pylist()[:3],
+            [str(CoachCert.MASTER), str(CoachCert.LIFE), None],
+        )
+
+    def test_projection_and_filters(self):
+        self._write_store(12)
+        write_coach_parquet(self.parquet_path, self.store_path, row_group_size=4)
+        table = read_coach_parquet(
+            self.parquet_path,
+            columns=["last_name", "source"],
+            filters=[
+                ("source", "=", "thelifecoachschool.com"),
+                ("coach_cert", "=", str(CoachCert.LIFE)),
+            ],
+        )
+        self.assertEqual(table.column_names, ["last_name", "source"])
+        self.assertEqual(table.column("last_name").to_pylist(), ["Number1", "Number7"])
+
+
+if __name__ == "__main__":
+    main()
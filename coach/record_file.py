@@ -0,0 +1,357 @@
+"""
+Writes a coach data store to a memory-mapped coach record file, for random access.
+
+Run from the repository root:
+    python -m coach.record_file RECORD_FILE [--store STORE]
+
+RECORD_FILE holds every stored coach as a RecordLog frame whose payload is a header of
+field end offsets followed by the utf-8 fields. RECORD_FILE.idx holds the offset of every
+row and RECORD_FILE.hash an open addressing table of source_url hashes, so CoachRecordFile
+reads one row or looks up one source_url without reading anything else, and field returns
+string fields as slices of the mapped file.
+"""
+
+import argparse
+import hashlib
+import mmap
+import os
+import shutil
+import struct
+import zlib
+from typing import Optional
+from unittest import TestCase
+
+from config_dir import config
+import logger
+from logger import Level
+from coach.data import CoachData, CoachCert
+from coach.data_writer import close_coach_data, read_coach_data, write_coach_data
+from cli_utils import cli_setup
+from test_utils import test_setup
+from utils.record_log import FRAME_HEADER, frame_record
+
+INDEX_SUFFIX = ".idx"
+HASH_SUFFIX = ".hash"
+
+# Mask of the None fields, then the end of every field relative to the first.
+_RECORD_HEADER = struct.Struct("<H" + "I" * len(CoachData.FIELDS))
+_OFFSET = struct.Struct("<Q")
+# Rows, slots and data file bytes, then slots of <source_url hash, row + 1 or 0 if empty>.
+_HASH_HEADER = struct.Struct("<QQQ")
+_SLOT = struct.Struct("<QQ")
+_SOURCE_URL = CoachData.FIELDS.index("source_url")
+
+
+def url_hash(encoded_url: bytes) -> int:
+    return int.from_bytes(
+        hashlib.blake2b(encoded_url, digest_size=8).digest(), "little"
+    )
+
+
+def encode_coach(coach_data: CoachData) -> bytes:
+    null_mask = 0
+    ends = []
+    encoded = []
+    end = 0
+    for i, name in enumerate(CoachData.FIELDS):
+        value = getattr(coach_data, name)
+        if value is None:
+            null_mask |= 1 << i
+            value = ""
+        elif name == "coach_cert":
+            value = value.name
+        value = value.encode()
+        end += len(value)
+        ends.append(end)
+        encoded.append(value)
+    return _RECORD_HEADER.pack(null_mask, *ends) + b"".join(encoded)
+
+
+def _field_span(data, offsets, row, field_index):
+    # (start, end) of a field of a row in the data file.
+    (frame_start,) = _OFFSET.unpack_from(offsets, row * _OFFSET.size)
+    header_start = frame_start + FRAME_HEADER.size
+    body_start = header_start + _RECORD_HEADER.size
+    ends = _RECORD_HEADER.unpack_from(data, header_start)[1:]
+    start = ends[field_index - 1] if field_index else 0
+    return body_start + start, body_start + ends[field_index]
+
+
+def _map(path, access=mmap.ACCESS_READ):
+    # mmap can't map an empty file, an empty record file has nothing to map anyway.
+    with open(path, "rb" if access == mmap.ACCESS_READ else "r+b") as mapped_file:
+        if os.fstat(mapped_file.fileno()).st_size == 0:
+            return b""
+        return mmap.mmap(mapped_file.fileno(), 0, access=access)
+
+
+def _insert(table, slots, data, offsets, row):
+    # Linear probing, a later row of the same source_url replaces the earlier one.
+    start, end = _field_span(data, offsets, row, _SOURCE_URL)
+    encoded_url = data[start:end]
+    hashed = url_hash(encoded_url)
+    slot = hashed & (slots - 1)
+    while True:
+        position = _HASH_HEADER.size + slot * _SLOT.size
+        slot_hash, slot_row = _SLOT.unpack_from(table, position)
+        if slot_row == 0:
+            break
+        if slot_hash == hashed:
+            start, end = _field_span(data, offsets, slot_row - 1, _SOURCE_URL)
+            if data[start:end] == encoded_url:
+                break
+        slot = (slot + 1) & (slots - 1)
+    _SLOT.pack_into(table, position, hashed, row + 1)
+
+
+def write_coach_record_file(record_file_path, coach_data_storage_path=None):
+    """
+    Streams every stored coach into a record file and its indexes, returns the number of
+    rows written. A store not yet compacted can hold a coach more than once, every copy
+    gets a row and the hash index points at the last.
+    """
+    temp_paths = [
+        record_file_path + suffix + ".temp"
+        for suffix in ("", INDEX_SUFFIX, HASH_SUFFIX)
+    ]
+    rows = 0
+    with open(temp_paths[0], "wb") as data_file, open(
+        temp_paths[1], "wb"
+    ) as index_file:
+        for coach_data in read_coach_data(coach_data_storage_path):
+            index_file.write(_OFFSET.pack(data_file.tell()))
+            data_file.write(frame_record(encode_coach(coach_data)))
+            rows += 1
+        data_bytes = data_file.tell()
+
+    # At most half the slots are used, keeping probe sequences short.
+    slots = 1
+    while slots < rows * 2:
+        slots *= 2
+    with open(temp_paths[2], "wb") as hash_file:
+        hash_file.write(_HASH_HEADER.pack(rows, slots, data_bytes))
+        hash_file.truncate(_HASH_HEADER.size + slots * _SLOT.size)
+    data = _map(temp_paths[0])
+    offsets = _map(temp_paths[1])
+    table = _map(temp_paths[2], mmap.ACCESS_WRITE)
+    try:
+        for row in range(rows):
+            _insert(table, slots, data, offsets, row)
+        table.flush()
+    finally:
+        for mapped in (data, offsets, table):
+            if isinstance(mapped, mmap.mmap):
+                mapped.close()
+
+    # The indexes go first, a reader that sees them with an older data file refuses it.
+    for temp_path in temp_paths[1:] + temp_paths[:1]:
+        os.replace(temp_path, temp_path[: -len(".temp")])
+    return rows
+
+
+class CoachRecordFile:
+    """
+    Read only, memory-mapped access to a record file written by write_coach_record_file.
+    Rows and source_url lookups are O(1) and touch only the pages of the records they
+    read. Views returned by field slice the mapped file, they have to be released before
+    close.
+    """
+
+    def __init__(self, record_file_path):
+        self.record_file_path = record_file_path
+        self._data = _map(record_file_path)
+        self._offsets = _map(record_file_path + INDEX_SUFFIX)
+        self._table = _map(record_file_path + HASH_SUFFIX)
+        self._rows, self._slots, data_bytes = _HASH_HEADER.unpack_from(self._table)
+        if (
+            len(self._offsets) != self._rows * _OFFSET.size
+            or len(self._data) != data_bytes
+        ):
+            self.close()
+            raise ValueError(
+                "Record file does not match its indexes: " + record_file_path
+            )
+        self._view = memoryview(self._data)
+
+    def __len__(self):
+        return self._rows
+
+    def __getitem__(self, row) -> CoachData:
+        self._check_row(row)
+        (frame_start,) = _OFFSET.unpack_from(self._offsets, row * _OFFSET.size)
+        length, checksum = FRAME_HEADER.unpack_from(self._data, frame_start)
+        payload_start = frame_start + FRAME_HEADER.size
+        payload = self._view[payload_start : payload_start + length]
+        if zlib.crc32(payload) != checksum:
+            raise ValueError("Corrupt coach record at row " + str(row))
+
+        null_mask, *ends = _RECORD_HEADER.unpack_from(payload)
+        state = {}
+        start = _RECORD_HEADER.size
+        for i, name in enumerate(CoachData.FIELDS):
+            end = _RECORD_HEADER.size + ends[i]
+            if null_mask & (1 << i):
+                state[name] = None
+            elif name == "coach_cert":
+                state[name] = CoachCert[str(payload[start:end], "utf-8")]
+            else:
+                state[name] = str(payload[start:end], "utf-8")
+            start = end
+        # Records were validated when stored, restore them as unpickling would.
+        coach_data = CoachData.__new__(CoachData)
+        coach_data.__setstate__(state)
+        return coach_data
+
+    def field(self, row, name) -> memoryview:
+        """
+        The utf-8 bytes of a field of a row, without copying them out of the file.
+        """
+        self._check_row(row)
+        start, end = _field_span(
+            self._data, self._offsets, row, CoachData.FIELDS.index(name)
+        )
+        return self._view[start:end]
+
+    def find(self, source_url) -> Optional[int]:
+        """
+        Row of the last record of source_url, or None.
+        """
+        if not self._slots:
+            return None
+        encoded_url = source_url.encode()
+        hashed = url_hash(encoded_url)
+        slot = hashed & (self._slots - 1)
+        while True:
+            slot_hash, slot_row = _SLOT.unpack_from(
+                self._table, _HASH_HEADER.size + slot * _SLOT.size
+            )
+            if slot_row == 0:
+                return None
+            if slot_hash == hashed:
+                start, end = _field_span(
+                    self._data, self._offsets, slot_row - 1, _SOURCE_URL
+                )
+                if self._data[start:end] == encoded_url:
+                    return slot_row - 1
+            slot = (slot + 1) & (self._slots - 1)
+
+    def get(self, source_url) -> Optional[CoachData]:
+        row = self.find(source_url)
+        return None if row is None else self[row]
+
+    def close(self):
+        if getattr(self, "_view", None) is not None:
+            self._view.release()
+            self._view = None
+        for mapped in (self._data, self._offsets, self._table):
+            if isinstance(mapped, mmap.mmap):
+                mapped.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _check_row(self, row):
+        if not 0 <= row < self._rows:
+            raise IndexError("Coach record row out of range: " + str(row))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("output")
+    parser.add_argument("--store")
+    args = parser.parse_args(argv)
+
+    cli_setup()
+
+    rows = write_coach_record_file(args.output, args.store)
+    logger.get_logger().log(
+        "Wrote {} coach records to {}.", Level.SUMMARY, rows, args.output
+    )
+    return rows
+
+
+class TestCoachRecordFile(TestCase):
+    def setUp(self):
+        test_setup()
+        self.store_path = config.read("TEST", "TEST_COACH_DATA_STORAGE_PATH")
+        self.record_file_path = config.read("TEST", "TEST_RECORD_FILE_PATH")
+        self._remove()
+
+    def tearDown(self):
+        self._remove()
+
+    def _remove(self):
+        close_coach_data(self.store_path)
+        if os.path.isdir(self.store_path):
+            shutil.rmtree(self.store_path)
+        for suffix in ("", INDEX_SUFFIX, HASH_SUFFIX):
+            if os.path.isfile(self.record_file_path + suffix):
+                os.remove(self.record_file_path + suffix)
+
+    def _write_store(self, coaches):
+        for coach_data in coaches:
+            write_coach_data(coach_data, self.store_path)
+        close_coach_data(self.store_path)
+
+    @staticmethod
+    def _coach(i, email=""):
+        return CoachData(
+            "https://thelifecoachschool.com/coach/" + str(i),
+            first_name="Coach",
+            last_name="Nümber" + str(i),
+            full_name="Coach Nümber" + str(i),
+            coach_cert=CoachCert.LIFE if i % 2 else None,
+            email=email,
+        )
+
+    def test_rows_and_lookups(self):
+        coaches = [self._coach(i) for i in range(50)]
+        coaches.append(self._coach(7, email="coach7@bench.com"))
+        self._write_store(coaches)
+        self.assertEqual(main([self.record_file_path, "--store", self.store_path]), 51)
+
+        with CoachRecordFile(self.record_file_path) as record_file:
+            self.assertEqual(len(record_file), 51)
+            for row in (0, 1, 49):
+                self.assertEqual(
+                    record_file[row].get_data_elements(),
+                    coaches[row].get_data_elements(),
+                )
+            self.assertIsNone(record_file[0].coach_cert)
+            self.assertEqual(record_file[1].coach_cert, CoachCert.LIFE)
+            with self.assertRaises(IndexError):
+                record_file[51]
+
+            # The later record of a source_url is the one found.
+            self.assertEqual(record_file.find(coaches[7].source_url), 50)
+            self.assertEqual(
+                record_file.get(coaches[7].source_url).email, "coach7@bench.com"
+            )
+            self.assertEqual(record_file.find(coaches[8].source_url), 8)
+            self.assertIsNone(record_file.get("https://thelifecoachschool.com/none"))
+
+            last_name = record_file.field(3, "last_name")
+            self.assertEqual(last_name.obj, record_file._data)
+            self.assertEqual(str(last_name, "utf-8"), "Nümber3")
+            last_name.release()
+
+    def test_empty_and_stale_indexes(self):
+        self._write_store([])
+        self.assertEqual(
+            write_coach_record_file(self.record_file_path, self.store_path), 0
+        )
+        with CoachRecordFile(self.record_file_path) as record_file:
+            self.assertEqual(len(record_file), 0)
+            self.assertIsNone(record_file.find("https://thelifecoachschool.com/0"))
+
+        with open(self.record_file_path, "ab") as data_file:
+            data_file.write(frame_record(encode_coach(self._coach(0))))
+        with self.assertRaises(ValueError):
+            CoachRecordFile(self.record_file_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Iterator, List
+from unittest import TestCase
+
+from config_dir import config
+from coach.data import CoachData, CoachCert
+from coach.validation.url import website_host
+from test_utils import test_setup
+
+# A coach data storage path with one of these suffixes is a CoachSqliteStore database.
+SQLITE_SUFFIXES = (".sqlite", ".sqlite3", ".db")
+
+# Columns find can match on, each has an index.
+QUERY_COLUMNS = ("source_url", "email", "website_host", "first_name", "last_name")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS coaches (
+    source_url TEXT PRIMARY KEY,
+    first_name TEXT COLLATE NOCASE,
+    last_name TEXT COLLATE NOCASE,
+    full_name TEXT,
+    coach_cert INTEGER,
+    niche_description TEXT,
+    website_url TEXT,
+    email TEXT COLLATE NOCASE,
+    phone TEXT,
+    instagram_url TEXT,
+    linkedin_url TEXT,
+    twitter_url TEXT,
+    website_host TEXT,
+    updated_at REAL
+);
+CREATE INDEX IF NOT EXISTS coaches_email ON coaches (email);
+CREATE INDEX IF NOT EXISTS coaches_website_host ON coaches (website_host);
+CREATE INDEX IF NOT EXISTS coaches_name ON coaches (last_name, first_name);
+"""
+_COLUMNS = CoachData.FIELDS + ("website_host", "updated_at")
+_UPSERT = (
+    "INSERT INTO coaches ({columns}) VALUES ({values}) "
+    "ON CONFLICT (source_url) DO UPDATE SET {updates}"
+).format(
+    columns=", ".join(_COLUMNS),
+    values=", ".join("?" for _ in _COLUMNS),
+    updates=", ".join(
+        name + " = excluded." + name for name in _COLUMNS if name != "source_url"
+    ),
+)
+_SELECT = "SELECT " + ", ".join(CoachData.FIELDS) + " FROM coaches"
+
+
+def is_sqlite_path(coach_data_storage_path):
+    return coach_data_storage_path.endswith(SQLITE_SUFFIXES)
+
+
+def _coach_row(coach_data: CoachData, updated_at):
+    row = [getattr(coach_data, name) for name in CoachData.FIELDS]
+    cert = coach_data.coach_cert
+    row[CoachData.FIELDS.index("coach_cert")] = cert.value if cert else None
+    return row + [website_host(coach_data.website_url), updated_at]
+
+
+def _coach_from_row(row) -> CoachData:
+    # Stored records were validated when written, restore them as unpickling would.
+    state = dict(zip(CoachData.FIELDS, row))
+    if state["coach_cert"] is not None:
+        state["coach_cert"] = CoachCert(state["coach_cert"])
+    coach_data = CoachData.__new__(CoachData)
+    coach_data.__setstate__(state)
+    return coach_data
+
+
+class CoachSqliteStore:
+    """
+    Coaches in a SQLite database in WAL mode, one row per source_url with indexes on email,
+    website host and name. Upserts are buffered and committed in one transaction once
+    batch_rows are pending or batch_seconds have passed (checked on upsert), so like
+    CoachCsvWriter a killed process loses at most the pending batch. Crawls flush (through
+    flush_coach_data) whenever their csv flushes, before marking that batch processed.
+    Reads flush first and go through their own connection, readers in other processes
+    never block the writer.
+    """
+
+    def __init__(self, db_path, batch_rows=None, batch_seconds=None):
+        if batch_rows is None:
+            batch_rows = int(config.read("GENERAL", "SQLITE_BATCH_ROWS"))
+        if batch_seconds is None:
+            batch_seconds = float(config.read("GENERAL", "SQLITE_BATCH_SECONDS"))
+        self.db_path = db_path
+        self.batch_rows = batch_rows
+        self.batch_seconds = batch_seconds
+        self._lock = threading.Lock()
+        self._pending = []
+        self._last_commit = time.monotonic()
+
+        self._connection = sqlite3.connect(db_path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(_SCHEMA)
+
+    def upsert(self, coach_data: CoachData):
+        with self._lock:
+            self._pending.append(_coach_row(coach_data, time.time()))
+            if (
+                len(self._pending) >= self.batch_rows
+                or time.monotonic() - self._last_commit >= self.batch_seconds
+            ):
+                self._commit()
+
+    def flush(self):
+        with self._lock:
+            self._commit()
+
+    def __len__(self):
+        self.flush()
+        return self._connection.execute("SELECT COUNT(*) FROM coaches").fetchone()[0]
+
+    def __iter__(self) -> Iterator[CoachData]:
+        self.flush()
+        reader = self._reader()
+        try:
+            for row in reader.execute(_SELECT + " ORDER BY rowid"):
+                yield _coach_from_row(row)
+        finally:
+            reader.close()
+
+    def find(self, **equals) -> List[CoachData]:
+        """
+        Coaches whose columns equal the given values, names and email ignore case.
+        """
+        for name in equals:
+            if name not in QUERY_COLUMNS:
+                raise ValueError("Not a query column: " + name)
+        self.flush()
+        where = " AND ".join(name + " = ?" for name in equals)
+        reader = self._reader()
+        try:
+            rows = reader.execute(
+                _SELECT + (" WHERE " + where if where else ""), list(equals.values())
+            ).fetchall()
+        finally:
+            reader.close()
+        return [_coach_from_row(row) for row in rows]
+
+    def close(self):
+        with self._lock:
+            if self._connection is None:
+                return
+            self._commit()
+            self._connection.close()
+            self._connection = None
+
+    def _commit(self):
+        if self._pending:
+            with self._connection:
+                self._connection.executemany(_UPSERT, self._pending)
+            self._pending = []
+        self._last_commit = time.monotonic()
+
+    def _reader(self):
+        return sqlite3.connect("file:" + self.db_path + "?mode=ro", uri=True)
+
+
+class TestCoachSqliteStore(TestCase):
+    def setUp(self):
+        test_setup()
+        self.db_path = config.read("TEST", "TEST_SQLITE_PATH")
+        self._remove()
+
+    def tearDown(self):
+        self._remove()
+
+    def _remove(self):
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.isfile(self.db_path + suffix):
+                os.remove(self.db_path + suffix)
+
+    @staticmethod
+    def _coach(i, email="", website_url=""):
+        return CoachData(
+            "http://lcs.com/coach/" + str(i),
+            first_name="Coach",
+            last_name="Number" + str(i),
+            full_name="Coach Number" + str(i),
+            coach_cert=CoachCert.MASTER if i % 2 else None,
+            email=email,
+            website_url=website_url,
+        )
+
+    def test_batched_upserts_replace_by_source_url(self):
+        store = CoachSqliteStore(self.db_path, batch_rows=3, batch_seconds=60)
+        for i in range(4):
+            store.upsert(self._coach(i))
+        # Three rows made a batch, the fourth is pending until a read or close.
+        reader = CoachSqliteStore(self.db_path, batch_rows=1, batch_seconds=60)
+        self.assertEqual(len(reader), 3)
+        store.upsert(self._coach(1, email="coach@bench.com"))
+        store.close()
+
+        self.assertEqual(len(reader), 4)
+        coaches = list(reader)
+        self.assertEqual(
+            [cd.source_url for cd in coaches],
+            ["http://lcs.com/coach/" + str(i) for i in range(4)],
+        )
+        self.assertEqual(coaches[1].email, "coach@bench.com")
+        self.assertEqual(coaches[1].coach_cert, CoachCert.MASTER)
+        self.assertIsNone(coaches[0].coach_cert)
+        reader.close()
+
+    def test_wal_and_indexed_find(self):
+        store = CoachSqliteStore(self.db_path, batch_rows=100, batch_seconds=60)
+        store.upsert(self._coach(1, email="Coach@Bench.com"))
+        store.upsert(self._coach(2, website_url="https://www.coachbench.com/about"))
+        self.assertEqual(
+            store._connection.execute("PRAGMA journal_mode").fetchone()[0], "wal"
+        )
+        self.assertEqual(
+            [cd.source_url for cd in store.find(email="coach@bench.com")],
+            ["http://lcs.com/coach/1"],
+        )
+        self.assertEqual(
+            [cd.source_url for cd in store.find(website_host="coachbench.com")],
+            ["http://lcs.com/coach/2"],
+        )
+        self.assertEqual(len(store.find(first_name="coach", last_name="number2")), 1)
+        plan = store._connection.execute(
+            "EXPLAIN QUERY PLAN SELECT * FROM coaches WHERE website_host = ?", ("a",)
+        ).fetchall()
+        self.assertIn("coaches_website_host", str(plan))
+        with self.assertRaises(ValueError):
+            store.find(phone="555")
+        store.close()
@@ -0,0 +1,186 @@
+from unittest import TestCase
+
+from coach.validation.email import validate_email
+from coach.validation.phone import (
+    phone_regex,
+    phone_translation_table,
+    validate_phone,
+)
+from coach.validation.social import social_media_handle_regex, validate_handle
+from coach.validation.url import url_regex, validate_url
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:
+    pa = None
+    pc = None
+
+KINDS = ("url", "email", "phone", "handle")
+
+_LIST_MATCHERS = {
+    "url": url_regex.match,
+    "phone": phone_regex.match,
+    "handle": social_media_handle_regex.match,
+}
+# RE2 spellings of the same patterns for pyarrow.compute. Python's $ also matches before a
+# trailing newline, hence \n?$, and the handle lookahead is implied by the \s*$ after it.
+_ARROW_PATTERNS = {
+    "url": url_regex.pattern[:-1] + r"\n?$",
+    "phone": phone_regex.pattern[:-1] + r"\n?$",
+    "handle": r"^\s*(@?[A-Za-z0-9\-_]+)\s*$",
+}
+
+
+def normalize_phone_column(values):
+    """
+    normalize_phone over a whole column, None (null) entries stay None.
+    """
+    if _is_arrow(values):
+        return pc.replace_substring_regex(values, r"[+.\-() \t]", "")
+    if _is_pandas(values):
+        return normalize_phone_column(pa.Array.from_pandas(values)).to_pandas()
+    return [
+        value.translate(phone_translation_table) if value is not None else None
+        for value in values
+    ]
+
+
+def validate_column(kind, values, default=""):
+    """
+    Validates a whole column with the rule of validate_<kind>, kind is one of KINDS.
+    Returns (mask, values): mask is True where the value is valid, values holds the value
+    where valid and default elsewhere, as validate_<kind>_or_default would. Lists give
+    lists back, Arrow arrays Arrow arrays and pandas Series pandas Series. Missing values
+    are invalid.
+    """
+    if kind not in KINDS:
+        raise ValueError("Unknown column kind: " + str(kind))
+    if _is_arrow(values):
+        return _validate_arrow(kind, values, default)
+    if _is_pandas(values):
+        mask, cleaned = _validate_arrow(kind, pa.Array.from_pandas(values), default)
+        return mask.to_pandas(), cleaned.to_pandas()
+    return _validate_list(kind, values, default)
+
+
+def _validate_list(kind, values, default):
+    if kind == "email":
+        # validate_email falls back to IDN encoding, so each distinct value is checked once.
+        checked = {}
+        for value in values:
+            if value not in checked:
+                checked[value] = bool(value) and bool(validate_email(value))
+        mask = [checked[value] for value in values]
+    else:
+        match = _LIST_MATCHERS[kind]
+        targets = normalize_phone_column(values) if kind == "phone" else values
+        mask = [value is not None and match(value) is not None for value in targets]
+    return mask, [value if valid else default for value, valid in zip(values, mask)]
+
+
+def _validate_arrow(kind, values, default):
+    if kind == "email":
+        distinct = pc.unique(values).to_pylist()
+        valid_values = [
+            value for value in distinct if value and bool(validate_email(value))
+        ]
+        mask = pc.is_in(values, value_set=pa.array(valid_values, type=values.type))
+    else:
+        targets = normalize_phone_column(values) if kind == "phone" else values
+        mask = pc.match_substring_regex(
+            targets, _ARROW_PATTERNS[kind], ignore_case=kind == "url"
+        )
+    mask = pc.fill_null(mask, False)
+    return mask, pc.if_else(mask, values, pa.scalar(default, type=values.type))
+
+
+def _is_arrow(values):
+    return pa is not None and isinstance(values, (pa.Array, pa.ChunkedArray))
+
+
+def _is_pandas(values):
+    return pa is not None and type(values).__module__.startswith("pandas")
+
+
+class _TestBatchValidation(TestCase):
+    SAMPLES = {
+        "url": [
+            "http://google.com",
+            "hi.there.com/specific_resource?sfjdd=8&fddd=2",
+            "HTTPS://WWW.COACH.COM",
+            "hi.com/ rejected",
+            "notawebsite/hello",
+            "hi.com\n",
+            "",
+            None,
+        ],
+        "email": [
+            "myname.jeff@gmail.com",
+            "notanemail.com",
+            "coach@bücher.de",
+            "a@b@c.com",
+            "myname.jeff@gmail.com",
+            "",
+            None,
+        ],
+        "phone": [
+            "+1 (801).888.8888",
+            "888 888 8888 hi",
+            "8885551",
+            "12",
+            "8015550100\n",
+            None,
+        ],
+        "handle": [
+            "somehandle",
+            "@twitteruser",
+            "not_a_handle@gmail.com",
+            "website.com",
+            "  @spaced  ",
+            "dash-under_score",
+            None,
+        ],
+    }
+
+    def _expected(self, kind, value):
+        single = {
+            "url": validate_url,
+            "email": validate_email,
+            "phone": validate_phone,
+            "handle": validate_handle,
+        }[kind]
+        return value is not None and bool(single(value))
+
+    def test_lists_match_single_validators(self):
+        for kind, samples in self.SAMPLES.items():
+            mask, cleaned = validate_column(kind, samples)
+            expected = [self._expected(kind, value) for value in samples]
+            self.assertEqual(mask, expected, kind)
+            self.assertEqual(
+                cleaned,
+                [value if valid else "" for value, valid in zip(samples, expected)],
+            )
+
+    def test_arrow_matches_lists(self):
+        if pa is None:
+            self.skipTest("pyarrow is not installed.")
+        for kind, samples in self.SAMPLES.items():
+            mask, cleaned = validate_column(kind, pa.array(samples, type=pa.string()))
+            list_mask, list_cleaned = validate_column(kind, samples)
+            self.assertEqual(mask.to_pylist(), list_mask, kind)
+            self.assertEqual(cleaned.to_pylist(), list_cleaned, kind)
+
+    def test_normalize_phone_column(self):
+        self.assertEqual(
+            normalize_phone_column(["+1 (801).888-8888", None]), ["18018888888", None]
+        )
+        if pa is not None:
+            self.assertEqual(
+                normalize_phone_column(pa.array(["(801) 888-8888"])).to_pylist(),
+                ["8018888888"],
+            )
+
+    def test_unknown_kind(self):
+        with self.assertRaises(ValueError):
+            validate_column("fax", ["555"])
@@ -2,26 +2,40 @@ from unittest import TestCase
 
 from utils.general import affix_variations
 
-_all_affixes = set()
-
-
-def init_all_affixes():
-    global _all_affixes
-    for affix in [
-        "dr",
-        "mba",
-        "ma",
-        "md",
-        "ra",
-        "phd",
-        "rn",
-        "msa",
-        "pcc",
-        "mr",
-        "ms",
-        "mrs",
-    ]:
-        _all_affixes = _all_affixes.union(affix_variations(affix))
+AFFIXES = (
+    "dr",
+    "mba",
+    "ma",
+    "md",
+    "ra",
+    "phd",
+    "rn",
+    "msa",
+    "pcc",
+    "mr",
+    "ms",
+    "mrs",
+    "rev",
+    "prof",
+    "acc",
+    "mcc",
+    "cpcc",
+    "jr",
+    "sr",
+)
+
+
+def compile_affixes(affixes):
+    """
+    Every lowercase punctuation variation of every affix in one set, see affix_variations.
+    """
+    all_affixes = set()
+    for affix in affixes:
+        all_affixes.update(affix_variations(affix))
+    return frozenset(all_affixes)
+
+
+_all_affixes = compile_affixes(AFFIXES)
 
 
 def normalize_name(name):
@@ -29,27 +43,32 @@ def normalize_name(name):
     return " ".join(name_tokens)
 
 
-def extract_name(name_text):
-    global _all_affixes
-    if len(_all_affixes) == 0:
-        init_all_affixes()
-
-    name_tokens = name_text.split(",")[0].split()
-    filtered_tokens = []
-    for token in name_tokens:
-        # lowercase token to simplify
-        token = token.lower()
+def _tokens_after_affix_part(rest, affixes):
+    # A leading part of only affixes ("Dr., Jane Doe") is skipped.
+    for part in rest.split(","):
+        name_tokens = [token for token in part.split() if token not in affixes]
+        if name_tokens:
+            return name_tokens
+    return []
 
-        if token in _all_affixes:
-            continue
-        filtered_tokens.append(token)
 
-    if len(filtered_tokens) < 2:
+def extract_name(name_text):
+    """
+    Lowercase (first, last) of a full name, leaving out affixes. Everything after the
+    first comma separated part holding more than affixes is ignored ("Dr., Jane Doe, PCC"
+    reads "Jane Doe"). ("", "") when fewer than two name tokens are left.
+    """
+    part, _, rest = name_text.lower().partition(",")
+    name_tokens = [token for token in part.split() if token not in _all_affixes]
+    if not name_tokens and rest:
+        name_tokens = _tokens_after_affix_part(rest, _all_affixes)
+
+    if len(name_tokens) < 2:
         return "", ""
-    elif len(filtered_tokens) == 3:
-        return filtered_tokens[0], filtered_tokens[2]
-    elif len(filtered_tokens) >= 2:
-        return filtered_tokens[0], filtered_tokens[1]
+    elif len(name_tokens) == 3:
+        return name_tokens[0], name_tokens[2]
+    else:
+        return name_tokens[0], name_tokens[1]
 
 
 class _ExtractName(TestCase):
@@ -72,3 +91,14 @@ class _ExtractName(TestCase):
         first, last = extract_name("jacob more ijh jkl")
         self.assertEqual("jacob", first)
         self.assertEqual("more", last)
+
+    def test_affix_after_comma(self):
+        first, last = extract_name("mr. daniel r. abbatiello, pcc, rev.")
+        self.assertEqual(("daniel", "abbatiello"), (first, last))
+
+    def test_new_affixes(self):
+        self.assertEqual(("john", "smith"), extract_name("Rev. John Smith"))
+        self.assertEqual(("john", "smith"), extract_name("R.E.V. John Smith Jr."))
+
+    def test_leading_affix_part(self):
+        self.assertEqual(("jane", "doe"), extract_name("Dr., Jane Doe, PCC"))
@@ -6,14 +6,16 @@ from coach.validation.general import validate_default
 phone_regex = re.compile("^1?([0-9]{3})?[0-9]{7}$")
 
 
+phone_translation_table = dict.fromkeys(map(ord, "+.-() \t"), None)
+
+
 def normalize_phone(phone: str) -> str:
-    translation_table = dict.fromkeys(map(ord, "+.-() \t"), None)
-    return phone.translate(translation_table)
+    return phone.translate(phone_translation_table)
 
 
 def validate_phone(phone):
     phone = normalize_phone(phone)
-    match = re.match(phone_regex, phone) is not None
+    match = phone_regex.match(phone) is not None
     return match
 
 
@@ -0,0 +1,166 @@
+"""
+The normalize and validate step of every CoachData field. Each field has one function
+whose results are kept in a bounded LRU cache, websites and handles repeat across many
+coaches. Results are plain values and log entries (level, message, args) for the record to
+log, so a cached call still logs the same as a fresh one.
+"""
+
+from functools import lru_cache
+from unittest import TestCase
+
+from logger import Level
+from coach.validation.email import validate_email
+from coach.validation.phone import validate_phone
+from coach.validation.social import validate_handle
+from coach.validation.url import validate_url
+
+FIELD_CACHE_SIZE = 65536
+
+# Lowercased sites a field's url must be on, and the path before a handle in built urls.
+SOCIAL_MEDIA_SITES = {
+    "instagram_url": (("instagram.com", "instagr.am"), ""),
+    "linkedin_url": (("linkedin.com", "linked.in"), "in"),
+    "twitter_url": (("twitter.com",), ""),
+}
+
+
+def _changed_entry(field, value, cleaned):
+    if cleaned == value:
+        return None
+    return (
+        Level.ERROR,
+        "Input error: " + field + " '{}' changed to '{}'",
+        (value, cleaned),
+    )
+
+
+@lru_cache(maxsize=FIELD_CACHE_SIZE)
+def clean_website(website_url):
+    cleaned = website_url if validate_url(website_url) else ""
+    return cleaned, _changed_entry("website", website_url, cleaned)
+
+
+@lru_cache(maxsize=FIELD_CACHE_SIZE)
+def clean_email(email):
+    cleaned = email if validate_email(email) else ""
+    return cleaned, _changed_entry("email", email, cleaned)
+
+
+@lru_cache(maxsize=FIELD_CACHE_SIZE)
+def clean_phone(phone):
+    cleaned = phone if validate_phone(phone) else ""
+    return cleaned, _changed_entry("phone", phone, cleaned)
+
+
+@lru_cache(maxsize=FIELD_CACHE_SIZE)
+def clean_social_media(site_urls, social_media, handle_prefix=""):
+    """
+    A url on one of site_urls (a tuple of lowercased sites) is kept, a handle is turned
+    into a url on the first site, anything else becomes "".
+    """
+    if not social_media:
+        return "", None
+
+    social_media = social_media.strip()
+    if validate_url(social_media):  # is url
+        lowered = social_media.lower()
+        if any(site_url in lowered for site_url in site_urls):
+            return social_media, None
+        return (
+            "",
+            (
+                Level.ERROR,
+                "Social media url '{}' doesn't match provided sites: {}",
+                (social_media, list(site_urls)),
+            ),
+        )
+    elif validate_handle(social_media):  # is not url, is handle
+        if social_media[0] == "@":
+            social_media = social_media[1:]
+        if handle_prefix:
+            handle_prefix = "/" + handle_prefix
+
+        # social media url isn't too important, just pick the first one
+        constructed_url = "https://" + site_urls[0] + handle_prefix + "/" + social_media
+        return (
+            constructed_url,
+            (
+                Level.DETAIL,
+                "From handle '{}' constructed url '{}'",
+                (social_media, constructed_url),
+            ),
+        )
+    return (
+        "",
+        (
+            Level.ERROR,
+            "Social media was ignored for not being a valid site or handle '{}'.",
+            (social_media,),
+        ),
+    )
+
+
+def clean_social_media_field(field, social_media):
+    site_urls, handle_prefix = SOCIAL_MEDIA_SITES[field]
+    return clean_social_media(site_urls, social_media, handle_prefix)
+
+
+_CACHED = {
+    "website_url": clean_website,
+    "email": clean_email,
+    "phone": clean_phone,
+    "social_media": clean_social_media,
+}
+
+
+def cache_stats():
+    """
+    Hits, misses and size of every field cache, by field.
+    """
+    stats = {}
+    for field, function in _CACHED.items():
+        info = function.cache_info()
+        stats[field] = {"hits": info.hits, "misses": info.misses, "size": info.currsize}
+    return stats
+
+
+def clear_caches():
+    for function in _CACHED.values():
+        function.cache_clear()
+
+
+class _TestPipeline(TestCase):
+    def setUp(self):
+        clear_caches()
+
+    def test_repeated_values_hit_cache(self):
+        for _ in range(3):
+            self.assertEqual(clean_website("coachbench.com"), ("coachbench.com", None))
+        stats = cache_stats()["website_url"]
+        self.assertEqual((stats["hits"], stats["misses"]), (2, 1))
+
+    def test_changed_entry(self):
+        cleaned, entry = clean_email("not an email")
+        self.assertEqual(cleaned, "")
+        self.assertEqual(
+            entry,
+            (
+                Level.ERROR,
+                "Input error: email '{}' changed to '{}'",
+                ("not an email", ""),
+            ),
+        )
+
+    def test_social_media_handle(self):
+        self.assertEqual(
+            clean_social_media_field("linkedin_url", " @coachbench ")[0],
+            "https://linkedin.com/in/coachbench",
+        )
+        self.assertEqual(
+            clean_social_media_field("instagram_url", "https://INSTAGR.AM/coach")[0],
+            "https://INSTAGR.AM/coach",
+        )
+        self.assertEqual(
+            clean_social_media_field("twitter_url", "https://nottwitter.org/coach")[0],
+            "",
+        )
@@ -0,0 +1,236 @@
+"""
+Re-checks a stored coach dataset against the current validation rules.
+
+Run from the repository root:
+    python -m coach.validation.revalidate SOURCE [--chunk-size N] [--workers N]
+        [--output CLEANED_CSV]
+
+SOURCE is a coach data store (see coach.data_writer) or, when it ends in .csv, a csv
+written by CoachCsvWriter. Rows are validated in chunks of columns fanned out over worker
+processes. With --output every row is written again with invalid values blanked.
+"""
+
+import argparse
+from collections import Counter
+import csv
+import multiprocessing
+import os
+import shutil
+from typing import Dict, Iterator, List
+from unittest import TestCase
+
+from config_dir import config
+import logger
+from logger import Level
+from coach.data import CoachData, CoachCert
+from coach.data_writer import (
+    HEADER_ROW,
+    close_coach_data,
+    read_coach_data,
+    write_coach_data,
+)
+from coach.validation.batch import validate_column
+from cli_utils import cli_setup
+from test_utils import test_setup
+
+# Column of each source and the rule it is validated with.
+STORE_COLUMNS = {
+    "website_url": "url",
+    "email": "email",
+    "phone": "phone",
+    "instagram_url": "url",
+    "linkedin_url": "url",
+    "twitter_url": "url",
+    "source_url": "url",
+}
+CSV_COLUMNS = {
+    "Website": "url",
+    "Email": "email",
+    "Instagram": "url",
+    "Twitter": "url",
+    "Linkedin": "url",
+    "Source URL": "url",
+}
+
+
+def _chunked(rows, chunk_size) -> Iterator[List[Dict[str, str]]]:
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def read_store_rows(coach_data_storage_path):
+    for coach_data in read_coach_data(coach_data_storage_path):
+        row = {name: getattr(coach_data, name) for name in CoachData.FIELDS}
+        row["coach_cert"] = str(row["coach_cert"])
+        yield row
+
+
+def read_csv_rows(csv_file_path):
+    with open(csv_file_path, "r", newline="") as csv_file:
+        yield from csv.DictReader(csv_file)
+
+
+def revalidate_chunk(chunk_and_columns):
+    """
+    Validates every rule column of a chunk of rows, returns the rows with invalid values
+    blanked and the invalid count per column. Runs in the worker processes.
+    """
+    rows, columns = chunk_and_columns
+    invalid = Counter()
+    for column, kind in columns.items():
+        values = [row.get(column) or "" for row in rows]
+        mask, cleaned = validate_column(kind, values)
+        for row, value, valid in zip(rows, cleaned, mask):
+            # Empty values were never required, only set values can be invalid.
+            if not valid and row.get(column):
+                invalid[column] += 1
+                row[column] = value
+    return rows, invalid
+
+
+def revalidate(rows, columns, chunk_size=10000, workers=None, handle_rows=None):
+    """
+    Validates rows in chunks on workers processes (the current one when workers is 1) and
+    hands every cleaned chunk to handle_rows in order. Returns (row count, invalid counts).
+    """
+    chunks = ((chunk, columns) for chunk in _chunked(rows, chunk_size))
+    row_count = 0
+    invalid = Counter()
+
+    def collect(results):
+        nonlocal row_count
+        for cleaned_rows, chunk_invalid in results:
+            row_count += len(cleaned_rows)
+            invalid.update(chunk_invalid)
+            if handle_rows is not None:
+                handle_rows(cleaned_rows)
+
+    if workers == 1:
+        collect(map(revalidate_chunk, chunks))
+    else:
+        with multiprocessing.Pool(workers) as pool:
+            collect(pool.imap(revalidate_chunk, chunks))
+    return row_count, invalid
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("source")
+    parser.add_argument("--chunk-size", type=int, default=10000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--output")
+    args = parser.parse_args(argv)
+
+    cli_setup()
+    log = logger.get_logger()
+
+    if args.source.endswith(".csv"):
+        rows, columns = read_csv_rows(args.source), CSV_COLUMNS
+    else:
+        rows, columns = read_store_rows(args.source), STORE_COLUMNS
+
+    output_file = None
+    csv_writer = None
+    if args.output:
+        output_file = open(args.output, "w", newline="")
+
+    def write_rows(cleaned_rows):
+        nonlocal csv_writer
+        if csv_writer is None:
+            csv_writer = csv.DictWriter(output_file, fieldnames=list(cleaned_rows[0]))
+            csv_writer.writeheader()
+        csv_writer.writerows(cleaned_rows)
+
+    try:
+        row_count, invalid = revalidate(
+            rows,
+            columns,
+            chunk_size=args.chunk_size,
+            workers=args.workers,
+            handle_rows=write_rows if output_file is not None else None,
+        )
+    finally:
+        if output_file is not None:
+            output_file.close()
+
+    log.log("Revalidated {} rows from {}.", Level.SUMMARY, row_count, args.source)
+    for column in columns:
+        log.log("{:>14}: {} invalid", Level.SUMMARY, column, invalid[column])
+    return invalid
+
+
+class TestRevalidate(TestCase):
+    def setUp(self):
+        test_setup()
+        self.csv_path = config.read("TEST", "TEST_REVALIDATE_CSV_PATH")
+        self.output_path = self.csv_path + ".cleaned.csv"
+        self.store_path = config.read("TEST", "TEST_REVALIDATE_STORE_PATH")
+        self._remove_outputs()
+
+    def tearDown(self):
+        self._remove_outputs()
+
+    def _remove_outputs(self):
+        close_coach_data(self.store_path)
+        for path in (self.csv_path, self.output_path):
+            if os.path.exists(path):
+                os.remove(path)
+        if os.path.exists(self.store_path):
+            shutil.rmtree(self.store_path)
+
+    def test_revalidate_csv_in_chunks(self):
+        rows = [
+            ["Coach", "Bench", "Coach Bench", "None", "", "coachbench.com"]
+            + ["coach@bench.com", "", "", "", "http://dir.com/coach/" + str(i)]
+            for i in range(7)
+        ]
+        # Values the current rules reject, as if written before a rule was tightened.
+        rows[2][5] = "coach bench.com"
+        rows[5][6] = "coach.bench.com"
+        with open(self.csv_path, "w", newline="") as csv_file:
+            csv_writer = csv.writer(csv_file)
+            csv_writer.writerow(HEADER_ROW)
+            csv_writer.writerows(rows)
+
+        invalid = main(
+            [self.csv_path, "--chunk-size", "2", "--workers", "2"]
+            + ["--output", self.output_path]
+        )
+        self.assertEqual(invalid, Counter({"Website": 1, "Email": 1}))
+        with open(self.output_path, "r", newline="") as output_file:
+            cleaned = list(csv.DictReader(output_file))
+        self.assertEqual(
+            [row["Source URL"] for row in cleaned],
+            ["http://dir.com/coach/" + str(i) for i in range(7)],
+        )
+        self.assertEqual(cleaned[2]["Website"], "")
+        self.assertEqual(cleaned[5]["Email"], "")
+        self.assertEqual(cleaned[6]["Email"], "coach@bench.com")
+
+    def test_revalidate_store(self):
+        for i in range(3):
+            write_coach_data(
+                CoachData(
+                    "http://dir.com/coach/" + str(i),
+                    coach_cert=CoachCert.MASTER,
+                    phone="(801) 555-0100",
+                ),
+                self.store_path,
+            )
+        close_coach_data(self.store_path)
+
+        row_count, invalid = revalidate(
+            read_store_rows(self.store_path), STORE_COLUMNS, workers=1
+        )
+        self.assertEqual(row_count, 3)
+        self.assertEqual(sum(invalid.values()), 0)
+
+
+if __name__ == "__main__":
+    main()
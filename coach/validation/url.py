@@ -1,5 +1,6 @@
 import re
 from unittest import TestCase
+from urllib.parse import urlsplit
 
 from coach.validation.general import validate_default
 
@@ -23,6 +24,18 @@ def validate_url_or_default(url, default=""):
     return validate_default(validate_url, url, default)
 
 
+def website_host(website_url):
+    """
+    Lowercased host of a url, without a leading www.
+    """
+    if not website_url:
+        return ""
+    if "//" not in website_url:
+        website_url = "//" + website_url
+    host = (urlsplit(website_url.strip()).hostname or "").lower()
+    return host[4:] if host.startswith("www.") else host
+
+
 class _UrlValidatorTest(TestCase):
     def test_http(self):
         url = "http://google.com"
@@ -51,3 +64,10 @@ class _UrlValidatorTest(TestCase):
     def test_non_url(self):
         url = "notawebsite/hello"
         self.assertEqual(validate_url(url), False)
+
+    def test_website_host(self):
+        self.assertEqual(
+            website_host("https://WWW.CoachBench.com/about"), "coachbench.com"
+        )
+        self.assertEqual(website_host("coachbench.com"), "coachbench.com")
+        self.assertEqual(website_host(""), "")
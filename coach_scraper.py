@@ -11,25 +11,75 @@ from coach.validation.name import normalize_name
 from coach.validation.phone import normalize_phone
 from utils.control_flow import retry_function_sleep as retry
 
+# Evaluates every field xpath in one round trip, arguments[0] is a CoachScraper.FIELDS dict.
+# Missing single fields come back as null, missing multi fields as an empty list.
+_EXTRACT_FIELDS_SCRIPT = """
+var fields = arguments[0];
+var result = {};
+function read(node, attribute) {
+    if (!attribute) {
+        return (node.innerText || node.textContent || "").trim();
+    }
+    var value = node[attribute];
+    if (value === undefined || value === null) {
+        value = node.getAttribute(attribute);
+    }
+    return value === undefined ? null : value;
+}
+for (var name in fields) {
+    var field = fields[name];
+    if (field.all) {
+        var snapshot = document.evaluate(field.xpath, document, null,
+            XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+        var values = [];
+        for (var i = 0, length = snapshot.snapshotLength; i < length; ++i) {
+            values.push(read(snapshot.snapshotItem(i), field.attribute));
+        }
+        result[name] = values;
+    } else {
+        var node = document.evaluate(field.xpath, document, null,
+            XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+        result[name] = node === null ? null : read(node, field.attribute);
+    }
+}
+return result;
+"""
+
 
 class CoachScraper(ABC):
-    def __init__(self, driver):
+    # Field name -> {"xpath": ..., "attribute": optional attribute instead of text,
+    # "all": True to read every match as a list}. Subclasses declare their page here.
+    FIELDS = {}
+
+    def __init__(self, driver, extract_in_browser=True):
         self.driver = driver
         self.logger = logger.get_logger()
         self.retries = int(config.read("GENERAL", "COACH_RETRIES_BEFORE_FAIL"))
+        self.extract_in_browser = extract_in_browser
+
+    def extract_fields(self, source_url: str) -> dict:
+        """
+        Every declared field of the page the driver has loaded for source_url.
+        """
+        return self.driver.execute_script(_EXTRACT_FIELDS_SCRIPT, self.FIELDS)
 
     def gather_coach_data(self, source_url: str, data=None) -> Optional[CoachData]:
         coach_data = None
 
         def inner_gather():
             nonlocal coach_data
-            full_name, first_name, last_name = self.gather_name(data)
-            coach_cert = self.gather_coach_cert(data)
-            niche = self.gather_niche(data)
-            website = self.gather_website(data)
-            email = self.gather_email(data)
-            phone = self.gather_phone(data)
-            instagram_url, linkedin_url, twitter_url = self.gather_social_media(data)
+            page_data = data
+            if page_data is None and self.extract_in_browser and self.FIELDS:
+                page_data = self.extract_fields(source_url)
+            full_name, first_name, last_name = self.gather_name(page_data)
+            coach_cert = self.gather_coach_cert(page_data)
+            niche = self.gather_niche(page_data)
+            website = self.gather_website(page_data)
+            email = self.gather_email(page_data)
+            phone = self.gather_phone(page_data)
+            instagram_url, linkedin_url, twitter_url = self.gather_social_media(
+                page_data
+            )
 
             coach_data = CoachData(
                 source_url=source_url,
@@ -50,17 +100,44 @@ class CoachScraper(ABC):
             self.logger.log("Error gathering coach data.", Level.ERROR)
             self.logger.log(traceback.format_exc(), Level.ERROR)
 
-        result = retry(inner_gather, self.retries, on_exception=inner_gather_fail)
+        # Extracted data handed in won't change between tries, only a live page can.
+        max_tries = self.retries if data is None else 1
+        result = retry(inner_gather, max_tries, on_exception=inner_gather_fail)
 
         if not result:
             message = "Could not gather coach data: " + source_url
             self.logger.log(message, Level.ERROR)
             return None
 
-        self.logger.log("Coach successfully gathered." + source_url, Level.DETAIL)
+        self.logger.log("Coach successfully gathered.{}", Level.DETAIL, source_url)
 
         return coach_data
 
+    def _field(self, data, name):
+        """
+        Value of a declared field, read from extracted data when present or from the driver
+        otherwise. A missing element raises NoSuchElementException either way.
+        """
+        field = self.FIELDS[name]
+        if data is not None:
+            value = data.get(name)
+            if value is None:
+                raise NoSuchElementException("Field not found: " + name)
+            return value
+
+        if field.get("all"):
+            elements = self.driver.find_elements_by_xpath(field["xpath"])
+            return [self._read_element(element, field) for element in elements]
+        return self._read_element(
+            self.driver.find_element_by_xpath(field["xpath"]), field
+        )
+
+    @staticmethod
+    def _read_element(element, field):
+        if field.get("attribute"):
+            return element.get_attribute(field["attribute"])
+        return element.text
+
     def gather_name(self, data=None) -> (str, str, str):
         try:
             full_name, first, last = self._gather_name(data)
@@ -71,7 +148,7 @@ class CoachScraper(ABC):
             msg = "Unable to get name of coach: " + str(e)
             self.logger.log(msg, Level.ERROR)
             raise e
-        self.logger.log("Gathered name: " + first + " " + last, Level.DETAIL_PLUS)
+        self.logger.log("Gathered name: {} {}", Level.DETAIL_PLUS, first, last)
         return full_name, first, last
 
     @abstractmethod
@@ -86,7 +163,7 @@ class CoachScraper(ABC):
             self.logger.log(msg, Level.ERROR)
             return None
 
-        self.logger.log("Gathered cert: " + str(coach_cert), Level.DETAIL_PLUS)
+        self.logger.log("Gathered cert: {}", Level.DETAIL_PLUS, coach_cert)
         return coach_cert
 
     @abstractmethod
@@ -105,7 +182,7 @@ class CoachScraper(ABC):
             self.logger.log(msg, Level.ERROR)
             return None
 
-        self.logger.log("Gathered niche: " + niche, Level.DETAIL_PLUS)
+        self.logger.log("Gathered niche: {}", Level.DETAIL_PLUS, niche)
         return niche
 
     @abstractmethod
@@ -124,7 +201,7 @@ class CoachScraper(ABC):
             self.logger.log(msg, Level.ERROR)
             return ""
 
-        self.logger.log("Gathered website: " + website, Level.DETAIL_PLUS)
+        self.logger.log("Gathered website: {}", Level.DETAIL_PLUS, website)
         return website
 
     @abstractmethod
@@ -143,7 +220,7 @@ class CoachScraper(ABC):
             self.logger.log(msg, Level.ERROR)
             email = ""
 
-        self.logger.log("Gathered email: " + email, Level.DETAIL_PLUS)
+        self.logger.log("Gathered email: {}", Level.DETAIL_PLUS, email)
         return email
 
     @abstractmethod
@@ -162,7 +239,7 @@ class CoachScraper(ABC):
             self.logger.log(msg, Level.ERROR)
             phone = ""
 
-        self.logger.log("Gathered phone number: " + phone, Level.DETAIL_PLUS)
+        self.logger.log("Gathered phone number: {}", Level.DETAIL_PLUS, phone)
         return phone
 
     @abstractmethod
@@ -204,15 +281,11 @@ class CoachScraper(ABC):
             twitter = ""
 
         self.logger.log(
-            "Gathered social media. Instagram: '"
-            + instagram
-            + "'"
-            + " Twitter: '"
-            + twitter
-            + "' Linkedin: '"
-            + linkedin
-            + "'",
+            "Gathered social media. Instagram: '{}' Twitter: '{}' Linkedin: '{}'",
             Level.DETAIL_PLUS,
+            instagram,
+            twitter,
+            linkedin,
         )
 
         return instagram, linkedin, twitter
@@ -0,0 +1,263 @@
+import hashlib
+import os
+import pickle
+import shutil
+import threading
+import time
+from typing import Iterator, Optional, Tuple
+from unittest import TestCase
+import zlib
+
+from config_dir import config
+import logger
+from logger import Level
+from test_utils import test_setup
+from utils.record_log import RecordLog
+
+_BLOB_SUFFIX = ".z"
+
+
+def content_address(page_html: str) -> str:
+    return hashlib.blake2b(page_html.encode(), digest_size=20).hexdigest()
+
+
+def blob_path(directory_path, content_hash):
+    return os.path.join(
+        directory_path, "blobs", content_hash[:2], content_hash + _BLOB_SUFFIX
+    )
+
+
+def read_blob(directory_path, content_hash) -> str:
+    """
+    Html stored under content_hash, readable without opening the cache (worker processes).
+    """
+    with open(blob_path(directory_path, content_hash), "rb") as blob_file:
+        return zlib.decompress(blob_file.read()).decode()
+
+
+class HtmlCache:
+    """
+    Raw html of fetched pages. Every distinct page is zlib compressed and stored once under
+    the hash of its content, and a RecordLog of (url, fetched at, hash) entries keys the
+    blobs by url and fetch time. Once the blobs outgrow max_bytes the oldest are evicted,
+    blobs no url's latest fetch points at first. Evictions rewrite the log to the latest
+    entry of each url and blob left once it has doubled since the last rewrite. Puts are
+    safe from any thread.
+    """
+
+    def __init__(self, directory_path=None, max_bytes=None):
+        if directory_path is None:
+            directory_path = config.read("GENERAL", "HTML_CACHE_PATH")
+        if max_bytes is None:
+            max_bytes = int(config.read("GENERAL", "HTML_CACHE_MAX_BYTES"))
+        self.directory_path = directory_path
+        self.max_bytes = max_bytes
+        self.logger = logger.get_logger()
+        self._lock = threading.Lock()
+        self._blob_bytes = {}
+        # Latest fetch time of each blob and the latest (fetched at, hash) of each url.
+        self._blob_fetched_at = {}
+        self._latest = {}
+
+        os.makedirs(os.path.join(directory_path, "blobs"), exist_ok=True)
+        for entry_dir in os.scandir(os.path.join(directory_path, "blobs")):
+            for blob in os.scandir(entry_dir.path):
+                if blob.name.endswith(_BLOB_SUFFIX):
+                    self._blob_bytes[blob.name[: -len(_BLOB_SUFFIX)]] = (
+                        blob.stat().st_size
+                    )
+        self.total_bytes = sum(self._blob_bytes.values())
+        self._record_log = RecordLog(os.path.join(directory_path, "index"))
+        self._index_records = 0
+        for payload in self._record_log:
+            url, fetched_at, content_hash = pickle.loads(payload)
+            self._index_records += 1
+            # Entries of evicted blobs stay in the log until it is compacted.
+            if content_hash in self._blob_bytes:
+                self._index(url, fetched_at, content_hash)
+        self._compact_index_at = 2 * self._index_records
+
+    def __len__(self):
+        return len(self._latest)
+
+    def put(self, url, page_html, fetched_at=None) -> str:
+        if fetched_at is None:
+            fetched_at = time.time()
+        content_hash = content_address(page_html)
+        with self._lock:
+            if content_hash not in self._blob_bytes:
+                self._write_blob(content_hash, zlib.compress(page_html.encode()))
+            self._record_log.append(
+                pickle.dumps(
+                    (url, fetched_at, content_hash), protocol=pickle.HIGHEST_PROTOCOL
+                )
+            )
+            self._index_records += 1
+            self._index(url, fetched_at, content_hash)
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+        return content_hash
+
+    def get(self, url) -> Optional[str]:
+        """
+        Html of the latest cached fetch of url.
+        """
+        latest = self._latest.get(url)
+        if latest is None:
+            return None
+        return read_blob(self.directory_path, latest[1])
+
+    def latest(self) -> Iterator[Tuple[str, float, str]]:
+        """
+        (url, fetched at, hash) of the latest cached fetch of every url.
+        """
+        with self._lock:
+            entries = [(url, *latest) for url, latest in self._latest.items()]
+        return iter(entries)
+
+    def close(self):
+        self._record_log.close()
+
+    def _index(self, url, fetched_at, content_hash):
+        if fetched_at >= self._latest.get(url, (fetched_at, None))[0]:
+            self._latest[url] = (fetched_at, content_hash)
+        if fetched_at >= self._blob_fetched_at.get(content_hash, fetched_at):
+            self._blob_fetched_at[content_hash] = fetched_at
+
+    def _write_blob(self, content_hash, compressed):
+        path = blob_path(self.directory_path, content_hash)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".temp", "wb") as blob_file:
+            blob_file.write(compressed)
+        os.replace(path + ".temp", path)
+        self._blob_bytes[content_hash] = len(compressed)
+        self.total_bytes += len(compressed)
+
+    def _evict(self):
+        current = {content_hash for _, content_hash in self._latest.values()}
+        candidates = sorted(
+            self._blob_bytes,
+            key=lambda h: (h in current, self._blob_fetched_at.get(h, 0.0)),
+        )
+        evicted = 0
+        for content_hash in candidates:
+            if self.total_bytes <= self.max_bytes:
+                break
+            os.remove(blob_path(self.directory_path, content_hash))
+            self.total_bytes -= self._blob_bytes.pop(content_hash)
+            self._blob_fetched_at.pop(content_hash, None)
+            evicted += 1
+        if evicted:
+            self._latest = {
+                url: latest
+                for url, latest in self._latest.items()
+                if latest[1] in self._blob_bytes
+            }
+            self.logger.log("Evicted {} cached pages.", Level.DETAIL, evicted)
+            if self._index_records >= self._compact_index_at:
+                self._compact_index()
+
+    def _compact_index(self):
+        entries = {}
+        for payload in self._record_log:
+            url, fetched_at, content_hash = pickle.loads(payload)
+            if content_hash in self._blob_bytes:
+                key = (url, content_hash)
+                entries[key] = max(fetched_at, entries.get(key, fetched_at))
+        self._record_log.rewrite(
+            [
+                pickle.dumps(
+                    (url, fetched_at, content_hash), protocol=pickle.HIGHEST_PROTOCOL
+                )
+                for (url, content_hash), fetched_at in entries.items()
+            ]
+        )
+        self._index_records = len(entries)
+        self._compact_index_at = 2 * len(entries)
+
+
+class _TestHtmlCache(TestCase):
+    def setUp(self):
+        test_setup()
+        self.path = config.read("TEST", "TEST_HTML_CACHE_PATH")
+        self._remove()
+
+    def tearDown(self):
+        self._remove()
+
+    def _remove(self):
+        if os.path.isdir(self.path):
+            shutil.rmtree(self.path)
+
+    def test_identical_pages_stored_once(self):
+        cache = HtmlCache(self.path, max_bytes=1 << 20)
+        page_html = "<html><body>" + "coach " * 500 + "</body></html>"
+        first = cache.put("http://lcs.com/1", page_html, fetched_at=1.0)
+        second = cache.put("http://lcs.com/2", page_html, fetched_at=2.0)
+        self.assertEqual(first, second)
+        self.assertEqual(
+            len(os.listdir(os.path.join(self.path, "blobs", first[:2]))), 1
+        )
+        self.assertLess(cache.total_bytes, len(page_html))
+        cache.close()
+
+        reopened = HtmlCache(self.path, max_bytes=1 << 20)
+        self.assertEqual(reopened.get("http://lcs.com/2"), page_html)
+        self.assertEqual(
+            sorted(url for url, _, _ in reopened.latest()),
+            ["http://lcs.com/1", "http://lcs.com/2"],
+        )
+        reopened.close()
+
+    def test_latest_fetch_wins(self):
+        cache = HtmlCache(self.path, max_bytes=1 << 20)
+        cache.put("http://lcs.com/1", "<p>new</p>", fetched_at=2.0)
+        cache.put("http://lcs.com/1", "<p>old</p>", fetched_at=1.0)
+        self.assertEqual(cache.get("http://lcs.com/1"), "<p>new</p>")
+        self.assertIsNone(cache.get("http://lcs.com/2"))
+        cache.close()
+
+    def test_eviction_keeps_latest_fetches(self):
+        pages = [os.urandom(300).hex() for _ in range(4)]
+        cache = HtmlCache(self.path, max_bytes=1 << 20)
+        # Room for three blobs, compressed sizes differ by a few bytes.
+        blob_bytes = len(zlib.compress(pages[0].encode()))
+        cache.max_bytes = blob_bytes * 3 + blob_bytes // 2
+        cache.put("http://lcs.com/1", pages[0], fetched_at=1.0)
+        cache.put("http://lcs.com/2", pages[1], fetched_at=2.0)
+        cache.put("http://lcs.com/1", pages[2], fetched_at=3.0)
+        # Over the bound, the superseded first fetch goes before older current ones.
+        cache.put("http://lcs.com/3", pages[3], fetched_at=4.0)
+        self.assertLessEqual(cache.total_bytes, cache.max_bytes)
+        self.assertEqual(cache.get("http://lcs.com/1"), pages[2])
+        self.assertEqual(cache.get("http://lcs.com/2"), pages[1])
+        self.assertFalse(
+            os.path.exists(blob_path(self.path, content_address(pages[0])))
+        )
+
+        cache.max_bytes = blob_bytes * 2 + blob_bytes // 2
+        cache.put("http://lcs.com/4", pages[3], fetched_at=5.0)
+        self.assertIsNone(cache.get("http://lcs.com/2"))
+        cache.close()
+
+        reopened = HtmlCache(self.path, max_bytes=cache.max_bytes)
+        self.assertEqual(len(reopened), 3)
+        self.assertIsNone(reopened.get("http://lcs.com/2"))
+        reopened.close()
+
+    def test_eviction_compacts_index(self):
+        pages = [os.urandom(300).hex() for _ in range(40)]
+        blob_bytes = len(zlib.compress(pages[0].encode()))
+        cache = HtmlCache(self.path, max_bytes=blob_bytes * 2 + blob_bytes // 2)
+        for i, page_html in enumerate(pages):
+            cache.put("http://lcs.com/" + str(i % 3), page_html, fetched_at=float(i))
+        cache.close()
+
+        # Two blobs are left, entries of the evicted ones go with the rewrites.
+        index = RecordLog(os.path.join(self.path, "index"))
+        self.assertLess(len(list(index)), 8)
+        index.close()
+        reopened = HtmlCache(self.path, max_bytes=cache.max_bytes)
+        self.assertEqual(reopened.get("http://lcs.com/0"), pages[39])
+        self.assertEqual(reopened.get("http://lcs.com/2"), pages[38])
+        reopened.close()
@@ -1,5 +1,14 @@
+from datetime import datetime
+import io
+import json
+import os
+import queue
 import sys
+import threading
+import time
 from enum import IntEnum
+from typing import Dict, Optional
+from unittest import TestCase
 
 from utils.control_flow import fail_with_message_to_file as fail
 
@@ -14,20 +23,242 @@ class Level(IntEnum):
 
 
 class Logger:
-    def __init__(self, log_level=1, log_file=None):
+    def __init__(self, log_level=1, log_file=None, sink=None):
+        """
+        Messages are printed to log_file (stdout by default) on the calling thread, or
+        handed to sink (see QueueLogSink) to be written in the background.
+        """
         self.log_level = log_level
         if not log_file:
             self.log_file = sys.stdout
         else:
             self.log_file = log_file
+        self.sink = sink
 
-    def log(self, message, level):
+    def is_enabled(self, level):
+        return level <= self.log_level
+
+    def log(self, message, level, *args):
+        """
+        Writes message when level is enabled. Formatting is deferred until then: args are
+        applied with str.format and a callable message is called for its text.
+        """
         if level <= self.log_level:
+            if self.sink is not None:
+                self.sink.emit(level, render_message(message, args))
+                return
             full_message = "{level:15} : {message}".format(
-                level=level.name, message=message
+                level=level.name, message=render_message(message, args)
             )
             print(full_message, file=self.log_file)
 
+    def close(self):
+        if self.sink is not None:
+            self.sink.close()
+
+
+_SINK_CLOSED = object()
+
+
+class QueueLogSink:
+    """
+    Writes log records from a background thread so logging never blocks the scraping
+    threads. emit() only enqueues; when the bounded queue is full the record is dropped
+    and counted. The writer drains up to batch_size records per write, rotating the file
+    once it reaches max_bytes (path.1 is the newest of backup_count old files).
+
+    Levels in rate_limits keep at most that many records per second, levels in
+    sample_every keep one record in every n, the rest are counted as suppressed.
+
+    Each batch is a single append so several processes may share a file, but only one of
+    them should be given max_bytes to rotate it. Records emitted once close() has started
+    are written by the emitting thread, after close() has finished to stderr.
+    """
+
+    def __init__(
+        self,
+        path=None,
+        stream=None,
+        max_bytes=0,
+        backup_count=5,
+        json_lines=False,
+        max_queue=10000,
+        batch_size=500,
+        rate_limits: Optional[Dict[Level, float]] = None,
+        sample_every: Optional[Dict[Level, int]] = None,
+    ):
+        self.path = path
+        self.stream = stream if stream is not None or path is not None else sys.stdout
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.json_lines = json_lines
+        self.batch_size = batch_size
+        self.rate_limits = dict(rate_limits or {})
+        self.sample_every = dict(sample_every or {})
+        self.dropped = 0
+        self.suppressed = 0
+        self.written = 0
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._counter_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._closing = False
+        self._tokens = {level: rate for level, rate in self.rate_limits.items()}
+        self._token_times = {level: time.monotonic() for level in self.rate_limits}
+        self._sample_counts = {level: 0 for level in self.sample_every}
+        self._file = None
+        if self.path is not None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._file = open(self.path, "a", encoding="utf-8")
+        self._thread = threading.Thread(target=self._write_loop, daemon=True)
+        self._thread.start()
+
+    def emit(self, level, message):
+        if not self._admit(level):
+            return
+        record = (time.time(), level, threading.current_thread().name, message)
+        if self._closing:
+            self._write_through(record)
+            return
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            with self._counter_lock:
+                self.dropped += 1
+
+    def close(self):
+        """
+        Writes everything queued so far, then a line with the drop and suppress counts.
+        """
+        if self._closing:
+            return
+        self._closing = True
+        self._queue.put(_SINK_CLOSED)
+        self._thread.join()
+        with self._write_lock:
+            if self.dropped or self.suppressed:
+                self._write(
+                    [
+                        (
+                            time.time(),
+                            Level.WARNING,
+                            threading.current_thread().name,
+                            "Log sink dropped "
+                            + str(self.dropped)
+                            + " and suppressed "
+                            + str(self.suppressed)
+                            + " records.",
+                        )
+                    ]
+                )
+            if self._file is not None:
+                self._file.close()
+
+    def _admit(self, level):
+        if level not in self.rate_limits and level not in self.sample_every:
+            return True
+        with self._counter_lock:
+            if level in self.sample_every:
+                self._sample_counts[level] += 1
+                if (self._sample_counts[level] - 1) % self.sample_every[level]:
+                    self.suppressed += 1
+                    return False
+            if level in self.rate_limits:
+                # Token bucket holding up to one second's worth of records.
+                rate = self.rate_limits[level]
+                now = time.monotonic()
+                self._tokens[level] = min(
+                    rate,
+                    self._tokens[level] + (now - self._token_times[level]) * rate,
+                )
+                self._token_times[level] = now
+                if self._tokens[level] < 1:
+                    self.suppressed += 1
+                    return False
+                self._tokens[level] -= 1
+        return True
+
+    def _write_loop(self):
+        closed = False
+        while not closed:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if any(record is _SINK_CLOSED for record in batch):
+                # Records emitted before close() saw the flag can follow the sentinel.
+                closed = True
+                while True:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                batch = [record for record in batch if record is not _SINK_CLOSED]
+            if batch:
+                self._write_through(*batch)
+
+    def _write_through(self, *batch):
+        with self._write_lock:
+            if self._file is not None and self._file.closed:
+                sys.stderr.write("".join(self._format(record) for record in batch))
+                return
+            try:
+                self._write(batch)
+                self.written += len(batch)
+            except Exception as e:
+                print("Log sink write failed: " + str(e), file=sys.stderr)
+
+    def _write(self, batch):
+        text = "".join(self._format(record) for record in batch)
+        if self._file is not None:
+            if self.max_bytes and self._file.tell() >= self.max_bytes:
+                self._rotate()
+            self._file.write(text)
+            self._file.flush()
+        else:
+            self.stream.write(text)
+            self.stream.flush()
+
+    def _format(self, record):
+        created, level, thread_name, message = record
+        if self.json_lines:
+            return (
+                json.dumps(
+                    {
+                        "time": datetime.fromtimestamp(created).isoformat(),
+                        "level": level.name,
+                        "thread": thread_name,
+                        "message": message,
+                    }
+                )
+                + "\n"
+            )
+        return "{level:15} : {message}\n".format(level=level.name, message=message)
+
+    def _rotate(self):
+        self._file.close()
+        for index in range(self.backup_count - 1, 0, -1):
+            source = self.path + "." + str(index)
+            if os.path.exists(source):
+                os.replace(source, self.path + "." + str(index + 1))
+        if self.backup_count:
+            os.replace(self.path, self.path + ".1")
+        else:
+            os.remove(self.path)
+        self._file = open(self.path, "a", encoding="utf-8")
+
+
+def render_message(message, args=()):
+    if callable(message):
+        return message()
+    if args:
+        return message.format(*args)
+    return message
+
 
 _LOGGER_STORE = {}
 
@@ -45,9 +276,161 @@ def get_logger(logger="Global"):
     return _LOGGER_STORE[logger]
 
 
-def initialize_logger(log_level, logger="Global", log_file=None):
+def initialize_logger(log_level, logger="Global", log_file=None, sink=None):
     global _LOGGER_STORE
     if logger in _LOGGER_STORE:
         fail("Logger '" + logger + "' already exists.")
 
-    _LOGGER_STORE[logger] = Logger(log_level, log_file)
+    _LOGGER_STORE[logger] = Logger(log_level, log_file, sink)
+
+
+class _TestLogger(TestCase):
+    def test_format_args(self):
+        log_file = io.StringIO()
+        Logger(Level.DETAIL, log_file).log(
+            "Gathered name: {} {}", Level.DETAIL, "a", "b"
+        )
+        self.assertEqual(log_file.getvalue(), "DETAIL          : Gathered name: a b\n")
+
+    def test_filtered_message_not_rendered(self):
+        log_file = io.StringIO()
+        rendered = []
+
+        def message():
+            rendered.append(1)
+            return "snapshot"
+
+        summary_logger = Logger(Level.SUMMARY, log_file)
+        summary_logger.log(message, Level.DETAIL_PLUS)
+        self.assertEqual(rendered, [])
+        self.assertFalse(summary_logger.is_enabled(Level.DETAIL_PLUS))
+        summary_logger.log(message, Level.SUMMARY)
+        self.assertEqual(rendered, [1])
+        self.assertEqual(log_file.getvalue(), "SUMMARY         : snapshot\n")
+
+    def test_braces_kept_without_args(self):
+        log_file = io.StringIO()
+        Logger(Level.ERROR, log_file).log("{'x': 1}", Level.ERROR)
+        self.assertEqual(log_file.getvalue(), "ERROR           : {'x': 1}\n")
+
+
+class _BlockedStream:
+    """
+    Holds every write until released, standing in for a stalled disk or pipe.
+    """
+
+    def __init__(self):
+        self.released = threading.Event()
+        self.text = ""
+
+    def write(self, text):
+        self.released.wait()
+        self.text += text
+
+    def flush(self):
+        pass
+
+
+class _TestQueueLogSink(TestCase):
+    def setUp(self):
+        from config_dir import config
+        from test_utils import test_setup
+
+        test_setup()
+        self.log_path = config.read("TEST", "TEST_LOG_PATH")
+        self._remove_logs()
+
+    def tearDown(self):
+        self._remove_logs()
+
+    def _remove_logs(self):
+        directory = os.path.dirname(self.log_path)
+        for name in os.listdir(directory):
+            if name.startswith(os.path.basename(self.log_path)):
+                os.remove(os.path.join(directory, name))
+
+    def test_logger_writes_through_sink(self):
+        sink = QueueLogSink(self.log_path)
+        sink_logger = Logger(Level.DETAIL, sink=sink)
+        for i in range(100):
+            sink_logger.log("Coach {}", Level.DETAIL, i)
+        sink_logger.log("Filtered", Level.DETAIL_PLUS)
+        sink_logger.close()
+        with open(self.log_path, "r") as log_file:
+            lines = log_file.read().splitlines()
+        self.assertEqual(len(lines), 100)
+        self.assertEqual(lines[42], "DETAIL          : Coach 42")
+
+    def test_json_lines(self):
+        sink = QueueLogSink(self.log_path, json_lines=True)
+        sink.emit(Level.ERROR, "Coach page load timeout.")
+        sink.close()
+        with open(self.log_path, "r") as log_file:
+            record = json.loads(log_file.readline())
+        self.assertEqual(record["level"], "ERROR")
+        self.assertEqual(record["message"], "Coach page load timeout.")
+        self.assertEqual(record["thread"], threading.current_thread().name)
+
+    def test_rotation(self):
+        sink = QueueLogSink(self.log_path, max_bytes=200, backup_count=2, batch_size=1)
+        for i in range(100):
+            sink.emit(Level.SUMMARY, "Coach " + str(i))
+        sink.close()
+        self.assertTrue(os.path.isfile(self.log_path + ".1"))
+        self.assertTrue(os.path.isfile(self.log_path + ".2"))
+        self.assertFalse(os.path.exists(self.log_path + ".3"))
+        with open(self.log_path, "r") as log_file:
+            self.assertTrue(log_file.read().endswith("Coach 99\n"))
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        stream = _BlockedStream()
+        sink = QueueLogSink(stream=stream, max_queue=10, batch_size=10)
+        start = time.monotonic()
+        for i in range(1000):
+            sink.emit(Level.DETAIL, "Coach " + str(i))
+        self.assertLess(time.monotonic() - start, 1.0)
+        stream.released.set()
+        sink.close()
+        self.assertGreater(sink.dropped, 0)
+        self.assertEqual(sink.written + sink.dropped, 1000)
+        self.assertIn("dropped " + str(sink.dropped), stream.text)
+
+    def test_sampling_and_rate_limit(self):
+        stream = io.StringIO()
+        sink = QueueLogSink(
+            stream=stream,
+            sample_every={Level.DETAIL_PLUS: 10},
+            rate_limits={Level.DETAIL: 5},
+        )
+        for i in range(100):
+            sink.emit(Level.DETAIL_PLUS, "Field " + str(i))
+            sink.emit(Level.DETAIL, "Coach " + str(i))
+            sink.emit(Level.ERROR, "Error " + str(i))
+        sink.close()
+        lines = stream.getvalue().splitlines()
+        self.assertEqual(sum(line.startswith("DETAIL_PLUS") for line in lines), 10)
+        self.assertIn("DETAIL_PLUS     : Field 90", lines)
+        self.assertLess(sum(line.startswith("DETAIL ") for line in lines), 10)
+        self.assertEqual(sum(line.startswith("ERROR") for line in lines), 100)
+        self.assertGreaterEqual(sink.suppressed, 180)
+
+    def test_records_after_close_started_are_written(self):
+        stream = _BlockedStream()
+        sink = QueueLogSink(stream=stream)
+        sink.emit(Level.SUMMARY, "Before close")
+        # A record emitted as close() queued its sentinel lands behind it.
+        sink._queue.put(_SINK_CLOSED)
+        sink.emit(Level.SUMMARY, "Racing close")
+        stream.released.set()
+        sink._thread.join(timeout=5)
+        self.assertFalse(sink._thread.is_alive())
+        sink.close()
+        sink.emit(Level.SUMMARY, "After close")
+        self.assertEqual(
+            stream.text.splitlines(),
+            [
+                "SUMMARY         : Before close",
+                "SUMMARY         : Racing close",
+                "SUMMARY         : After close",
+            ],
+        )
@@ -1,20 +1,48 @@
 from config_dir import config
 import logger
-from logger import Level
-from selenium import webdriver
+from logger import Level, QueueLogSink
+from selenium_utils import create_driver
 
 from sites.coaching_federation.cf_scraper import FederationWebScraper
 
 
+def _read_level_map(option, value_type):
+    """
+    "DETAIL_PLUS:10, DETAIL:200" -> {Level.DETAIL_PLUS: 10, Level.DETAIL: 200}
+    """
+    level_map = {}
+    for entry in config.read("LOGGING", option).split(","):
+        if entry.strip():
+            level, value = entry.split(":")
+            level_map[Level[level.strip()]] = value_type(value)
+    return level_map
+
+
+def create_log_sink():
+    log_file_path = config.read("LOGGING", "LOG_FILE_PATH").strip()
+    return QueueLogSink(
+        path=log_file_path or None,
+        max_bytes=int(config.read("LOGGING", "MAX_BYTES")),
+        backup_count=int(config.read("LOGGING", "BACKUP_COUNT")),
+        json_lines=config.read("LOGGING", "JSON_LINES").strip().lower()
+        in ("1", "true", "yes"),
+        max_queue=int(config.read("LOGGING", "QUEUE_SIZE")),
+        rate_limits=_read_level_map("RATE_LIMITS", float),
+        sample_every=_read_level_map("SAMPLE_EVERY", int),
+    )
+
+
 def main():
     config.load_config("config_dir/config.ini")
-    logger.initialize_logger(Level.DETAIL_PLUS)
-    driver = webdriver.Firefox()
-    driver.set_page_load_timeout(60)
-    # lcs = LifeCoachSchoolWebScraper(driver)
-    # lcs.process_all_coaches()
-    fcs = FederationWebScraper(driver)
-    fcs.process_all_coaches()
+    logger.initialize_logger(Level.DETAIL_PLUS, sink=create_log_sink())
+    try:
+        driver = create_driver(page_load_timeout=60)
+        # lcs = LifeCoachSchoolWebScraper(driver)
+        # lcs.process_all_coaches()
+        fcs = FederationWebScraper(driver)
+        fcs.process_all_coaches()
+    finally:
+        logger.get_logger().close()
 
 
 if __name__ == "__main__":
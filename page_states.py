@@ -0,0 +1,151 @@
+from collections import namedtuple
+import hashlib
+import json
+import os
+import pickle
+import shutil
+from typing import Optional
+from unittest import TestCase
+
+from config_dir import config
+from test_utils import test_setup
+from utils.record_log import RecordLog
+
+# What was stored for a url: validators the server sent and a hash of the extracted fields.
+PageState = namedtuple("PageState", ["etag", "last_modified", "content_hash"])
+
+
+class _Unchanged:
+    def __repr__(self):
+        return "UNCHANGED"
+
+
+# Passed to result handlers in place of coach data for a page that didn't change.
+UNCHANGED = _Unchanged()
+
+
+def content_hash(fields):
+    """
+    Hash of a page's extracted fields (CoachScraper.extract_fields), whitespace normalized
+    so markup reflows don't count as a change.
+    """
+    normalized = {
+        name: " ".join(value.split()) if isinstance(value, str) else value
+        for name, value in fields.items()
+    }
+    return hashlib.blake2b(
+        json.dumps(normalized, sort_keys=True).encode(), digest_size=16
+    ).hexdigest()
+
+
+def page_state(response_headers, fields) -> PageState:
+    return PageState(
+        response_headers.get("ETag") if response_headers else None,
+        response_headers.get("Last-Modified") if response_headers else None,
+        content_hash(fields),
+    )
+
+
+def conditional_headers(state: Optional[PageState]):
+    """
+    Request headers that let the server answer 304 Not Modified for a page stored as state.
+    """
+    headers = {}
+    if state is not None:
+        if state.etag:
+            headers["If-None-Match"] = state.etag
+        if state.last_modified:
+            headers["If-Modified-Since"] = state.last_modified
+    return headers
+
+
+def is_unchanged(previous: Optional[PageState], state: PageState):
+    return previous is not None and previous.content_hash == state.content_hash
+
+
+class PageStates:
+    """
+    PageState of every stored url, kept in a RecordLog of (url, state) records where the
+    last record of a url wins. Set a url's state only once its coach data is stored.
+    """
+
+    def __init__(self, directory_path=None):
+        if directory_path is None:
+            directory_path = config.read("GENERAL", "PAGE_STATES_PATH")
+        self._record_log = RecordLog(directory_path)
+        self._states = {}
+        for payload in self._record_log:
+            url, state = pickle.loads(payload)
+            self._states[url] = PageState(*state)
+
+    def __len__(self):
+        return len(self._states)
+
+    def get(self, url) -> Optional[PageState]:
+        return self._states.get(url)
+
+    def set(self, url, state: PageState):
+        if self._states.get(url) == state:
+            return
+        self._record_log.append(
+            pickle.dumps((url, tuple(state)), protocol=pickle.HIGHEST_PROTOCOL)
+        )
+        self._states[url] = state
+
+    def close(self):
+        self._record_log.close()
+
+
+class _TestPageStates(TestCase):
+    def setUp(self):
+        test_setup()
+        self.path = config.read("TEST", "TEST_PAGE_STATES_PATH")
+        self._remove()
+
+    def tearDown(self):
+        self._remove()
+
+    def _remove(self):
+        if os.path.isdir(self.path):
+            shutil.rmtree(self.path)
+
+    def test_content_hash_ignores_whitespace(self):
+        self.assertEqual(
+            content_hash({"name": "Vanessa  Foerster\n", "links": ["a"]}),
+            content_hash({"links": ["a"], "name": " Vanessa Foerster"}),
+        )
+        self.assertNotEqual(
+            content_hash({"name": "Vanessa Foerster"}),
+            content_hash({"name": "Vanessa Förster"}),
+        )
+
+    def test_conditional_headers(self):
+        self.assertEqual(conditional_headers(None), {})
+        state = page_state(
+            {"ETag": '"abc"', "Last-Modified": "Mon, 01 Jan 2024 00:00:00 GMT"},
+            {"name": "Vanessa Foerster"},
+        )
+        self.assertEqual(
+            conditional_headers(state),
+            {
+                "If-None-Match": '"abc"',
+                "If-Modified-Since": "Mon, 01 Jan 2024 00:00:00 GMT",
+            },
+        )
+        self.assertTrue(
+            is_unchanged(state, page_state({}, {"name": "Vanessa Foerster"}))
+        )
+        self.assertFalse(is_unchanged(None, state))
+
+    def test_last_state_survives_reopen(self):
+        page_states = PageStates(self.path)
+        page_states.set("http://lcs.com/1", PageState('"a"', None, "1"))
+        page_states.set("http://lcs.com/1", PageState('"b"', None, "2"))
+        page_states.set("http://lcs.com/2", PageState(None, None, "3"))
+        page_states.close()
+
+        reopened = PageStates(self.path)
+        self.assertEqual(len(reopened), 2)
+        self.assertEqual(reopened.get("http://lcs.com/1"), PageState('"b"', None, "2"))
+        self.assertIsNone(reopened.get("http://lcs.com/3"))
+        reopened.close()
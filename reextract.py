@@ -0,0 +1,213 @@
+"""
+Rebuilds coach data from the html cache, without any network or browser.
+
+Run from the repository root:
+    python -m reextract SITE OUTPUT_STORE [--cache CACHE_PATH] [--workers N]
+        [--chunk-size N] [--url-contains TEXT] [--csv CSV_FILE]
+
+SITE is one of SITES. The latest cached page of every url containing the site's host (or
+--url-contains) is run through the site's FIELDS and gather methods in worker processes,
+and the coach data is written to the OUTPUT_STORE coach data store and optionally a csv.
+"""
+
+import argparse
+import multiprocessing
+import os
+import shutil
+from unittest import TestCase
+
+from config_dir import config
+import logger
+from logger import Level
+from coach.data_writer import (
+    CoachCsvWriter,
+    close_coach_data,
+    read_coach_data,
+    write_coach_data,
+)
+from html_cache import HtmlCache, blob_path, read_blob
+from sites.coaching_federation.cf_scraper import FederationCoachScraper
+from sites.life_coach_school.lcs_scraper import LifeCoachSchoolCoachScraper
+from static_html import extract_fields_from_html
+from cli_utils import cli_setup
+from test_utils import test_setup
+
+# Site name -> (coach scraper, text every url of the site contains).
+SITES = {
+    "lcs": (LifeCoachSchoolCoachScraper, "thelifecoachschool.com"),
+    "federation": (FederationCoachScraper, "coachingfederation.org"),
+}
+
+
+def _init_worker():
+    # Spawned workers start without the config and logger a forked one inherits.
+    cli_setup()
+
+
+def reextract_chunk(chunk):
+    """
+    Returns (url, coach data or None) for every (url, content hash) of a chunk of cached
+    pages, None also for a page that can't be read or parsed. Runs in the worker processes.
+    """
+    site, cache_path, entries = chunk
+    coach_scraper = SITES[site][0](None, extract_in_browser=False)
+    results = []
+    for url, content_hash in entries:
+        try:
+            # The blob can be gone too, evicted by a crawl running alongside.
+            fields = extract_fields_from_html(
+                read_blob(cache_path, content_hash), coach_scraper.FIELDS, base_url=url
+            )
+            coach_data = coach_scraper.gather_coach_data(url, data=fields)
+        except Exception as e:
+            logger.get_logger().log(
+                "Could not read cached page: " + url + " " + repr(e), Level.ERROR
+            )
+            coach_data = None
+        results.append((url, coach_data))
+    return results
+
+
+def reextract(site, cache_path, url_contains, workers=None, chunk_size=100):
+    """
+    Yields (url, coach data or None) for the latest cached page of every matching url.
+    """
+    html_cache = HtmlCache(cache_path)
+    entries = sorted(
+        (url, content_hash)
+        for url, _, content_hash in html_cache.latest()
+        if url_contains in url
+    )
+    html_cache.close()
+    chunks = [
+        (site, cache_path, entries[i : i + chunk_size])
+        for i in range(0, len(entries), chunk_size)
+    ]
+    if workers == 1:
+        for results in map(reextract_chunk, chunks):
+            yield from results
+        return
+    with multiprocessing.Pool(workers, initializer=_init_worker) as pool:
+        for results in pool.imap(reextract_chunk, chunks):
+            yield from results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("site", choices=sorted(SITES))
+    parser.add_argument("output")
+    parser.add_argument("--cache")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--chunk-size", type=int, default=100)
+    parser.add_argument("--url-contains")
+    parser.add_argument("--csv")
+    args = parser.parse_args(argv)
+
+    cli_setup()
+    log = logger.get_logger()
+    cache_path = args.cache or config.read("GENERAL", "HTML_CACHE_PATH")
+    url_contains = args.url_contains
+    if url_contains is None:
+        url_contains = SITES[args.site][1]
+
+    csv_writer = CoachCsvWriter(args.csv) if args.csv else None
+    pages = 0
+    rebuilt = 0
+    try:
+        for url, coach_data in reextract(
+            args.site, cache_path, url_contains, args.workers, args.chunk_size
+        ):
+            pages += 1
+            if coach_data is None:
+                log.log("Could not rebuild coach from cache: " + url, Level.ERROR)
+                continue
+            write_coach_data(coach_data, args.output)
+            if csv_writer is not None:
+                csv_writer.write_coach(coach_data)
+            rebuilt += 1
+    finally:
+        close_coach_data(args.output)
+        if csv_writer is not None:
+            csv_writer.close()
+
+    log.log("Rebuilt {} of {} cached pages.", Level.SUMMARY, rebuilt, pages)
+    return rebuilt
+
+
+class _TestReextract(TestCase):
+    FIXTURES_PATH = os.path.join(
+        os.path.dirname(__file__), "sites", "life_coach_school", "fixtures"
+    )
+
+    def setUp(self):
+        test_setup()
+        self.cache_path = config.read("TEST", "TEST_HTML_CACHE_PATH")
+        self.store_path = config.read("TEST", "TEST_REEXTRACT_STORE_PATH")
+        self._remove()
+
+    def tearDown(self):
+        self._remove()
+
+    def _remove(self):
+        close_coach_data(self.store_path)
+        for path in (self.cache_path, self.store_path):
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+
+    def _fixture(self, name):
+        path = os.path.join(self.FIXTURES_PATH, "certified-coach", name, "index.html")
+        with open(path, "r") as fixture_file:
+            return fixture_file.read()
+
+    def test_reextract_from_cache(self):
+        base_url = "https://thelifecoachschool.com/certified-coach/"
+        html_cache = HtmlCache(self.cache_path)
+        for name in ("vanessa-foerster", "anusha-streubel"):
+            html_cache.put(base_url + name + "/", self._fixture(name))
+        html_cache.put("https://elsewhere.com/coach/", "<html></html>")
+        # An empty page fails on its own without stopping the rebuild.
+        html_cache.put(base_url + "empty-page/", "")
+        html_cache.close()
+
+        rebuilt = main(
+            ["lcs", self.store_path, "--cache", self.cache_path]
+            + ["--workers", "2", "--chunk-size", "1"]
+        )
+        self.assertEqual(rebuilt, 2)
+        stored = {cd.source_url: cd for cd in read_coach_data(self.store_path)}
+        self.assertEqual(
+            sorted(stored),
+            [base_url + "anusha-streubel/", base_url + "vanessa-foerster/"],
+        )
+        self.assertEqual(
+            stored[base_url + "anusha-streubel/"].twitter_url,
+            "https://twitter.com/anushastreubel",
+        )
+
+    def test_evicted_blob_fails_its_page_only(self):
+        base_url = "https://thelifecoachschool.com/certified-coach/"
+        html_cache = HtmlCache(self.cache_path)
+        cached_hash = html_cache.put(
+            base_url + "anusha-streubel/", self._fixture("anusha-streubel")
+        )
+        evicted_hash = html_cache.put(base_url + "evicted/", "<html>evicted</html>")
+        html_cache.close()
+        # Evicted by a crawl after the rebuild listed the cache.
+        os.remove(blob_path(self.cache_path, evicted_hash))
+
+        results = reextract_chunk(
+            (
+                "lcs",
+                self.cache_path,
+                [
+                    (base_url + "evicted/", evicted_hash),
+                    (base_url + "anusha-streubel/", cached_hash),
+                ],
+            )
+        )
+        self.assertEqual(results[0], (base_url + "evicted/", None))
+        self.assertEqual(results[1][1].source_url, base_url + "anusha-streubel/")
+
+
+if __name__ == "__main__":
+    main()
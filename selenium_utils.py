@@ -1,3 +1,14 @@
+from selenium import webdriver
+
+
+def create_driver(headless=False, page_load_timeout=60):
+    options = webdriver.FirefoxOptions()
+    options.headless = headless
+    driver = webdriver.Firefox(options=options)
+    driver.set_page_load_timeout(page_load_timeout)
+    return driver
+
+
 def scroll_to(passed_in_driver, object, x_offset=0, y_offset=0):
     x = object.location["x"] - x_offset
     y = object.location["y"] - y_offset
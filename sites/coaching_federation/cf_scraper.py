@@ -1,13 +1,16 @@
 from collections import OrderedDict
+import os
+import shutil
 import unittest
 from unittest import TestCase
 
 from selenium import webdriver
 from selenium.webdriver.common.keys import Keys
 from selenium.common.exceptions import NoSuchElementException, TimeoutException
-from time import sleep
 
-from coach.data_writer import write_coach_to_csv, write_coach_data
+from coach.data_writer import CoachCsvWriter, flush_coach_data, write_coach_data
+from coach.identity import IdentityIndex, skip_known_objects
+from html_cache import HtmlCache
 from coach_scraper import CoachScraper
 import logger
 from logger import Level
@@ -15,16 +18,54 @@ from config_dir import config
 from coach.validation.name import extract_name
 from test_utils import test_setup
 from utils.persistant_processor import PersistentProcessor
+from utils.record_log import RecordLog
+from utils.worker_pool import process_in_pool
+from selenium_utils import create_driver
+from sites.coaching_federation.cf_search_api import (
+    capture_search_template,
+    driver_cookies,
+    harvest_coach_keys,
+)
+from waits import Waiter
 
 
 class FederationCoachScraper(CoachScraper):
-    def __init__(self, driver):
-        super().__init__(driver)
+    FIELDS = {
+        "name": {"xpath": "//h2[@id='coachName']"},
+        "niche": {
+            "xpath": "//div[@id='detailsTabContent']//table/tbody/tr/td[text()='Coaching Themes']/following-sibling::td[1]/div",
+            "all": True,
+        },
+        "website": {
+            "xpath": "//div[@id='contactTabContent']//label[text()='Web Site']/following-sibling::a",
+            "attribute": "href",
+        },
+        "email": {
+            "xpath": "//div[@id='contactTabContent']//label[text()='Email Address']/following-sibling::a",
+            "attribute": "href",
+        },
+        "phone": {
+            "xpath": "//div[@id='contactTabContent']//label[text()='Phone']/following-sibling::span"
+        },
+        "instagram": {
+            "xpath": "//div[@id='socialLinks']//a[@id='instagramLink']",
+            "attribute": "href",
+        },
+        "linkedin": {
+            "xpath": "//div[@id='socialLinks']//a[@id='linkedInLink']",
+            "attribute": "href",
+        },
+        "twitter": {
+            "xpath": "//div[@id='socialLinks']//a[@id='twitterLink']",
+            "attribute": "href",
+        },
+    }
+
+    def __init__(self, driver, extract_in_browser=True):
+        super().__init__(driver, extract_in_browser)
 
     def _gather_name(self, data):
-        full_name = self.driver.find_element_by_xpath(
-            "//h2[@id='coachName']"
-        ).text.lower()
+        full_name = self._field(data, "name").lower()
         first, last = extract_name(full_name)
         if full_name is None:
             raise Exception()
@@ -34,205 +75,651 @@ class FederationCoachScraper(CoachScraper):
         return None
 
     def _gather_niche(self, data):
-        niche_lines = self.driver.find_elements_by_xpath(
-            "//div[@id='detailsTabContent']//table/tbody/tr/td[text()='Coaching Themes']/following-sibling::td[1]/div"
-        )
-        niche = ", ".join([line.text for line in niche_lines])
+        niche_lines = self._field(data, "niche")
+        niche = ", ".join(niche_lines)
         return niche
 
     def _gather_website(self, data):
-        website = self.driver.find_element_by_xpath(
-            "//div[@id='contactTabContent']//label[text()='Web Site']/following-sibling::a"
-        ).get_attribute("href")
+        website = self._field(data, "website")
         if not website:
             website = ""
         return website
 
     def _gather_email(self, data):
-        email = self.driver.find_element_by_xpath(
-            "//div[@id='contactTabContent']//label[text()='Email Address']/following-sibling::a"
-        ).get_attribute("href")
+        email = self._field(data, "email")
         if email.startswith("mailto:"):
             email = email[7:]
         return email
 
     def _gather_phone(self, data):
-        phone = self.driver.find_element_by_xpath(
-            "//div[@id='contactTabContent']//label[text()='Phone']/following-sibling::span"
-        ).text
+        phone = self._field(data, "phone")
         return phone
 
     def _gather_instagram(self, data):
-        instagram = self.driver.find_element_by_xpath(
-            "//div[@id='socialLinks']//a[@id='instagramLink']"
-        ).get_attribute("href")
+        instagram = self._field(data, "instagram")
         return instagram
 
     def _gather_linkedin(self, data):
-        linkedin = self.driver.find_element_by_xpath(
-            "//div[@id='socialLinks']//a[@id='linkedInLink']"
-        ).get_attribute("href")
+        linkedin = self._field(data, "linkedin")
         return linkedin
 
     def _gather_twitter(self, data):
-        twitter = self.driver.find_element_by_xpath(
-            "//div[@id='socialLinks']//a[@id='twitterLink']"
-        ).get_attribute("href")
+        twitter = self._field(data, "twitter")
         return twitter
 
 
-class FederationWebScraper:
-    def __init__(self, driver, csv_file_path=None):
-        self.directory_url = r"https://apps.coachingfederation.org/eweb/ccfdynamicpage.aspx?webcode=ccfsearch&site=icfapp"
-        self.coach_href_prefix = r"https://apps.coachingfederation.org/eweb/CCFDynamicPage.aspx?webcode=ccfcoachprofileview&coachcstkey="
+# Retargets the first inactive pager link at arguments[0] and clicks it. jQuery caches
+# data-* values on first read, so its copy is updated along with the attribute. The
+# link's own page is kept in data-jump-from for _RESTORE_PAGE_LINK_SCRIPT.
+_JUMP_TO_PAGE_SCRIPT = """
+var page = arguments[0];
+var link = document.evaluate("//div[@id='paging']//a[@class='item'][@data-value]",
+    document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+if (link === null) {
+    return false;
+}
+link.setAttribute('data-jump-from', link.getAttribute('data-value'));
+link.setAttribute('data-value', String(page));
+link.textContent = String(page);
+if (window.jQuery) {
+    window.jQuery(link).data('value', page);
+}
+link.click();
+return true;
+"""
+
+# Points a link retargeted by a jump that didn't land back at its own page.
+_RESTORE_PAGE_LINK_SCRIPT = """
+var link = document.evaluate("//div[@id='paging']//a[@data-jump-from]",
+    document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+if (link === null) {
+    return;
+}
+var page = link.getAttribute('data-jump-from');
+link.removeAttribute('data-jump-from');
+link.setAttribute('data-value', page);
+link.textContent = page;
+if (window.jQuery) {
+    window.jQuery(link).data('value', parseInt(page, 10));
+}
+"""
+
+
+class FederationSearchSession:
+    """
+    One browser's view of the coach search, set up with a single fluent language filter.
+    """
+
+    DIRECTORY_URL = r"https://apps.coachingfederation.org/eweb/ccfdynamicpage.aspx?webcode=ccfsearch&site=icfapp"
+    COACH_HREF_PREFIX = r"https://apps.coachingfederation.org/eweb/CCFDynamicPage.aspx?webcode=ccfcoachprofileview&coachcstkey="
+
+    JUMP_TIMEOUT = 5.0
+    ACTIVE_PAGE_XPATH = "//div[@id='paging']//a[@class='item active']"
+    COACH_CARDS_XPATH = "//div[@id='cards']/div/div[@class='content']//input"
+
+    def __init__(self, driver, language="English", html_cache=None):
         self.driver = driver
+        self.language = language
+        self.html_cache = html_cache
         self.logger = logger.get_logger()
-        self.retries = int(config.read("GENERAL", "COACH_RETRIES_BEFORE_FAIL"))
-        self.csv_file_path = csv_file_path
-        if self.csv_file_path is None:
-            self.csv_file_path = config.read(
-                "COACHING_FEDERATION_SCRAPER", "CSV_FILE_PATH"
-            )
-        object_file_path = config.read("COACHING_FEDERATION_SCRAPER", "OBJECTS_PATH")
-        self.persistent_processor = PersistentProcessor(object_file_path)
+        self.wait = Waiter(
+            driver, timeout=float(config.read("GENERAL", "WAIT_TIMEOUT"))
+        )
 
-    def process_all_coaches(self):
-        self.driver.get(self.directory_url)
+    def open(self):
+        self.driver.get(self.DIRECTORY_URL)
         self.setup_filters()
-        if not self.persistent_processor.is_initialized():
-            num_pages = self.get_num_pages()
-            pages_to_process = OrderedDict()
-            for page in range(1, num_pages + 1):
-                pages_to_process[page] = page
-            self.persistent_processor.initialize(pages_to_process)
-
-        keys = self.persistent_processor.get_unprocessed()
-        coaches_to_process = 50
-        for page_num in keys:
-            self.logger.log(
-                "Page progress: " + str(page_num) + " / " + str(keys[-1]), Level.SUMMARY
-            )
-            coaches_processed = 1
-            self.goto_page(page_num)
-            sleep(3)
-            coach_cards = self.driver.find_elements_by_xpath(
-                "//div[@id='cards']/div/div[@class='content']//input"
-            )
-            coaches = []
-
-            for card in coach_cards:
-                coach_value = card.get_attribute("value")
-                coach_href = self.coach_href_prefix + coach_value
-                self.driver.execute_script("""window.open("","_blank");""")
-                self.driver.switch_to.window(self.driver.window_handles[-1])
-                timed_out = False
-                try:
-                    self.driver.get(coach_href)
-                except TimeoutException:
-                    self.logger.log("Coach page load timeout.", Level.ERROR)
-                    timed_out = True
-                if not timed_out:
-                    federation_scraper = FederationCoachScraper(self.driver)
-                    coach_data = federation_scraper.gather_coach_data(coach_href, None)
-                    if coach_data is not None:
-                        coaches.append(coach_data)
-                self.driver.execute_script("""window.close();""")
-                self.driver.switch_to.window(self.driver.window_handles[0])
-                self.logger.log(
-                    "Progress: "
-                    + str(coaches_processed)
-                    + " / "
-                    + str(coaches_to_process)
-                    + " - "
-                    + "{:.3f}".format(coaches_processed / coaches_to_process * 100)
-                    + "%",
-                    Level.DETAIL,
-                )
-                self.logger.log(
-                    "Page progress: " + str(page_num) + " / " + str(keys[-1]),
-                    Level.DETAIL,
-                )
-                coaches_processed += 1
-                if timed_out or coach_data is None:
-                    break
-            if timed_out or coach_data is None:
-                continue
-
-            if len(coaches) == len(coach_cards) and len(coaches) > 0:
-                for coach_data in coaches:
-                    write_coach_data(coach_data)
-                    write_coach_to_csv(
-                        coach_data,
-                        config.read("COACHING_FEDERATION_SCRAPER", "CSV_FILE_PATH"),
-                    )
-                self.persistent_processor.object_processed(page_num)
 
-    def setup_filters(self):
-        dropdown = self.driver.find_element_by_xpath(
-            "//div[@id='filter-group-demographics']/a"
-        )
-        dropdown.click()
-        sleep(0.5)
-        language_button = self.driver.find_element_by_xpath(
-            "//button[@id='add-fluent-language']"
+    def scrape_page(self, page_num, completed_keys=frozenset(), is_known=None):
+        """
+        Yields (coach_key, coach_data) for every card on a results page whose key is not in
+        completed_keys, coach_data is None for a coach that failed. Cards whose profile url
+        is_known (a coach stored from another run or source) are passed over too.
+        """
+        self.goto_page(page_num)
+        coach_keys = [
+            card.get_attribute("value")
+            for card in self.wait.count_stable(self.COACH_CARDS_XPATH)
+        ]
+        pending_keys = [
+            key
+            for key in coach_keys
+            if key not in completed_keys
+            and not (is_known and is_known(self.COACH_HREF_PREFIX + key))
+        ]
+        self.logger.log(
+            "Page "
+            + str(page_num)
+            + ": "
+            + str(len(pending_keys))
+            + " / "
+            + str(len(coach_keys))
+            + " coaches left.",
+            Level.DETAIL,
         )
-        language_button.click()
-        sleep(0.5)
-        english_button = self.driver.find_element_by_xpath(
-            "//button[@data-value='English']"
-        )
-        english_button.click()
-        english_button.send_keys(Keys.ESCAPE)
-        sleep(2)
-        location_button = self.driver.find_element_by_xpath(
-            "//button[@id='add-location']"
-        )
-        location_button.click()
-        sleep(0.5)
-        search_bar = self.driver.find_element_by_xpath(
-            "//input[@id='countries-search']"
+
+        for coach_key in pending_keys:
+            coach_href = self.COACH_HREF_PREFIX + coach_key
+            self.driver.execute_script("""window.open("","_blank");""")
+            self.driver.switch_to.window(self.driver.window_handles[-1])
+            coach_data = None
+            try:
+                self.driver.get(coach_href)
+                federation_scraper = FederationCoachScraper(self.driver)
+                coach_data = federation_scraper.gather_coach_data(coach_href, None)
+                # Cached once gathered, the DOM the data came from has rendered.
+                if coach_data is not None and self.html_cache is not None:
+                    self.html_cache.put(coach_href, self.driver.page_source)
+            except TimeoutException:
+                self.logger.log("Coach page load timeout.", Level.ERROR)
+            self.driver.execute_script("""window.close();""")
+            self.driver.switch_to.window(self.driver.window_handles[0])
+            yield coach_key, coach_data
+
+    def setup_filters(self):
+        self.wait.element_clickable("//div[@id='filter-group-demographics']/a").click()
+        self.wait.element_clickable("//button[@id='add-fluent-language']").click()
+        language_option = self.wait.element_clickable(
+            "//button[@data-value='{language}']".format(language=self.language)
         )
+        language_option.click()
+        language_option.send_keys(Keys.ESCAPE)
+        self.wait.network_idle()
+        self.wait.element_clickable("//button[@id='add-location']").click()
+        search_bar = self.wait.element_clickable("//input[@id='countries-search']")
         search_bar.send_keys("United States")
         search_bar.send_keys(Keys.ENTER)
-        sleep(0.5)
-        usa_button = self.driver.find_element_by_xpath(
-            "//button[@data-display='United States']"
-        )
-        usa_button.click()
-        sleep(1)
-        self.driver.find_elements_by_xpath("//button[text()='Close']")[1].click()
-        sleep(2)
+        self.wait.element_clickable("//button[@data-display='United States']").click()
+        self.wait.elements_present("//button[text()='Close']", count=2)[1].click()
+        self.wait.network_idle()
         self.driver.execute_script("window.scrollTo(0, document.body.scrollHeight)")
-        self.driver.find_element_by_xpath("//div[@id='paging-dropdown']").click()
-        sleep(0.5)
-        self.driver.find_element_by_xpath(
+        self.wait.element_clickable("//div[@id='paging-dropdown']").click()
+        self.wait.element_clickable(
             "//div[@id='paging']//div[@data-value='50']"
         ).click()
-        sleep(2)
+        self.wait.network_idle()
+        self.wait.count_stable(self.COACH_CARDS_XPATH)
 
     def get_num_pages(self):
         self.driver.execute_script("window.scrollTo(0, document.body.scrollHeight)")
         return int(
-            self.driver.find_element_by_xpath(
+            self.wait.element_present(
                 "//div[@id='paging']//a[@class='item'][last()]"
             ).text.strip()
         )
 
+    def jump_to_page(self, page_num):
+        """
+        Moves to any results page at constant cost by retargeting one pager link to page_num
+        and clicking it, the pager's handler requests whatever page its data-value names.
+        Returns False when the pager did not land on page_num, the retargeted link is then
+        pointed back at its own page.
+        """
+        if self._active_page() == str(page_num):
+            return True
+
+        if not self.driver.execute_script(_JUMP_TO_PAGE_SCRIPT, page_num):
+            return False
+        try:
+            self.wait.until(
+                lambda: self._active_page() == str(page_num),
+                "jump to page",
+                timeout=self.JUMP_TIMEOUT,
+            )
+        except TimeoutException:
+            self.logger.log(
+                "Direct jump to page " + str(page_num) + " failed, walking the pager.",
+                Level.WARNING,
+            )
+            self.driver.execute_script(_RESTORE_PAGE_LINK_SCRIPT)
+            return False
+        self.wait.network_idle()
+        return True
+
+    def _active_page(self):
+        try:
+            return self.driver.find_element_by_xpath(
+                self.ACTIVE_PAGE_XPATH
+            ).text.strip()
+        except NoSuchElementException:
+            return None
+
     def goto_page(self, page_num):
-        page_num_button = None
-        while page_num_button is None:
-            sleep(1)
+        """
+        Raises TimeoutException when the pager doesn't end up on page_num, so the page is
+        never scraped or marked processed as some other page.
+        """
+        if self.jump_to_page(page_num):
+            return
+
+        page_num_xpath = "//a[@data-value='{page_num}']".format(page_num=page_num)
+        while True:
             self.driver.execute_script("window.scrollTo(0, document.body.scrollHeight)")
             try:
-                page_num_button = self.driver.find_element_by_xpath(
-                    "//a[@data-value='{page_num}']".format(page_num=page_num)
-                )
+                page_num_button = self.driver.find_element_by_xpath(page_num_xpath)
+                break
             except NoSuchElementException:
+                active_page = self.wait.element_present(self.ACTIVE_PAGE_XPATH).text
                 self.driver.find_element_by_xpath(
-                    "//div[@id='paging']//a[@class='item active']/following-sibling::a[2]"
+                    self.ACTIVE_PAGE_XPATH + "/following-sibling::a[2]"
                 ).click()
+                self.wait.until(
+                    lambda: self._active_page() != active_page.strip(), "pager moved"
+                )
 
         page_num_button.click()
+        self.wait.until(lambda: self._active_page() == str(page_num), "pager on page")
+        self.wait.network_idle()
+
+
+# Page number a partition's worker yields once it has gone through every unprocessed page.
+_PARTITION_END = object()
+# Coach key a partition's worker yields once it has gone through every card on a page.
+_PAGE_END = object()
+
+
+def _coach_outcome(coach_result):
+    # Page and partition ends are markers, not coaches, and a coach succeeded with its data.
+    if coach_result is None:
+        return False
+    page_num, coach_key, coach_data = coach_result
+    if page_num is _PARTITION_END or coach_key is _PAGE_END:
+        return None
+    return coach_data is not None
+
+
+class CompletedCoachKeys:
+    """
+    Coach keys whose data has been stored, kept in a RecordLog so a rerun of a page only
+    scrapes the coaches that failed. Only the writer thread adds keys.
+    """
+
+    def __init__(self, directory_path):
+        self._record_log = RecordLog(directory_path)
+        self._keys = set(payload.decode() for payload in self._record_log)
+
+    def __contains__(self, coach_key):
+        return coach_key in self._keys
+
+    def __len__(self):
+        return len(self._keys)
+
+    def add(self, coach_key):
+        self._record_log.append(coach_key.encode())
+        self._keys.add(coach_key)
+
+    def close(self):
+        self._record_log.close()
+
+
+def build_partitions(num_pages, pages_per_partition, language="English"):
+    """
+    Splits pages 1..num_pages of one language filter into contiguous page range partitions.
+    """
+    return partition_pages(range(1, num_pages + 1), pages_per_partition, language)
+
+
+def partition_pages(pages, pages_per_partition, language="English"):
+    """
+    Splits the given pages of one language filter into partitions of contiguous page
+    ranges, at most pages_per_partition long.
+    """
+    partitions = OrderedDict()
+    page_range = []
+
+    def add_partition():
+        name = "{language}-{first}-{last}".format(
+            language=language.lower(), first=page_range[0], last=page_range[-1]
+        )
+        partitions[name] = {
+            "language": language,
+            "first_page": page_range[0],
+            "last_page": page_range[-1],
+        }
+
+    for page in sorted(pages):
+        if page_range and (
+            page != page_range[-1] + 1 or len(page_range) == pages_per_partition
+        ):
+            add_partition()
+            page_range = []
+        page_range.append(page)
+    if page_range:
+        add_partition()
+    return partitions
+
+
+class FederationWebScraper:
+    """
+    Crawls the coach search as independent partitions, each worker driving its own browser.
+    Partitions are page ranges of the English search or, when LANGUAGES is set, one whole
+    search per fluent language. Every partition tracks its pages in its own
+    PersistentProcessor next to OBJECTS_PATH, and all results go through one writer.
+    Coaches are committed one at a time and their keys recorded, so a page is only marked
+    processed once every card on it is stored and a rerun retries just the failed coaches.
+
+    With HARVEST_KEYS on, the coach keys are instead listed straight from the search
+    backend by replaying its results requests in large batches, and every coach profile is
+    its own work item in the PersistentProcessor at KEYS_PATH.
+
+    Either way, profiles whose url is already in the IdentityIndex are not fetched again.
+    """
+
+    def __init__(
+        self,
+        driver,
+        csv_file_path=None,
+        workers=None,
+        object_file_path=None,
+        coach_data_storage_path=None,
+        identity_index_path=None,
+        html_cache_path=None,
+    ):
+        self.driver = driver
+        self.logger = logger.get_logger()
+        self.retries = int(config.read("GENERAL", "COACH_RETRIES_BEFORE_FAIL"))
+        self.csv_file_path = csv_file_path
+        if self.csv_file_path is None:
+            self.csv_file_path = config.read(
+                "COACHING_FEDERATION_SCRAPER", "CSV_FILE_PATH"
+            )
+        self.workers = workers
+        if self.workers is None:
+            self.workers = int(config.read("COACHING_FEDERATION_SCRAPER", "WORKERS"))
+        self.pages_per_partition = int(
+            config.read("COACHING_FEDERATION_SCRAPER", "PAGES_PER_PARTITION")
+        )
+        self.languages = [
+            language.strip()
+            for language in config.read(
+                "COACHING_FEDERATION_SCRAPER", "LANGUAGES"
+            ).split(",")
+            if language.strip()
+        ]
+        self.coach_data_storage_path = coach_data_storage_path
+        self.identity_index_path = identity_index_path
+        self.identity_index = None
+        self.html_cache_path = html_cache_path
+        self.html_cache = None
+        self.object_file_path = object_file_path
+        if self.object_file_path is None:
+            self.object_file_path = config.read(
+                "COACHING_FEDERATION_SCRAPER", "OBJECTS_PATH"
+            )
+        self.persistent_processor = PersistentProcessor(self.object_file_path)
+        self._page_processors = {}
+        self.completed_keys = None
+        self.harvest_keys = config.read(
+            "COACHING_FEDERATION_SCRAPER", "HARVEST_KEYS"
+        ).strip().lower() in ("1", "true", "yes")
+        self.key_batch_size = int(
+            config.read("COACHING_FEDERATION_SCRAPER", "KEY_BATCH_SIZE")
+        )
+        self.keys_file_path = config.read("COACHING_FEDERATION_SCRAPER", "KEYS_PATH")
+
+    def process_all_coaches(self):
+        self.identity_index = IdentityIndex(
+            self.identity_index_path, self.coach_data_storage_path
+        )
+        self.html_cache = HtmlCache(self.html_cache_path)
+        try:
+            if self.harvest_keys:
+                self.process_coach_keys()
+            else:
+                self.process_partitions()
+        finally:
+            self.identity_index.close()
+            self.html_cache.close()
+
+    def process_partitions(self):
+        if not self.persistent_processor.is_initialized():
+            self.persistent_processor.initialize(self.load_partitions())
+        else:
+            self.convert_page_objects()
+        self.completed_keys = CompletedCoachKeys(self.object_file_path + ".coaches")
+
+        # Pages whose cards all came through, marked once their rows are in the csv.
+        finished_pages = []
+
+        def mark_processed(written):
+            flush_coach_data(self.coach_data_storage_path)
+            for coach_key, coach_data in written:
+                self.identity_index.add(coach_data)
+                self.completed_keys.add(coach_key)
+            for page_processor, page_num in finished_pages:
+                page_processor.object_processed(page_num)
+            del finished_pages[:]
+
+        try:
+            with CoachCsvWriter(
+                self.csv_file_path, on_flush=mark_processed
+            ) as csv_writer:
+
+                def write_coach(partition_name, coach_result):
+                    if coach_result is None:
+                        self.logger.log(
+                            "Partition failed: " + partition_name, Level.ERROR
+                        )
+                        return
+                    page_num, coach_key, coach_data = coach_result
+                    page_processor = self._page_processors[partition_name]
+                    if page_num is _PARTITION_END:
+                        csv_writer.flush()
+                        if page_processor.unprocessed_count() == 0:
+                            self.persistent_processor.object_processed(partition_name)
+                            self.logger.log(
+                                "Partition done: " + partition_name, Level.SUMMARY
+                            )
+                        return
+                    if coach_key is _PAGE_END:
+                        if coach_data:
+                            finished_pages.append((page_processor, page_num))
+                        return
+                    if coach_data is None:
+                        self.logger.log(
+                            "Coach failed, page "
+                            + str(page_num)
+                            + " will be retried: "
+                            + coach_key,
+                            Level.ERROR,
+                        )
+                        return
+                    write_coach_data(coach_data, self.coach_data_storage_path)
+                    csv_writer.write_coach(coach_data, (coach_key, coach_data))
+
+                process_in_pool(
+                    self.persistent_processor.get_unprocessed(),
+                    self.workers,
+                    setup_worker=self._create_driver,
+                    process_key=self._crawl_partition,
+                    handle_result=write_coach,
+                    teardown_worker=self._close_driver,
+                    total=None,
+                    description="Coaches",
+                    stream=True,
+                    result_outcome=_coach_outcome,
+                )
+        finally:
+            for page_processor in self._page_processors.values():
+                page_processor.close()
+            self.completed_keys.close()
+            self.persistent_processor.close()
+
+    def process_coach_keys(self):
+        key_processor = PersistentProcessor(self.keys_file_path)
+        if not key_processor.is_initialized():
+            key_processor.initialize(
+                OrderedDict((key, key) for key in self.load_coach_keys())
+            )
+        # Only the profile url identifies a harvested key, there is no listing data to match.
+        skip_known_objects(
+            key_processor,
+            self.identity_index,
+            lambda coach_key, _: {
+                "source_url": FederationSearchSession.COACH_HREF_PREFIX + coach_key
+            },
+        )
+
+        def mark_processed(written):
+            flush_coach_data(self.coach_data_storage_path)
+            for coach_key, coach_data in written:
+                self.identity_index.add(coach_data)
+                key_processor.object_processed(coach_key)
+
+        try:
+            with CoachCsvWriter(
+                self.csv_file_path, on_flush=mark_processed
+            ) as csv_writer:
+
+                def write_coach(coach_key, coach_data):
+                    if coach_data is None:
+                        self.logger.log("Coach failed: " + coach_key, Level.ERROR)
+                        return
+                    write_coach_data(coach_data, self.coach_data_storage_path)
+                    csv_writer.write_coach(coach_data, (coach_key, coach_data))
+
+                process_in_pool(
+                    key_processor.get_unprocessed(),
+                    self.workers,
+                    setup_worker=self._create_driver,
+                    process_key=self._scrape_coach_key,
+                    handle_result=write_coach,
+                    teardown_worker=self._close_driver,
+                    total=key_processor.unprocessed_count(),
+                    description="Coaches",
+                )
+        finally:
+            key_processor.close()
+
+    def load_coach_keys(self):
+        """
+        Every coachcstkey the search returns, read from its backend rather than the cards.
+        """
+        session = FederationSearchSession(self.driver)
+        session.open()
+        template = capture_search_template(session)
+        if template is None:
+            raise RuntimeError(
+                "No paged search results request was captured, "
+                "run with HARVEST_KEYS off to crawl the result cards."
+            )
+        coach_keys = list(
+            harvest_coach_keys(
+                template, self.key_batch_size, driver_cookies(self.driver)
+            )
+        )
+        if not coach_keys:
+            raise RuntimeError("The captured search request returned no coach keys.")
+        self.logger.log(
+            "Harvested " + str(len(coach_keys)) + " coach keys.", Level.SUMMARY
+        )
+        return coach_keys
+
+    def _scrape_coach_key(self, driver, coach_key):
+        coach_href = FederationSearchSession.COACH_HREF_PREFIX + coach_key
+        try:
+            driver.get(coach_href)
+        except TimeoutException:
+            self.logger.log("Coach page load timeout.", Level.ERROR)
+            return None
+        coach_data = FederationCoachScraper(driver).gather_coach_data(coach_href, None)
+        if coach_data is not None:
+            self.html_cache.put(coach_href, driver.page_source)
+        return coach_data
+
+    def convert_page_objects(self):
+        """
+        OBJECTS_PATH files written before the crawl was partitioned hold a page number per
+        search page. Their unprocessed pages become partitions of the English search.
+        """
+        objects = self.persistent_processor.objects_dict
+        if all(isinstance(value, dict) for value in objects.values()):
+            return
+        if not all(isinstance(value, int) for value in objects.values()):
+            raise RuntimeError(
+                "Unknown objects in "
+                + self.object_file_path
+                + ", delete it to restart."
+            )
+        pages = list(self.persistent_processor.get_unprocessed())
+        partitions = partition_pages(pages, self.pages_per_partition)
+        self.persistent_processor.reset(partitions)
+        self.logger.log(
+            "Converted {} unprocessed pages of {} into {} partitions",
+            Level.WARNING,
+            len(pages),
+            self.object_file_path,
+            len(partitions),
+        )
+
+    def load_partitions(self):
+        if self.languages:
+            partitions = OrderedDict()
+            for language in self.languages:
+                partitions[language.lower()] = {
+                    "language": language,
+                    "first_page": 1,
+                    "last_page": None,
+                }
+            return partitions
+
+        session = FederationSearchSession(self.driver)
+        session.open()
+        return build_partitions(session.get_num_pages(), self.pages_per_partition)
+
+    def _create_driver(self, worker_index):
+        # The first worker reuses the driver this scraper was given, the rest get their own.
+        if worker_index == 0 and self.driver is not None:
+            return self.driver
+        return create_driver(headless=True)
+
+    def _close_driver(self, driver):
+        if driver is not self.driver:
+            driver.quit()
+
+    def _crawl_partition(self, driver, partition_name):
+        partition = self.persistent_processor.objects_dict[partition_name]
+        session = FederationSearchSession(
+            driver, partition["language"], html_cache=self.html_cache
+        )
+        session.open()
+
+        page_processor = PersistentProcessor(
+            self.object_file_path + "." + partition_name
+        )
+        if not page_processor.is_initialized():
+            last_page = partition["last_page"]
+            if last_page is None:
+                last_page = session.get_num_pages()
+            page_processor.initialize(
+                OrderedDict(
+                    (page, page)
+                    for page in range(partition["first_page"], last_page + 1)
+                )
+            )
+        self._page_processors[partition_name] = page_processor
+
+        for page_num in page_processor.get_unprocessed():
+            self.logger.log(
+                "Partition "
+                + partition_name
+                + " page: "
+                + str(page_num)
+                + ", pages left: "
+                + str(page_processor.unprocessed_count()),
+                Level.SUMMARY,
+            )
+            page_complete = True
+            for coach_key, coach_data in session.scrape_page(
+                page_num, self.completed_keys, self.identity_index.knows_source_url
+            ):
+                page_complete = page_complete and coach_data is not None
+                yield page_num, coach_key, coach_data
+            # The writer marks the page processed only after every coach before this
+            # item was stored, results of one partition arrive in order.
+            yield page_num, _PAGE_END, page_complete
+        session.wait.log_summary()
+        yield _PARTITION_END, None, None
 
 
 class TestFederationCoachScraper(TestCase):
@@ -320,3 +807,180 @@ class TestFederationCoachScraper(TestCase):
         self.assertEqual(cd.instagram_url, "")
         self.assertEqual(cd.linkedin_url, "")
         self.assertEqual(cd.twitter_url, "")
+
+
+class TestFederationPartitions(TestCase):
+    def test_build_partitions(self):
+        partitions = build_partitions(25, 10)
+        self.assertEqual(
+            list(partitions.keys()), ["english-1-10", "english-11-20", "english-21-25"]
+        )
+        self.assertEqual(
+            partitions["english-21-25"],
+            {"language": "English", "first_page": 21, "last_page": 25},
+        )
+
+    def test_build_partitions_cover_every_page_once(self):
+        partitions = build_partitions(101, 7, language="Spanish")
+        pages = [
+            page
+            for partition in partitions.values()
+            for page in range(partition["first_page"], partition["last_page"] + 1)
+        ]
+        self.assertEqual(pages, list(range(1, 102)))
+
+    def test_markers_are_not_counted_as_coaches(self):
+        self.assertIsNone(_coach_outcome((3, _PAGE_END, True)))
+        self.assertIsNone(_coach_outcome((_PARTITION_END, None, None)))
+        self.assertFalse(_coach_outcome((3, "key", None)))
+        self.assertTrue(_coach_outcome((3, "key", object())))
+        # A worker that raised fails its partition.
+        self.assertFalse(_coach_outcome(None))
+
+    def test_partition_pages_keep_ranges_contiguous(self):
+        partitions = partition_pages([9, 1, 2, 3, 5, 6, 7, 8], 3)
+        self.assertEqual(
+            list(partitions.keys()),
+            ["english-1-3", "english-5-7", "english-8-9"],
+        )
+
+    def test_convert_page_objects(self):
+        test_setup()
+        object_file_path = config.read("TEST", "TEST_OBJECTS_PATH")
+        if os.path.exists(object_file_path):
+            os.remove(object_file_path)
+        shutil.rmtree(object_file_path + ".journal", ignore_errors=True)
+        # An objects file of the crawl before partitions, pages 1 and 2 already done.
+        pp = PersistentProcessor(object_file_path)
+        pp.initialize(OrderedDict((page, page) for page in range(1, 8)))
+        pp.object_processed(1)
+        pp.object_processed(2)
+        pp.close()
+
+        scraper = FederationWebScraper(None, object_file_path=object_file_path)
+        scraper.pages_per_partition = 3
+        scraper.convert_page_objects()
+        scraper.persistent_processor.close()
+
+        pp = PersistentProcessor(object_file_path)
+        self.assertEqual(
+            pp.objects_dict,
+            {
+                "english-3-5": {"language": "English", "first_page": 3, "last_page": 5},
+                "english-6-7": {"language": "English", "first_page": 6, "last_page": 7},
+            },
+        )
+        pp.close()
+        os.remove(object_file_path)
+        shutil.rmtree(object_file_path + ".journal")
+
+
+class _PagerElement:
+    def __init__(self, text, on_click=None):
+        self.text = text
+        self._on_click = on_click
+
+    def click(self):
+        if self._on_click is not None:
+            self._on_click()
+
+
+class _StubPagerDriver:
+    """
+    A pager over pages 1 to last_page showing links to the two pages either side of the
+    active one. Retargeted links keep going to their own page, as when a jump fails.
+    """
+
+    def __init__(self, last_page=9):
+        self.last_page = last_page
+        self.active = 1
+        self.links = []
+        self._render()
+
+    def _render(self):
+        self.links = [
+            {"data-value": str(page), "page": page}
+            for page in range(self.active - 2, self.active + 3)
+            if page != self.active and 1 <= page <= self.last_page
+        ]
+
+    def _goto(self, page):
+        self.active = page
+        self._render()
+
+    def execute_script(self, script, *args):
+        if script == _JUMP_TO_PAGE_SCRIPT:
+            link = self.links[0]
+            link["data-jump-from"] = link["data-value"]
+            link["data-value"] = str(args[0])
+            # The pager's handler ignores the retarget, nothing happens.
+            return True
+        if script == _RESTORE_PAGE_LINK_SCRIPT:
+            for link in self.links:
+                if "data-jump-from" in link:
+                    link["data-value"] = link.pop("data-jump-from")
+            return None
+        if "readyState" in script:
+            return ["complete", 0, 0]
+        return None
+
+    def find_element_by_xpath(self, xpath):
+        active_xpath = FederationSearchSession.ACTIVE_PAGE_XPATH
+        if xpath == active_xpath:
+            return _PagerElement(str(self.active))
+        if xpath == active_xpath + "/following-sibling::a[2]":
+            return _PagerElement(">", lambda: self._goto(self.active + 1))
+        for link in self.links:
+            if xpath == "//a[@data-value='{}']".format(link["data-value"]):
+                return _PagerElement(
+                    link["data-value"], lambda page=link["page"]: self._goto(page)
+                )
+        raise NoSuchElementException(xpath)
+
+
+class TestFederationPageNavigation(TestCase):
+    def setUp(self):
+        test_setup()
+
+    def test_failed_jump_walks_to_the_right_page(self):
+        driver = _StubPagerDriver()
+        session = FederationSearchSession(driver)
+        session.JUMP_TIMEOUT = 0.1
+        session.wait.timeout = 2.0
+        session.goto_page(5)
+        self.assertEqual(driver.active, 5)
+        self.assertFalse(any("data-jump-from" in link for link in driver.links))
+
+    def test_wrong_page_raises(self):
+        driver = _StubPagerDriver()
+        session = FederationSearchSession(driver)
+        session.JUMP_TIMEOUT = 0.1
+        session.wait.timeout = 0.5
+        # A page 2 link that goes to page 3 instead.
+        driver.links[0]["page"] = 3
+        with self.assertRaises(TimeoutException):
+            session.goto_page(2)
+
+
+class TestCompletedCoachKeys(TestCase):
+    def setUp(self):
+        test_setup()
+        self.keys_path = config.read("TEST", "TEST_COMPLETED_COACH_KEYS_PATH")
+        if os.path.exists(self.keys_path):
+            shutil.rmtree(self.keys_path)
+
+    def tearDown(self):
+        if os.path.exists(self.keys_path):
+            shutil.rmtree(self.keys_path)
+
+    def test_completed_keys_survive_reopen(self):
+        completed_keys = CompletedCoachKeys(self.keys_path)
+        completed_keys.add("E4D2ADC4-63D1-4702-932C-AEB7EDAE2790")
+        completed_keys.add("389078A5-7ED9-4AAA-91E5-D018C458B58E")
+        completed_keys.close()
+
+        completed_keys = CompletedCoachKeys(self.keys_path)
+        self.assertEqual(len(completed_keys), 2)
+        self.assertIn("389078A5-7ED9-4AAA-91E5-D018C458B58E", completed_keys)
+        self.assertNotIn("03D15412-BE53-41E0-826C-5996A6FF6EE2", completed_keys)
+        completed_keys.close()
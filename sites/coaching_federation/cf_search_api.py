@@ -0,0 +1,433 @@
+from functools import partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import os
+import re
+import threading
+from typing import Iterator, Optional
+from unittest import TestCase
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import httpx
+
+import logger
+from logger import Level
+from test_utils import test_setup
+
+# Records every XMLHttpRequest and fetch the search page sends from here on.
+_CAPTURE_REQUESTS_SCRIPT = """
+if (!window.__capturedRequests) {
+    window.__capturedRequests = [];
+    var open = XMLHttpRequest.prototype.open;
+    var send = XMLHttpRequest.prototype.send;
+    var setRequestHeader = XMLHttpRequest.prototype.setRequestHeader;
+    XMLHttpRequest.prototype.open = function (method, url) {
+        this.__capture = {method: method, url: new URL(url, location.href).href, headers: {}};
+        return open.apply(this, arguments);
+    };
+    XMLHttpRequest.prototype.setRequestHeader = function (name, value) {
+        if (this.__capture) {
+            this.__capture.headers[name] = value;
+        }
+        return setRequestHeader.apply(this, arguments);
+    };
+    XMLHttpRequest.prototype.send = function (body) {
+        if (this.__capture) {
+            this.__capture.body = typeof body === 'string' ? body : null;
+            window.__capturedRequests.push(this.__capture);
+        }
+        return send.apply(this, arguments);
+    };
+    if (window.fetch) {
+        var originalFetch = window.fetch;
+        window.fetch = function (input, init) {
+            init = init || {};
+            window.__capturedRequests.push({
+                method: init.method || 'GET',
+                url: new URL(typeof input === 'string' ? input : input.url, location.href).href,
+                headers: init.headers || {},
+                body: typeof init.body === 'string' ? init.body : null
+            });
+            return originalFetch.apply(this, arguments);
+        };
+    }
+}
+"""
+
+_TAKE_CAPTURED_REQUESTS_SCRIPT = """
+var captured = window.__capturedRequests || [];
+window.__capturedRequests = [];
+return captured;
+"""
+
+_GUID = r"[0-9A-Fa-f]{8}-[0-9A-Fa-f]{4}-[0-9A-Fa-f]{4}-[0-9A-Fa-f]{4}-[0-9A-Fa-f]{12}"
+# Keys next to a cstkey name (json or query) or as a card input value, as the card UI has.
+# Bare GUIDs are not enough, responses also carry session and tracking ids.
+_COACH_KEY_REGEX = re.compile(
+    r"(?i)(?:cst_?key[\"']?\s*[:=]\s*[\"']?|value=[\"'])(" + _GUID + ")"
+)
+
+
+class SearchTemplate:
+    """
+    A captured search results request with the parameter that selects the page (a page
+    number or a row offset) and, when there is one, the parameter that sets the page size.
+    page_size is the size the captured requests were paged by.
+    """
+
+    def __init__(
+        self,
+        method,
+        url,
+        body,
+        headers,
+        location,
+        page_param,
+        page_base,
+        is_offset,
+        size_param=None,
+        page_size=None,
+    ):
+        self.method = method
+        self.url = url
+        self.body = body
+        self.headers = headers
+        self.location = location
+        self.page_param = page_param
+        self.page_base = page_base
+        self.is_offset = is_offset
+        self.size_param = size_param
+        self.page_size = page_size
+
+    def request_for(self, page_index, page_size, offset=None):
+        """
+        Method, url and body for the zero based page_index of page_size results. An offset
+        search starts at offset rows instead when given, a backend may return fewer rows
+        than asked for.
+        """
+        params = _read_params(self.url, self.body, self.location)
+        if self.is_offset:
+            if offset is None:
+                offset = page_index * page_size
+            params[self.page_param] = str(self.page_base + offset)
+        else:
+            params[self.page_param] = str(self.page_base + page_index)
+        if self.size_param is not None:
+            params[self.size_param] = str(page_size)
+        return (self.method,) + _write_params(
+            self.url, self.body, self.location, params
+        )
+
+
+def _read_params(url, body, location):
+    if location == "query":
+        return dict(parse_qsl(urlsplit(url).query, keep_blank_values=True))
+    if location == "json":
+        return {key: str(value) for key, value in json.loads(body).items()}
+    return dict(parse_qsl(body, keep_blank_values=True))
+
+
+def _write_params(url, body, location, params):
+    if location == "query":
+        parts = urlsplit(url)
+        return urlunsplit(parts._replace(query=urlencode(params))), body
+    if location == "json":
+        original = json.loads(body)
+        for key, value in params.items():
+            # Keep numbers as numbers so the backend sees the shape it sent itself.
+            original[key] = int(value) if isinstance(original.get(key), int) else value
+        return url, json.dumps(original)
+    return url, urlencode(params)
+
+
+def _param_locations(request):
+    yield "query"
+    body = request.get("body")
+    if body:
+        yield "json" if body.lstrip().startswith("{") else "form"
+
+
+def infer_search_template(first, second, page_size) -> Optional[SearchTemplate]:
+    """
+    Compares the captured requests for results pages 1 and 2 of the same search. The one
+    parameter that moved by one page is the page selector, a parameter equal to page_size
+    is the page size. Returns None when the two requests don't look like paging.
+    """
+    if first["method"] != second["method"]:
+        return None
+    if urlsplit(first["url"])._replace(query="") != urlsplit(second["url"])._replace(
+        query=""
+    ):
+        return None
+
+    for location in _param_locations(first):
+        try:
+            first_params = _read_params(first["url"], first.get("body"), location)
+            second_params = _read_params(second["url"], second.get("body"), location)
+        except ValueError:
+            continue
+        changed = [
+            key
+            for key in first_params
+            if key in second_params and first_params[key] != second_params[key]
+        ]
+        if len(changed) != 1:
+            continue
+        page_param = changed[0]
+        try:
+            first_value = int(first_params[page_param])
+            second_value = int(second_params[page_param])
+        except ValueError:
+            continue
+        if second_value - first_value == 1:
+            is_offset = False
+        elif second_value - first_value == page_size:
+            is_offset = True
+        else:
+            continue
+
+        size_param = None
+        for key, value in first_params.items():
+            if key != page_param and value == str(page_size):
+                size_param = key
+                break
+        return SearchTemplate(
+            first["method"],
+            first["url"],
+            first.get("body"),
+            first.get("headers") or {},
+            location,
+            page_param,
+            first_value,
+            is_offset,
+            size_param,
+            page_size,
+        )
+    return None
+
+
+def capture_search_template(session, page_size=50) -> Optional[SearchTemplate]:
+    """
+    Drives a FederationSearchSession from page 1 to 2 and back while recording the page's
+    requests, then looks for the pair that pages through the results.
+    """
+    driver = session.driver
+    driver.execute_script(_CAPTURE_REQUESTS_SCRIPT)
+    session.goto_page(2)
+    second_requests = driver.execute_script(_TAKE_CAPTURED_REQUESTS_SCRIPT)
+    session.goto_page(1)
+    first_requests = driver.execute_script(_TAKE_CAPTURED_REQUESTS_SCRIPT)
+
+    for first in first_requests:
+        for second in second_requests:
+            template = infer_search_template(first, second, page_size)
+            if template is not None:
+                return template
+    return None
+
+
+def parse_coach_keys(body):
+    keys = _COACH_KEY_REGEX.findall(body)
+    return list(dict.fromkeys(key.upper() for key in keys))
+
+
+def harvest_coach_keys(
+    template: SearchTemplate, batch_size=500, cookies=None, timeout=60.0
+) -> Iterator[str]:
+    """
+    Replays the search with batch_size results per request until a batch brings no new
+    coach keys, yielding each coachcstkey once. A search without a page size parameter is
+    replayed at the size it was captured with. Offsets move by the rows each batch
+    returned, so a backend capping the page size below the one asked for skips nothing.
+    """
+    log = logger.get_logger()
+    page_size = batch_size
+    if template.size_param is None:
+        page_size = template.page_size
+        log.log(
+            "Search has no page size parameter, harvesting at the captured size of "
+            + str(page_size)
+            + ".",
+            Level.WARNING,
+        )
+    seen = set()
+    with httpx.Client(
+        cookies=cookies, timeout=timeout, follow_redirects=True
+    ) as client:
+        page_index = 0
+        offset = 0
+        while True:
+            method, url, body = template.request_for(page_index, page_size, offset)
+            response = client.request(
+                method, url, content=body, headers=template.headers
+            )
+            response.raise_for_status()
+            batch_keys = parse_coach_keys(response.text)
+            offset += len(batch_keys)
+            new_keys = [key for key in batch_keys if key not in seen]
+            log.log(
+                "Harvested batch "
+                + str(page_index + 1)
+                + ": "
+                + str(len(new_keys))
+                + " new coach keys.",
+                Level.DETAIL,
+            )
+            if not new_keys:
+                return
+            seen.update(new_keys)
+            yield from new_keys
+            page_index += 1
+
+
+def driver_cookies(driver):
+    return {cookie["name"]: cookie["value"] for cookie in driver.get_cookies()}
+
+
+class _RecordedSearchHandler(BaseHTTPRequestHandler):
+    """
+    Stands in for the search backend, serving cards for the recorded coach keys by
+    currentPage / pageSize form fields the way the recorded responses were paged, or from
+    a start offset at most 50 at a time whatever rows asks for.
+    """
+
+    def __init__(self, coach_keys, requests_seen, *args, **kwargs):
+        self.coach_keys = coach_keys
+        self.requests_seen = requests_seen
+        super().__init__(*args, **kwargs)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        params = dict(parse_qsl(self.rfile.read(length).decode()))
+        self.requests_seen.append(params)
+        if "start" in params:
+            start = int(params["start"])
+            rows = min(int(params.get("rows", 50)), 50)
+            page_keys = self.coach_keys[start : start + rows]
+        else:
+            page = int(params["currentPage"])
+            page_size = int(params["pageSize"])
+            page_keys = self.coach_keys[(page - 1) * page_size : page * page_size]
+        cards = "".join(
+            '<div class="card"><div class="content"><input type="hidden" value="'
+            + key
+            + '"></div></div>'
+            for key in page_keys
+        )
+        body = (
+            '<div id="cards" data-session="0D5E3A61-9C2B-4F0E-8B7A-1C2D3E4F5A6B">'
+            + cards
+            + "</div>"
+        ).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestFederationSearchApi(TestCase):
+    FIXTURE_PATH = os.path.join(
+        os.path.dirname(__file__), "fixtures", "recorded_coach_keys.txt"
+    )
+
+    @classmethod
+    def setUpClass(cls):
+        with open(cls.FIXTURE_PATH, "r") as fixture:
+            cls.COACH_KEYS = [line.strip() for line in fixture if line.strip()]
+        cls.REQUESTS_SEEN = []
+        handler = partial(_RecordedSearchHandler, cls.COACH_KEYS, cls.REQUESTS_SEEN)
+        cls.SERVER = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        threading.Thread(target=cls.SERVER.serve_forever, daemon=True).start()
+        cls.SEARCH_URL = (
+            "http://127.0.0.1:"
+            + str(cls.SERVER.server_address[1])
+            + "/eweb/ccfsearch.aspx?site=icfapp"
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.SERVER.shutdown()
+        cls.SERVER.server_close()
+
+    def setUp(self):
+        test_setup()
+        del self.REQUESTS_SEEN[:]
+
+    def _captured(self, page):
+        return {
+            "method": "POST",
+            "url": self.SEARCH_URL,
+            "headers": {"Content-Type": "application/x-www-form-urlencoded"},
+            "body": "language=English&country=United+States&currentPage="
+            + str(page)
+            + "&pageSize=50",
+        }
+
+    def test_infer_form_paging(self):
+        template = infer_search_template(self._captured(1), self._captured(2), 50)
+        self.assertEqual(template.location, "form")
+        self.assertEqual(template.page_param, "currentPage")
+        self.assertEqual(template.size_param, "pageSize")
+        self.assertFalse(template.is_offset)
+        method, url, body = template.request_for(3, 500)
+        self.assertEqual(
+            dict(parse_qsl(body)),
+            {
+                "language": "English",
+                "country": "United States",
+                "currentPage": "4",
+                "pageSize": "500",
+            },
+        )
+
+    def test_infer_query_offset_paging(self):
+        first = {"method": "GET", "url": "http://x.org/search?start=0&rows=50&q=a"}
+        second = {"method": "GET", "url": "http://x.org/search?start=50&rows=50&q=a"}
+        template = infer_search_template(first, second, 50)
+        self.assertTrue(template.is_offset)
+        self.assertEqual(template.size_param, "rows")
+        method, url, body = template.request_for(2, 200)
+        self.assertEqual(
+            dict(parse_qsl(urlsplit(url).query)),
+            {"start": "400", "rows": "200", "q": "a"},
+        )
+
+    def test_unrelated_requests_rejected(self):
+        first = {"method": "GET", "url": "http://x.org/analytics?event=page"}
+        second = {"method": "GET", "url": "http://x.org/search?page=2"}
+        self.assertIsNone(infer_search_template(first, second, 50))
+
+    def test_harvest_recorded_keys(self):
+        template = infer_search_template(self._captured(1), self._captured(2), 50)
+        keys = list(harvest_coach_keys(template, batch_size=100))
+        self.assertEqual(keys, self.COACH_KEYS)
+        # Batches of 100 plus the empty batch that ends the harvest.
+        self.assertEqual(len(self.REQUESTS_SEEN), len(self.COACH_KEYS) // 100 + 2)
+        self.assertEqual(self.REQUESTS_SEEN[0]["pageSize"], "100")
+
+    def test_harvest_offset_paging_without_page_size(self):
+        first = dict(self._captured(1), body="language=English&start=0")
+        second = dict(self._captured(2), body="language=English&start=50")
+        template = infer_search_template(first, second, 50)
+        self.assertTrue(template.is_offset)
+        self.assertIsNone(template.size_param)
+        keys = list(harvest_coach_keys(template, batch_size=500))
+        self.assertEqual(keys, self.COACH_KEYS)
+        self.assertEqual(
+            [params["start"] for params in self.REQUESTS_SEEN[:3]], ["0", "50", "100"]
+        )
+
+    def test_harvest_offset_paging_past_capped_page_size(self):
+        first = dict(self._captured(1), body="language=English&start=0&rows=50")
+        second = dict(self._captured(2), body="language=English&start=50&rows=50")
+        template = infer_search_template(first, second, 50)
+        self.assertEqual(template.size_param, "rows")
+        keys = list(harvest_coach_keys(template, batch_size=500))
+        self.assertEqual(keys, self.COACH_KEYS)
+        self.assertEqual(self.REQUESTS_SEEN[0]["rows"], "500")
+        # The backend returned 50 of the 500 rows asked for.
+        self.assertEqual(self.REQUESTS_SEEN[1]["start"], "50")
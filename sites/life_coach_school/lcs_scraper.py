@@ -1,37 +1,89 @@
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+import os
+import shutil
+import threading
 from unittest import TestCase
 
 from selenium import webdriver
-
-from coach.data_writer import write_coach_to_csv, write_coach_data
+from selenium.common.exceptions import TimeoutException
+
+from coach.data_writer import (
+    CoachCsvWriter,
+    close_coach_data,
+    flush_coach_data,
+    read_coach_data,
+    write_coach_data,
+)
 from coach_scraper import CoachScraper
 
 import logger
 from logger import Level
-from coach.data import CoachCert
+from coach.data import CoachCert, CoachData
+from coach.identity import IdentityIndex, skip_known_objects
 from coach.validation.name import extract_name
 from config_dir import config
 from utils.control_flow import retry_function_sleep as retry
 from test_utils import test_setup
 from utils.persistant_processor import PersistentProcessor
+from html_cache import HtmlCache
+from page_states import (
+    UNCHANGED,
+    PageStates,
+    conditional_headers,
+    is_unchanged,
+    page_state,
+)
+from static_html import extract_fields_from_html, fetch_html, fetch_page
+from async_fetch import fetch_and_gather
+from selenium_utils import create_driver
+from utils.worker_pool import process_in_pool
 
 
 class LifeCoachSchoolCoachScraper(CoachScraper):
-    def __init__(self, driver):
-        super().__init__(driver)
+    FIELDS = {
+        "name": {"xpath": "//div[@class='cmed-title']"},
+        "coach_cert": {
+            "xpath": "//div[@id='information-box']/ul[@class='cmed-box-taxonomy'][1]/li[2]"
+        },
+        "niche": {
+            "xpath": "//div[@id='information-box']/ul[@class='cmed-box-taxonomy'][2]/li",
+            "all": True,
+        },
+        "website": {
+            "xpath": "//div[@id='contact-box']/ul//*[text()='Website']",
+            "attribute": "href",
+        },
+        "email": {
+            "xpath": "//div[@id='contact-box']/ul//*[text()='Contact']",
+            "attribute": "href",
+        },
+        "instagram": {
+            "xpath": "//div[@id='contact-box']/ul//*[text()='Instagram']",
+            "attribute": "href",
+        },
+        "linkedin": {
+            "xpath": "//div[@id='contact-box']/ul//*[text()='Linkedin ']",
+            "attribute": "href",
+        },
+        "twitter": {
+            "xpath": "//div[@id='contact-box']/ul//*[text()='Twitter']",
+            "attribute": "href",
+        },
+    }
+
+    def __init__(self, driver, extract_in_browser=True):
+        super().__init__(driver, extract_in_browser)
 
     def _gather_name(self, data):
-        full_name = self.driver.find_element_by_xpath(
-            "//div[@class='cmed-title']"
-        ).text.lower()
+        full_name = self._field(data, "name").lower()
         first, last = extract_name(full_name)
         if full_name is None:
             raise Exception()
         return full_name, first, last
 
     def _gather_coach_cert(self, data):
-        coach_cert_text = self.driver.find_element_by_xpath(
-            "//div[@id='information-box']/ul[@class='cmed-box-taxonomy'][1]/li[2]"
-        ).text
+        coach_cert_text = self._field(data, "coach_cert")
         coach_cert_text = coach_cert_text.lower()
         if coach_cert_text.lower() == "certified life coach":
             coach_cert = CoachCert.LIFE
@@ -45,23 +97,17 @@ class LifeCoachSchoolCoachScraper(CoachScraper):
         return coach_cert
 
     def _gather_niche(self, data):
-        niche_lines = self.driver.find_elements_by_xpath(
-            "//div[@id='information-box']/ul[@class='cmed-box-taxonomy'][2]/li"
-        )
+        niche_lines = self._field(data, "niche")
         niche_lines = niche_lines[1:]
-        niche = ", ".join([line.text for line in niche_lines])
+        niche = ", ".join(niche_lines)
         return niche
 
     def _gather_website(self, data):
-        website = self.driver.find_element_by_xpath(
-            "//div[@id='contact-box']/ul//*[text()='Website']"
-        ).get_attribute("href")
+        website = self._field(data, "website")
         return website
 
     def _gather_email(self, data):
-        email = self.driver.find_element_by_xpath(
-            "//div[@id='contact-box']/ul//*[text()='Contact']"
-        ).get_attribute("href")
+        email = self._field(data, "email")
         if email.startswith("mailto:"):
             email = email[7:]
         return email
@@ -69,28 +115,99 @@ class LifeCoachSchoolCoachScraper(CoachScraper):
     def _gather_phone(self, data):
         return ""
 
-    def _gather_contact(self, type):
-        return self.driver.find_element_by_xpath(
-            "//div[@id='contact-box']/ul//*[text()='{type}']".format(type=type)
-        ).get_attribute("href")
-
     def _gather_instagram(self, data):
-        instagram = self._gather_contact("Instagram")
+        instagram = self._field(data, "instagram")
         return instagram
 
     def _gather_linkedin(self, data):
-        linkedin = self._gather_contact("Linkedin ")
+        linkedin = self._field(data, "linkedin")
         return linkedin
 
     def _gather_twitter(self, data):
-        twitter = self._gather_contact("Twitter")
+        twitter = self._field(data, "twitter")
         return twitter
 
 
+class LifeCoachSchoolStaticCoachScraper(LifeCoachSchoolCoachScraper):
+    """
+    Profile pages are server rendered, so the declared FIELDS can be evaluated with lxml
+    over a plain http fetch instead of a browser.
+    """
+
+    def __init__(self, timeout=30, html_cache=None):
+        super().__init__(None)
+        self.timeout = timeout
+        self.html_cache = html_cache
+
+    def extract_fields(self, source_url):
+        return self.fetch_fields(source_url)[0]
+
+    def fetch_fields(self, source_url, headers=None):
+        """
+        Returns (fields, response headers), fields is None when conditional headers got a
+        304 Not Modified back.
+        """
+        page_html, response_headers = fetch_page(
+            source_url, timeout=self.timeout, headers=headers
+        )
+        if page_html is None:
+            return None, response_headers
+        if self.html_cache is not None:
+            self.html_cache.put(source_url, page_html)
+        fields = extract_fields_from_html(page_html, self.FIELDS, base_url=source_url)
+        return fields, response_headers
+
+
 class LifeCoachSchoolWebScraper:
-    def __init__(self, driver, csv_file_path=None):
+    DIRECTORY_COACH_XPATH = "//*[@class='cmed_tiles_view_item']//*[@class='part1']/a"
+    DIRECTORY_FIELDS = {
+        "coach_hrefs": {
+            "xpath": DIRECTORY_COACH_XPATH,
+            "attribute": "href",
+            "all": True,
+        },
+        "coach_names": {"xpath": DIRECTORY_COACH_XPATH, "all": True},
+    }
+
+    def __init__(
+        self,
+        driver,
+        csv_file_path=None,
+        backend=None,
+        workers=None,
+        object_file_path=None,
+        coach_data_storage_path=None,
+        identity_index_path=None,
+        page_states_path=None,
+        html_cache_path=None,
+    ):
         self.directory_url = r"https://thelifecoachschool.com/directory/"
         self.driver = driver
+        self.backend = backend
+        if self.backend is None:
+            self.backend = config.read("LIFE_COACH_SCHOOL_SCRAPER", "BACKEND")
+        if self.backend not in ("browser", "static", "async"):
+            raise ValueError("Unknown scraper backend: " + self.backend)
+        self.static_timeout = int(
+            config.read("LIFE_COACH_SCHOOL_SCRAPER", "STATIC_FETCH_TIMEOUT")
+        )
+        self.workers = workers
+        if self.workers is None:
+            self.workers = int(config.read("LIFE_COACH_SCHOOL_SCRAPER", "WORKERS"))
+        self.coach_data_storage_path = coach_data_storage_path
+        self.identity_index_path = identity_index_path
+        self.match_on_name = (
+            config.read("GENERAL", "IDENTITY_MATCH_ON_NAME").lower() == "true"
+        )
+        # Revisited coaches are fetched conditionally instead of skipped as known.
+        self.revisit_known = (
+            config.read("LIFE_COACH_SCHOOL_SCRAPER", "REVISIT_KNOWN_COACHES").lower()
+            == "true"
+        )
+        self.page_states_path = page_states_path
+        self.page_states = None
+        self.html_cache_path = html_cache_path
+        self.html_cache = None
         self.logger = logger.get_logger()
         self.retries = int(config.read("GENERAL", "COACH_RETRIES_BEFORE_FAIL"))
         self.csv_file_path = csv_file_path
@@ -98,40 +215,85 @@ class LifeCoachSchoolWebScraper:
             self.csv_file_path = config.read(
                 "LIFE_COACH_SCHOOL_SCRAPER", "CSV_FILE_PATH"
             )
-        object_file_path = config.read("LIFE_COACH_SCHOOL_SCRAPER", "OBJECTS_PATH")
+        if object_file_path is None:
+            object_file_path = config.read("LIFE_COACH_SCHOOL_SCRAPER", "OBJECTS_PATH")
         self.persistant_processor = PersistentProcessor(object_file_path)
 
     def process_all_coaches(self):
+        coaches_to_process = 0
+        coaches_processed = 0
+        coaches_unchanged = 0
+        identity_index = IdentityIndex(
+            self.identity_index_path, self.coach_data_storage_path
+        )
+        self.page_states = PageStates(self.page_states_path)
+        self.html_cache = HtmlCache(self.html_cache_path)
         try:
             self.load_persistent_processor()
-            coaches_to_process = len(self.persistant_processor.objects_dict)
-            coaches_processed = 1
+            self.skip_known_coaches(identity_index)
+            coaches_to_process = self.persistant_processor.unprocessed_count()
             self.logger.log(
                 "Coaches to process:" + str(coaches_to_process), Level.SUMMARY
             )
-            keys = list(self.persistant_processor.objects_dict.keys())
-            for coach_href in keys:
-                self.driver.get(coach_href)
-                lcs_coach_scraper = LifeCoachSchoolCoachScraper(self.driver)
-                coach_data = lcs_coach_scraper.gather_coach_data(coach_href)
-                if coach_data is None:
-                    continue
-
-                write_coach_to_csv(coach_data)
-                write_coach_data(coach_data)
-                self.persistant_processor.object_processed(coach_href)
-                coaches_processed += 1
-                self.logger.log(
-                    "Progress: "
-                    + str(coaches_processed)
-                    + " / "
-                    + str(coaches_to_process)
-                    + " - "
-                    + "{:.3f}".format(coaches_processed / coaches_to_process * 100)
-                    + "%",
-                    Level.SUMMARY,
+
+            def mark_processed(written):
+                # Once the batch of coach data is committed too a rerun may skip them.
+                flush_coach_data(self.coach_data_storage_path)
+                for coach_href, coach_data, state in written:
+                    identity_index.add(coach_data)
+                    self.page_states.set(coach_href, state)
+                    self.persistant_processor.object_processed(coach_href)
+
+            with CoachCsvWriter(
+                self.csv_file_path, on_flush=mark_processed
+            ) as csv_writer:
+
+                def write_coach(coach_href, coach_data, state):
+                    nonlocal coaches_processed, coaches_unchanged
+                    if coach_data is None:
+                        return
+                    if coach_data is UNCHANGED:
+                        self.page_states.set(coach_href, state)
+                        self.persistant_processor.object_processed(coach_href)
+                        coaches_unchanged += 1
+                        return
+                    write_coach_data(coach_data, self.coach_data_storage_path)
+                    csv_writer.write_coach(coach_data, (coach_href, coach_data, state))
+                    coaches_processed += 1
+
+                if self.backend == "async":
+                    fetch_and_gather(
+                        LifeCoachSchoolCoachScraper(None),
+                        self.persistant_processor.get_unprocessed(),
+                        write_coach,
+                        in_flight=int(config.read("GENERAL", "ASYNC_IN_FLIGHT")),
+                        per_host=int(config.read("GENERAL", "ASYNC_PER_HOST")),
+                        timeout=self.static_timeout,
+                        total=coaches_to_process,
+                        page_states=self.page_states,
+                        html_cache=self.html_cache,
+                    )
+                    return
+
+                def write_scraped_coach(coach_href, result):
+                    coach_data, state = result if result is not None else (None, None)
+                    write_coach(coach_href, coach_data, state)
+
+                process_in_pool(
+                    self.persistant_processor.get_unprocessed(),
+                    self.workers,
+                    setup_worker=self._create_coach_scraper,
+                    process_key=self._scrape_coach,
+                    handle_result=write_scraped_coach,
+                    teardown_worker=self._close_coach_scraper,
+                    total=coaches_to_process,
+                    description="Coaches",
                 )
         finally:
+            self.persistant_processor.close()
+            identity_index.close()
+            self.page_states.close()
+            self.html_cache.close()
             self.logger.log(
                 "Processed "
                 + str(coaches_processed)
@@ -139,15 +301,113 @@ class LifeCoachSchoolWebScraper:
                 + str(coaches_to_process),
                 Level.SUMMARY,
             )
+            if coaches_to_process:
+                self.logger.log(
+                    "Skipped {} unchanged pages ({:.1%}).",
+                    Level.SUMMARY,
+                    coaches_unchanged,
+                    coaches_unchanged / coaches_to_process,
+                )
+
+    def skip_known_coaches(self, identity_index):
+        return skip_known_objects(
+            self.persistant_processor,
+            identity_index,
+            self._directory_listing,
+            match_on_name=self.match_on_name,
+            skip_own_url=not self.revisit_known,
+        )
+
+    @staticmethod
+    def _directory_listing(coach_href, coach_name):
+        # Processors persisted before names were listed hold the href as the object.
+        if coach_name == coach_href:
+            coach_name = ""
+        return {"source_url": coach_href, "full_name": coach_name}
+
+    def _create_coach_scraper(self, worker_index):
+        if self.backend == "static":
+            return LifeCoachSchoolStaticCoachScraper(
+                self.static_timeout, html_cache=self.html_cache
+            )
+        # The first worker reuses the driver this scraper was given, the rest get their own.
+        if worker_index == 0 and self.driver is not None:
+            return LifeCoachSchoolCoachScraper(self.driver)
+        return LifeCoachSchoolCoachScraper(create_driver(headless=True))
+
+    def _close_coach_scraper(self, lcs_coach_scraper):
+        if (
+            lcs_coach_scraper.driver is not None
+            and lcs_coach_scraper.driver is not self.driver
+        ):
+            lcs_coach_scraper.driver.quit()
+
+    def _scrape_coach(self, lcs_coach_scraper, coach_href):
+        """
+        Returns (coach data, page state), coach data is UNCHANGED when the page is the same
+        as when it was stored, the result is None when the page couldn't be loaded or, in a
+        browser, gathered.
+        """
+        previous = self.page_states.get(coach_href)
+        if lcs_coach_scraper.driver is not None:
+            return self._scrape_coach_in_browser(
+                lcs_coach_scraper, coach_href, previous
+            )
+        fields = None
+        headers = None
+
+        def inner_extract():
+            nonlocal fields, headers
+            fields, headers = lcs_coach_scraper.fetch_fields(
+                coach_href, conditional_headers(previous)
+            )
+
+        if not retry(inner_extract, max_tries=self.retries):
+            self.logger.log("Could not load coach page: " + coach_href, Level.ERROR)
+            return None
+        if fields is None:
+            return UNCHANGED, previous
+        state = page_state(headers, fields)
+        if is_unchanged(previous, state):
+            return UNCHANGED, state
+        return lcs_coach_scraper.gather_coach_data(coach_href, data=fields), state
+
+    def _scrape_coach_in_browser(self, lcs_coach_scraper, coach_href, previous):
+        driver = lcs_coach_scraper.driver
+        try:
+            driver.get(coach_href)
+        except TimeoutException:
+            self.logger.log("Coach page load timeout: " + coach_href, Level.ERROR)
+            return None
+        result = None
+
+        def inner_scrape():
+            # A field that hasn't rendered yet extracts as null, so the live page is read
+            # again until the coach gathers.
+            nonlocal result
+            fields = lcs_coach_scraper.extract_fields(coach_href)
+            state = page_state(None, fields)
+            if is_unchanged(previous, state):
+                result = UNCHANGED, state
+                return
+            coach_data = lcs_coach_scraper.gather_coach_data(coach_href, data=fields)
+            if coach_data is None:
+                raise ValueError("Coach not gathered: " + coach_href)
+            result = coach_data, state
+
+        if not retry(inner_scrape, max_tries=self.retries):
+            self.logger.log("Could not gather coach page: " + coach_href, Level.ERROR)
+            return None
+        if result[0] is not UNCHANGED:
+            # Cached once gathered, from the DOM the data came from.
+            self.html_cache.put(coach_href, driver.page_source)
+        return result
 
     def load_persistent_processor(self):
         if not self.persistant_processor.is_initialized():
             self.logger.log("Initializing coaches.", Level.SUMMARY)
-            coach_hrefs = self.load_coaches_from_directory()
-            objects_dict = {}
-            for coach_href in coach_hrefs:
-                objects_dict[coach_href] = coach_href
-            self.persistant_processor.initialize(objects=objects_dict)
+            # The listed name is kept as the object, it can identify an already known coach.
+            self.persistant_processor.initialize(objects=self.load_directory_listing())
             self.logger.log("Coach hrefs loaded and persisted.", Level.SUMMARY)
         else:
             self.logger.log(
@@ -155,18 +415,37 @@ class LifeCoachSchoolWebScraper:
             )
 
     def load_coaches_from_directory(self):
-        coach_hrefs = None
+        return list(self.load_directory_listing())
+
+    def load_directory_listing(self):
+        """
+        Dict of coach href to the coach name listed in the directory.
+        """
+        coach_listing = None
 
         def inner_load():
-            nonlocal coach_hrefs
+            nonlocal coach_listing
             self.logger.log(
                 "Trying to gather directory: " + self.directory_url, Level.SUMMARY
             )
+            if self.backend in ("static", "async"):
+                directory = extract_fields_from_html(
+                    fetch_html(self.directory_url, timeout=self.static_timeout),
+                    self.DIRECTORY_FIELDS,
+                    base_url=self.directory_url,
+                )
+                coach_listing = dict(
+                    zip(directory["coach_hrefs"], directory["coach_names"])
+                )
+                return
             self.driver.get(self.directory_url)
             coach_elements = self.driver.find_elements_by_xpath(
-                "//*[@class='cmed_tiles_view_item']//*[@class='part1']/a"
+                self.DIRECTORY_COACH_XPATH
             )
-            coach_hrefs = [ce.get_attribute("href") for ce in coach_elements]
+            coach_listing = {
+                ce.get_attribute("href"): " ".join(ce.text.split())
+                for ce in coach_elements
+            }
 
         result = retry(inner_load, max_tries=self.retries)
         if not result:
@@ -174,7 +453,7 @@ class LifeCoachSchoolWebScraper:
             self.logger.log(message, Level.CRITICAL)
             raise RuntimeError(message)
 
-        return coach_hrefs
+        return coach_listing
 
 
 class TestLifeCoachSchoolCoachScraper(TestCase):
@@ -261,3 +540,354 @@ class TestLifeCoachSchoolCoachScraper(TestCase):
         )
         self.assertEqual(cd.linkedin_url, "")
         self.assertEqual(cd.twitter_url, "")
+
+
+class TestLifeCoachSchoolExtractedFields(TestCase):
+    TEST_HREF = "https://thelifecoachschool.com/certified-coach/vanessa-foerster/"
+    TEST_FIELDS = {
+        "name": "Vanessa Foerster",
+        "coach_cert": "Certified Life Coach",
+        "niche": ["Niche", "Health & Wellness", "Other"],
+        "website": "https://thelifecoachschool.com/certified-coach/vanessa-foerster/?cmedid=21481&cmedkey=2a7e45a8c8",
+        "email": "mailto:vanessa@vanessafayefoerster.com",
+        "instagram": "https://www.instagram.com/vanessafayefoerster/?hl=en",
+        "linkedin": None,
+        "twitter": None,
+    }
+
+    class _ScriptDriver:
+        def __init__(self, result):
+            self.result = result
+            self.scripts_executed = 0
+
+        def execute_script(self, script, *args):
+            self.scripts_executed += 1
+            return self.result
+
+    class _RenderingDriver(_ScriptDriver):
+        page_source = "<html>rendered</html>"
+
+        def __init__(self, first_result, result):
+            super().__init__(result)
+            self.first_result = first_result
+
+        def get(self, url):
+            pass
+
+        def execute_script(self, script, *args):
+            result = super().execute_script(script, *args)
+            return self.first_result if self.scripts_executed == 1 else result
+
+    def setUp(self):
+        test_setup()
+
+    def test_gather_from_extracted_fields(self):
+        driver = self._ScriptDriver(self.TEST_FIELDS)
+        lcs = LifeCoachSchoolCoachScraper(driver)
+        cd = lcs.gather_coach_data(self.TEST_HREF)
+        self.assertEqual(driver.scripts_executed, 1)
+        self.assertEqual(cd.source_url, self.TEST_HREF)
+        self.assertEqual(cd.first_name, "Vanessa")
+        self.assertEqual(cd.last_name, "Foerster")
+        self.assertEqual(cd.coach_cert, CoachCert.LIFE)
+        self.assertEqual(cd.niche_description, "Health & Wellness, Other")
+        self.assertEqual(cd.email, "vanessa@vanessafayefoerster.com")
+        self.assertEqual(
+            cd.instagram_url, "https://www.instagram.com/vanessafayefoerster/?hl=en"
+        )
+        self.assertEqual(cd.linkedin_url, "")
+        self.assertEqual(cd.twitter_url, "")
+
+    def test_gather_from_passed_data(self):
+        driver = self._ScriptDriver(None)
+        lcs = LifeCoachSchoolCoachScraper(driver)
+        cd = lcs.gather_coach_data(self.TEST_HREF, data=self.TEST_FIELDS)
+        self.assertEqual(driver.scripts_executed, 0)
+        self.assertEqual(cd.full_name, "Vanessa Foerster")
+
+    def test_browser_retries_until_fields_render(self):
+        test_paths = [
+            config.read("TEST", "TEST_CSV_FILE_PATH"),
+            config.read("TEST", "TEST_OBJECTS_PATH"),
+            config.read("TEST", "TEST_COACH_DATA_STORAGE_PATH"),
+        ]
+        _remove_test_outputs(*test_paths)
+        # The name hasn't rendered on the first read.
+        driver = self._RenderingDriver(
+            dict(self.TEST_FIELDS, name=None), self.TEST_FIELDS
+        )
+        lcs = LifeCoachSchoolWebScraper(None, backend="browser", workers=1)
+        lcs.page_states = PageStates(config.read("TEST", "TEST_PAGE_STATES_PATH"))
+        lcs.html_cache = HtmlCache(config.read("TEST", "TEST_HTML_CACHE_PATH"))
+
+        coach_data, _ = lcs._scrape_coach(
+            LifeCoachSchoolCoachScraper(driver), self.TEST_HREF
+        )
+        self.assertEqual(coach_data.full_name, "Vanessa Foerster")
+        self.assertEqual(driver.scripts_executed, 2)
+        self.assertEqual(
+            [url for url, _, _ in lcs.html_cache.latest()], [self.TEST_HREF]
+        )
+        self.assertEqual(lcs.html_cache.get(self.TEST_HREF), driver.page_source)
+        lcs.page_states.close()
+        lcs.html_cache.close()
+        _remove_test_outputs(*test_paths)
+
+
+class TestLifeCoachSchoolStaticScraper(TestCase):
+    FIXTURES_PATH = os.path.join(os.path.dirname(__file__), "fixtures")
+    SERVER = None
+
+    @classmethod
+    def setUpClass(cls):
+        handler = partial(_QuietFixtureHandler, directory=cls.FIXTURES_PATH)
+        cls.SERVER = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        threading.Thread(target=cls.SERVER.serve_forever, daemon=True).start()
+        cls.BASE_URL = "http://127.0.0.1:" + str(cls.SERVER.server_address[1])
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.SERVER.shutdown()
+        cls.SERVER.server_close()
+
+    def setUp(self):
+        test_setup()
+
+    def test_static_fields_match_browser_fields(self):
+        source_url = self.BASE_URL + "/certified-coach/vanessa-foerster/"
+        fields = LifeCoachSchoolStaticCoachScraper().extract_fields(source_url)
+        self.assertEqual(fields, TestLifeCoachSchoolExtractedFields.TEST_FIELDS)
+
+    def test_static_coach_data_matches_browser_coach_data(self):
+        source_url = self.BASE_URL + "/certified-coach/vanessa-foerster/"
+        static_cd = LifeCoachSchoolStaticCoachScraper().gather_coach_data(source_url)
+        browser_cd = LifeCoachSchoolCoachScraper(None).gather_coach_data(
+            source_url, data=TestLifeCoachSchoolExtractedFields.TEST_FIELDS
+        )
+        self.assertEqual(
+            static_cd.data_snapshot(log=False), browser_cd.data_snapshot(log=False)
+        )
+
+    def test_static_social_media(self):
+        source_url = self.BASE_URL + "/certified-coach/anusha-streubel/"
+        cd = LifeCoachSchoolStaticCoachScraper().gather_coach_data(source_url)
+        self.assertEqual(cd.coach_cert, CoachCert.MASTER)
+        self.assertEqual(cd.niche_description, "Stress")
+        self.assertEqual(
+            cd.instagram_url, "https://www.instagram.com/releasetheoverwhelm/"
+        )
+        self.assertEqual(
+            cd.linkedin_url,
+            "http://www.linkedin.com/in/anusha-hemachandra-streubel-md-mph-4814a75",
+        )
+        self.assertEqual(cd.twitter_url, "https://twitter.com/anushastreubel")
+
+    def test_static_directory(self):
+        lcs = LifeCoachSchoolWebScraper(None, backend="static")
+        lcs.directory_url = self.BASE_URL + "/directory/"
+        self.assertEqual(
+            lcs.load_coaches_from_directory(),
+            [
+                self.BASE_URL + "/certified-coach/vanessa-foerster/",
+                self.BASE_URL + "/certified-coach/anusha-streubel/",
+            ],
+        )
+
+    def test_static_crawl_with_workers(self):
+        csv_file_path = config.read("TEST", "TEST_CSV_FILE_PATH")
+        objects_file_path = config.read("TEST", "TEST_OBJECTS_PATH")
+        coach_data_storage_path = config.read("TEST", "TEST_COACH_DATA_STORAGE_PATH")
+        _remove_test_outputs(csv_file_path, objects_file_path, coach_data_storage_path)
+        coach_hrefs = [
+            self.BASE_URL + "/certified-coach/vanessa-foerster/",
+            self.BASE_URL + "/certified-coach/anusha-streubel/",
+            self.BASE_URL + "/certified-coach/missing-coach/",
+        ]
+        pp = PersistentProcessor(objects_file_path)
+        pp.initialize({coach_href: coach_href for coach_href in coach_hrefs})
+        pp.close()
+
+        lcs = LifeCoachSchoolWebScraper(
+            None,
+            csv_file_path=csv_file_path,
+            backend="static",
+            workers=3,
+            object_file_path=objects_file_path,
+            coach_data_storage_path=coach_data_storage_path,
+            identity_index_path=config.read("TEST", "TEST_IDENTITY_INDEX_PATH"),
+            page_states_path=config.read("TEST", "TEST_PAGE_STATES_PATH"),
+            html_cache_path=config.read("TEST", "TEST_HTML_CACHE_PATH"),
+        )
+        lcs.process_all_coaches()
+        close_coach_data(coach_data_storage_path)
+
+        stored = [cd.source_url for cd in read_coach_data(coach_data_storage_path)]
+        self.assertEqual(sorted(stored), sorted(coach_hrefs[:2]))
+        with open(csv_file_path, "r") as csv_file:
+            self.assertEqual(len(csv_file.readlines()), 3)
+        pp = PersistentProcessor(objects_file_path)
+        self.assertEqual(list(pp.get_unprocessed()), [coach_hrefs[2]])
+        pp.close()
+        _remove_test_outputs(csv_file_path, objects_file_path, coach_data_storage_path)
+
+    def test_async_crawl(self):
+        csv_file_path = config.read("TEST", "TEST_CSV_FILE_PATH")
+        objects_file_path = config.read("TEST", "TEST_OBJECTS_PATH")
+        coach_data_storage_path = config.read("TEST", "TEST_COACH_DATA_STORAGE_PATH")
+        _remove_test_outputs(csv_file_path, objects_file_path, coach_data_storage_path)
+        coach_hrefs = [
+            self.BASE_URL + "/certified-coach/vanessa-foerster/",
+            self.BASE_URL + "/certified-coach/anusha-streubel/",
+            self.BASE_URL + "/certified-coach/missing-coach/",
+        ]
+        pp = PersistentProcessor(objects_file_path)
+        pp.initialize({coach_href: coach_href for coach_href in coach_hrefs})
+        pp.close()
+
+        lcs = LifeCoachSchoolWebScraper(
+            None,
+            csv_file_path=csv_file_path,
+            backend="async",
+            object_file_path=objects_file_path,
+            coach_data_storage_path=coach_data_storage_path,
+            identity_index_path=config.read("TEST", "TEST_IDENTITY_INDEX_PATH"),
+            page_states_path=config.read("TEST", "TEST_PAGE_STATES_PATH"),
+            html_cache_path=config.read("TEST", "TEST_HTML_CACHE_PATH"),
+        )
+        lcs.process_all_coaches()
+        close_coach_data(coach_data_storage_path)
+
+        stored = {cd.source_url: cd for cd in read_coach_data(coach_data_storage_path)}
+        self.assertEqual(sorted(stored), sorted(coach_hrefs[:2]))
+        self.assertEqual(stored[coach_hrefs[0]].coach_cert, CoachCert.LIFE)
+        pp = PersistentProcessor(objects_file_path)
+        self.assertEqual(list(pp.get_unprocessed()), [coach_hrefs[2]])
+        pp.close()
+        _remove_test_outputs(csv_file_path, objects_file_path, coach_data_storage_path)
+
+    def test_crawl_skips_known_coaches(self):
+        csv_file_path = config.read("TEST", "TEST_CSV_FILE_PATH")
+        objects_file_path = config.read("TEST", "TEST_OBJECTS_PATH")
+        coach_data_storage_path = config.read("TEST", "TEST_COACH_DATA_STORAGE_PATH")
+        _remove_test_outputs(csv_file_path, objects_file_path, coach_data_storage_path)
+        federation_url = "https://apps.coachingfederation.org/coach?coachcstkey=1"
+        coach_hrefs = [
+            self.BASE_URL + "/certified-coach/vanessa-foerster/",
+            self.BASE_URL + "/certified-coach/anusha-streubel/",
+        ]
+        # A namesake from another source, and a coach stored by an earlier crawl.
+        write_coach_data(
+            CoachData(
+                federation_url,
+                first_name="Vanessa",
+                last_name="Foerster",
+                full_name="Vanessa Foerster",
+            ),
+            coach_data_storage_path,
+        )
+        write_coach_data(
+            CoachData(
+                coach_hrefs[1],
+                first_name="Anusha",
+                last_name="Streubel",
+                full_name="Anusha Streubel",
+            ),
+            coach_data_storage_path,
+        )
+        close_coach_data(coach_data_storage_path)
+        pp = PersistentProcessor(objects_file_path)
+        pp.initialize(dict(zip(coach_hrefs, ["Vanessa Foerster", "Anusha Streubel"])))
+        pp.close()
+
+        lcs = LifeCoachSchoolWebScraper(
+            None,
+            csv_file_path=csv_file_path,
+            backend="static",
+            workers=1,
+            object_file_path=objects_file_path,
+            coach_data_storage_path=coach_data_storage_path,
+            identity_index_path=config.read("TEST", "TEST_IDENTITY_INDEX_PATH"),
+            page_states_path=config.read("TEST", "TEST_PAGE_STATES_PATH"),
+            html_cache_path=config.read("TEST", "TEST_HTML_CACHE_PATH"),
+        )
+        lcs.revisit_known = False
+        # Even with name matching on, a name alone doesn't make Vanessa known.
+        lcs.match_on_name = True
+        lcs.process_all_coaches()
+        close_coach_data(coach_data_storage_path)
+
+        stored = [cd.source_url for cd in read_coach_data(coach_data_storage_path)]
+        self.assertEqual(stored, [federation_url, coach_hrefs[1], coach_hrefs[0]])
+        pp = PersistentProcessor(objects_file_path)
+        self.assertEqual(pp.unprocessed_count(), 0)
+        pp.close()
+        _remove_test_outputs(csv_file_path, objects_file_path, coach_data_storage_path)
+
+    def test_recrawl_skips_unchanged_pages(self):
+        csv_file_path = config.read("TEST", "TEST_CSV_FILE_PATH")
+        objects_file_path = config.read("TEST", "TEST_OBJECTS_PATH")
+        coach_data_storage_path = config.read("TEST", "TEST_COACH_DATA_STORAGE_PATH")
+        _remove_test_outputs(csv_file_path, objects_file_path, coach_data_storage_path)
+        coach_hrefs = [
+            self.BASE_URL + "/certified-coach/vanessa-foerster/",
+            self.BASE_URL + "/certified-coach/anusha-streubel/",
+        ]
+
+        # The second crawl starts from a fresh processor, as a rerun would.
+        for backend in ("static", "async"):
+            if os.path.isfile(objects_file_path):
+                os.remove(objects_file_path)
+            pp = PersistentProcessor(objects_file_path)
+            pp.initialize({coach_href: coach_href for coach_href in coach_hrefs})
+            pp.close()
+            lcs = LifeCoachSchoolWebScraper(
+                None,
+                csv_file_path=csv_file_path,
+                backend=backend,
+                workers=2,
+                object_file_path=objects_file_path,
+                coach_data_storage_path=coach_data_storage_path,
+                identity_index_path=config.read("TEST", "TEST_IDENTITY_INDEX_PATH"),
+                page_states_path=config.read("TEST", "TEST_PAGE_STATES_PATH"),
+                html_cache_path=config.read("TEST", "TEST_HTML_CACHE_PATH"),
+            )
+            lcs.process_all_coaches()
+            close_coach_data(coach_data_storage_path)
+
+        stored = [cd.source_url for cd in read_coach_data(coach_data_storage_path)]
+        self.assertEqual(sorted(stored), sorted(coach_hrefs))
+        page_states = PageStates(config.read("TEST", "TEST_PAGE_STATES_PATH"))
+        self.assertIsNotNone(page_states.get(coach_hrefs[0]).last_modified)
+        page_states.close()
+        html_cache = HtmlCache(config.read("TEST", "TEST_HTML_CACHE_PATH"))
+        self.assertEqual(
+            sorted(url for url, _, _ in html_cache.latest()), sorted(coach_hrefs)
+        )
+        html_cache.close()
+        pp = PersistentProcessor(objects_file_path)
+        self.assertEqual(pp.unprocessed_count(), 0)
+        pp.close()
+        _remove_test_outputs(csv_file_path, objects_file_path, coach_data_storage_path)
+
+
+def _remove_test_outputs(csv_file_path, objects_file_path, coach_data_storage_path):
+    close_coach_data(coach_data_storage_path)
+    # The test csv is tracked, it is emptied rather than removed.
+    with open(csv_file_path, "w+") as csv_file:
+        csv_file.write("")
+    if os.path.isfile(objects_file_path):
+        os.remove(objects_file_path)
+    for path in [
+        objects_file_path + ".journal",
+        coach_data_storage_path,
+        config.read("TEST", "TEST_IDENTITY_INDEX_PATH"),
+        config.read("TEST", "TEST_PAGE_STATES_PATH"),
+        config.read("TEST", "TEST_HTML_CACHE_PATH"),
+    ]:
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+
+
+class _QuietFixtureHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
@@ -0,0 +1,74 @@
+from urllib.parse import urljoin
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+from lxml import etree, html
+
+_USER_AGENT = "Mozilla/5.0 (X11; Linux x86_64; rv:94.0) Gecko/20100101 Firefox/94.0"
+# Selenium returns these as resolved properties, relative values are joined to the page url.
+_URL_ATTRIBUTES = {"href", "src"}
+
+_COMPILED_FIELDS = {}
+
+
+def fetch_html(url, timeout=30):
+    return fetch_page(url, timeout=timeout)[0]
+
+
+def fetch_page(url, timeout=30, headers=None):
+    """
+    Returns (page html, response headers), the html is None when conditional headers got
+    a 304 Not Modified back.
+    """
+    request = Request(url, headers={"User-Agent": _USER_AGENT, **(headers or {})})
+    try:
+        with urlopen(request, timeout=timeout) as response:
+            charset = response.headers.get_content_charset() or "utf-8"
+            return response.read().decode(charset, errors="replace"), response.headers
+    except HTTPError as e:
+        if e.code == 304:
+            return None, e.headers
+        raise
+
+
+def compile_fields(fields):
+    """
+    Compiles the xpaths of a CoachScraper.FIELDS dict once, keyed by the dict's identity.
+    """
+    global _COMPILED_FIELDS
+    if id(fields) not in _COMPILED_FIELDS:
+        _COMPILED_FIELDS[id(fields)] = (
+            fields,
+            {
+                name: (etree.XPath(field["xpath"]), field)
+                for name, field in fields.items()
+            },
+        )
+    return _COMPILED_FIELDS[id(fields)][1]
+
+
+def _read_node(node, field, base_url):
+    attribute = field.get("attribute")
+    if not attribute:
+        return " ".join(node.text_content().split())
+    value = node.get(attribute)
+    if value is not None and attribute in _URL_ATTRIBUTES:
+        value = urljoin(base_url, value)
+    return value
+
+
+def extract_fields_from_html(page_html, fields, base_url=""):
+    """
+    Same result shape as CoachScraper.extract_fields, evaluated with lxml instead of a browser.
+    """
+    document = html.fromstring(page_html)
+    result = {}
+    for name, (xpath, field) in compile_fields(fields).items():
+        nodes = xpath(document)
+        if field.get("all"):
+            result[name] = [_read_node(node, field, base_url) for node in nodes]
+        elif nodes:
+            result[name] = _read_node(nodes[0], field, base_url)
+        else:
+            result[name] = None
+    return result
@@ -16,7 +16,9 @@ def retry_function_sleep(fun, max_tries=10, sleep_time=0.3, on_exception=None):
         except Exception as e:
             if on_exception:
                 on_exception()
-            time.sleep(sleep_time)
+            # Nothing left to wait for after the last try.
+            if i + 1 < max_tries:
+                time.sleep(sleep_time)
             continue
     return False
 
@@ -1,3 +1,4 @@
+from itertools import product
 from unittest import TestCase
 
 
@@ -9,17 +10,10 @@ def affix_variations(prefix):
     :param prefix: string to expand into acronym w/ different punctuation
     :return: variations of acronym as set
     """
-    variations = set()
-
-    for power_set_index in range(0, 2 ** len(prefix)):
-        variation = ""
-        # get binary string representation of power_set_index zero padded to length of prefix
-        bin_i = ("{0:0" + str(len(prefix)) + "b}").format(power_set_index)
-        for index, char in enumerate(prefix):
-            variation += char + ("." if bin_i[index] == "1" else "")
-        variations.add(variation)
-
-    return variations
+    return {
+        "".join(char + dot for char, dot in zip(prefix, dots))
+        for dots in product(("", "."), repeat=len(prefix))
+    }
 
 
 class _AffixVariation(TestCase):
@@ -1,20 +1,41 @@
 import os
 import pickle
+import shutil
 from unittest import TestCase
 from test_utils import test_setup
 
 from config_dir import config
+from utils.record_log import RecordLog
 
 
 class PersistentProcessor:
-    def __init__(self, objects_file_path=None):
+    """
+    Tracks which objects of a crawl are still to be processed across runs.
+
+    The objects dict is pickled once as a base snapshot, processed keys are appended to a
+    journal next to it and replayed on startup. The journal is fsynced every sync_every
+    keys and folded into a new snapshot every compact_every keys or on close.
+    """
+
+    def __init__(self, objects_file_path=None, sync_every=32, compact_every=1000):
         self.object_file_exists = None
         self.objects_file_path = objects_file_path
+        self.journal_path = objects_file_path + ".journal"
+        self.sync_every = sync_every
+        self.compact_every = compact_every
+        self._journal = None
+        self._processed = set()
+        self._unsynced = 0
 
         self.is_initialized()
 
         if self.object_file_exists:
             self.objects_dict = self._get_existing_objects()
+            self._journal = RecordLog(self.journal_path, compact_segments=0)
+            for payload in self._journal:
+                key = pickle.loads(payload)
+                if key in self.objects_dict:
+                    self._processed.add(key)
 
     def is_initialized(self):
         if self.object_file_exists is None:
@@ -30,20 +51,92 @@ class PersistentProcessor:
         if not isinstance(objects, dict):
             raise ValueError("Objects should be a dict.")
 
+        # A journal without its snapshot belongs to a previous, deleted run.
+        if os.path.isdir(self.journal_path):
+            shutil.rmtree(self.journal_path)
+
         self.objects_dict = objects
         self._persist_objects()
+        self.object_file_exists = True
+        self._journal = RecordLog(self.journal_path, compact_segments=0)
+
+    def reset(self, objects):
+        """
+        Replace the objects of an initialized processor, all of them unprocessed. Processed
+        keys are folded into the old snapshot and the journal emptied before the new
+        snapshot is written, so no journal ever replays old keys over the new objects.
+        """
+        if not isinstance(objects, dict):
+            raise ValueError("Objects should be a dict.")
+
+        self.compact()
+        if self._journal is not None:
+            self._journal.close()
+        shutil.rmtree(self.journal_path, ignore_errors=True)
+        self._journal = RecordLog(self.journal_path, compact_segments=0)
+        self.objects_dict = objects
+        self._persist_objects()
+        self._processed = set()
+        self._unsynced = 0
 
     def get_unprocessed(self):
-        return list(self.objects_dict.keys())
+        objects_dict = self.objects_dict
+        return (
+            key
+            for key in objects_dict
+            if key in self.objects_dict and key not in self._processed
+        )
+
+    def unprocessed_count(self):
+        return len(self.objects_dict) - len(self._processed)
 
     def object_processed(self, key):
-        del self.objects_dict[key]
+        if key not in self.objects_dict or key in self._processed:
+            raise KeyError(key)
+
+        self._journal.append(pickle.dumps(key, protocol=pickle.HIGHEST_PROTOCOL))
+        self._processed.add(key)
+        self._unsynced += 1
+        if self._unsynced >= self.sync_every:
+            self._journal.sync()
+            self._unsynced = 0
+        if len(self._processed) >= self.compact_every:
+            self.compact()
+
+    def compact(self):
+        """
+        Write the remaining objects as the new base snapshot and empty the journal. Replaying
+        a journal over a snapshot that already dropped its keys is harmless, so a crash
+        between the two steps loses nothing.
+        """
+        if not self._processed:
+            return
+
+        self.objects_dict = {
+            key: value
+            for key, value in self.objects_dict.items()
+            if key not in self._processed
+        }
         self._persist_objects()
+        self._journal.close()
+        shutil.rmtree(self.journal_path)
+        self._journal = RecordLog(self.journal_path, compact_segments=0)
+        self._processed = set()
+        self._unsynced = 0
+
+    def close(self):
+        if self._journal is None:
+            return
+        self.compact()
+        self._journal.close()
+        self._journal = None
 
     def _persist_objects(self):
         temp_file_path = self.objects_file_path + ".temp"
         with open(temp_file_path, "wb+") as temp_file:
             pickle.dump(self.objects_dict, temp_file, protocol=pickle.HIGHEST_PROTOCOL)
+            temp_file.flush()
+            os.fsync(temp_file.fileno())
         os.replace(temp_file_path, self.objects_file_path)
 
     def _get_existing_objects(self):
@@ -59,9 +152,17 @@ class PersistentProcessor:
 class _TestPersistentProcessor(TestCase):
     def setUp(self):
         test_setup()
+        self._remove()
+
+    def tearDown(self):
+        self._remove()
+
+    def _remove(self):
         objects_file_path = config.read("TEST", "TEST_OBJECTS_PATH")
         if os.path.exists(objects_file_path):
             os.remove(objects_file_path)
+        if os.path.exists(objects_file_path + ".journal"):
+            shutil.rmtree(objects_file_path + ".journal")
 
     def test_construct(self):
         objects_file_path = config.read("TEST", "TEST_OBJECTS_PATH")
@@ -76,6 +177,7 @@ class _TestPersistentProcessor(TestCase):
             objects_dict = pickle.load(objects_file)
             self.assertTrue("hi" in objects_dict)
             self.assertTrue("there" in objects_dict)
+        pp.close()
 
     def test_process(self):
         objects_file_path = config.read("TEST", "TEST_OBJECTS_PATH")
@@ -84,7 +186,74 @@ class _TestPersistentProcessor(TestCase):
         )
         pp.initialize({"hi": "hi", "there": "there"})
         pp.object_processed("hi")
+        self.assertEqual(list(pp.get_unprocessed()), ["there"])
+        pp.close()
         with open(objects_file_path, "rb") as objects_file:
             objects_dict = pickle.load(objects_file)
             self.assertTrue("hi" not in objects_dict)
             self.assertTrue("there" in objects_dict)
+
+    def test_replay_journal(self):
+        objects_file_path = config.read("TEST", "TEST_OBJECTS_PATH")
+        pp = PersistentProcessor(objects_file_path=objects_file_path)
+        pp.initialize({"hi": "hi", "there": "there", "friend": "friend"})
+        pp.object_processed("hi")
+        pp.object_processed("friend")
+        # Simulate a crash: the journal is never compacted into the snapshot.
+        pp._journal.close()
+
+        with open(objects_file_path, "rb") as objects_file:
+            self.assertEqual(len(pickle.load(objects_file)), 3)
+        pp = PersistentProcessor(objects_file_path=objects_file_path)
+        self.assertEqual(list(pp.get_unprocessed()), ["there"])
+        self.assertEqual(pp.unprocessed_count(), 1)
+        pp.close()
+
+    def test_reset(self):
+        objects_file_path = config.read("TEST", "TEST_OBJECTS_PATH")
+        pp = PersistentProcessor(objects_file_path=objects_file_path)
+        pp.initialize({"hi": "hi", "there": "there"})
+        pp.object_processed("hi")
+        pp.reset({"hi": 1, "friend": 2})
+        pp.object_processed("friend")
+        pp._journal.close()
+
+        pp = PersistentProcessor(objects_file_path=objects_file_path)
+        self.assertEqual(list(pp.get_unprocessed()), ["hi"])
+        pp.close()
+
+    def test_reset_interrupted(self):
+        objects_file_path = config.read("TEST", "TEST_OBJECTS_PATH")
+        pp = PersistentProcessor(objects_file_path=objects_file_path)
+        pp.initialize({"hi": "hi", "there": "there"})
+        pp.object_processed("hi")
+        persist_objects = pp._persist_objects
+
+        def persist_and_crash():
+            persist_objects()
+            if pp.objects_dict == {"hi": 1}:
+                raise KeyboardInterrupt()
+
+        pp._persist_objects = persist_and_crash
+        with self.assertRaises(KeyboardInterrupt):
+            pp.reset({"hi": 1})
+        pp._journal.close()
+
+        # The old journal must not mark the new "hi" processed.
+        pp = PersistentProcessor(objects_file_path=objects_file_path)
+        self.assertEqual(list(pp.get_unprocessed()), ["hi"])
+        pp.close()
+
+    def test_compact_while_iterating(self):
+        objects_file_path = config.read("TEST", "TEST_OBJECTS_PATH")
+        pp = PersistentProcessor(objects_file_path=objects_file_path, compact_every=2)
+        pp.initialize({key: key for key in range(5)})
+        for key in pp.get_unprocessed():
+            if key != 3:
+                pp.object_processed(key)
+        self.assertEqual(list(pp.get_unprocessed()), [3])
+        # Four processed keys with compact_every=2 leave nothing in the journal.
+        self.assertEqual(list(pp._journal), [])
+        with open(objects_file_path, "rb") as objects_file:
+            self.assertEqual(list(pickle.load(objects_file)), [3])
+        pp.close()
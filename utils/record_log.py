@@ -0,0 +1,330 @@
+import os
+import shutil
+import struct
+import zlib
+from typing import Callable, Iterable, Iterator, Optional
+from unittest import TestCase
+
+from config_dir import config
+from test_utils import test_setup
+
+# Every record is framed as <payload length, crc32 of payload> followed by the payload.
+FRAME_HEADER = struct.Struct("<II")
+_SEGMENT_SUFFIX = ".seg"
+_COMPACTING_MARKER = "compacting"
+
+
+def frame_record(payload: bytes) -> bytes:
+    return FRAME_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+class RecordLog:
+    """
+    Append-only log of byte records split across numbered segment files in a directory.
+
+    Appends go to the newest (active) segment and are O(1). A torn frame at the tail of the
+    active segment (crash mid-write) is truncated away when the log is opened. Once the
+    number of sealed segments reaches compact_segments they are merged into one; when a
+    key function is given only the latest record for each key survives compaction.
+    """
+
+    def __init__(
+        self,
+        directory_path,
+        max_segment_bytes=16 * 1024 * 1024,
+        compact_segments=8,
+        key: Optional[Callable[[bytes], object]] = None,
+    ):
+        self.directory_path = directory_path
+        self.max_segment_bytes = max_segment_bytes
+        self.compact_segments = compact_segments
+        self.key = key
+        self._active_file = None
+
+        os.makedirs(self.directory_path, exist_ok=True)
+        self._finish_compaction()
+        segments = self._segment_indexes()
+        if not segments:
+            self._active_index = 1
+        else:
+            self._active_index = segments[-1]
+            self._truncate_torn_tail(self._segment_path(self._active_index))
+        self._open_active()
+
+    def append(self, payload: bytes):
+        if self._active_file.tell() >= self.max_segment_bytes:
+            self._roll()
+        self._active_file.write(frame_record(payload))
+        self._active_file.flush()
+
+    def sync(self):
+        self._active_file.flush()
+        os.fsync(self._active_file.fileno())
+
+    def close(self):
+        if self._active_file is not None:
+            self._active_file.close()
+            self._active_file = None
+
+    def __iter__(self) -> Iterator[bytes]:
+        if self._active_file is not None:
+            self._active_file.flush()
+        for index in self._segment_indexes():
+            yield from _read_segment(self._segment_path(index))
+
+    def compact(self):
+        """
+        Merge every sealed segment into the newest sealed one, leaving the active one alone.
+        """
+        sealed = [i for i in self._segment_indexes() if i < self._active_index]
+        if len(sealed) < 2:
+            return
+
+        latest = None
+        if self.key is not None:
+            latest = {}
+            position = 0
+            for index in sealed:
+                for payload in _read_segment(self._segment_path(index)):
+                    latest[self.key(payload)] = position
+                    position += 1
+            latest = set(latest.values())
+
+        def merged():
+            position = 0
+            for index in sealed:
+                for payload in _read_segment(self._segment_path(index)):
+                    if latest is None or position in latest:
+                        yield payload
+                    position += 1
+
+        self._replace_segments(sealed[-1], merged())
+
+    def rewrite(self, payloads: Iterable[bytes]):
+        """
+        Replace every record of the log, the active segment's included, with payloads. A
+        crash leaves either the old records or the new ones.
+        """
+        self.close()
+        self._replace_segments(self._active_index, payloads)
+        self._open_active()
+
+    def _replace_segments(self, target, payloads):
+        # Segment target becomes payloads and the segments before it are removed.
+        temp_path = self._segment_path(target) + ".temp"
+        with open(temp_path, "wb") as temp_file:
+            for payload in payloads:
+                temp_file.write(frame_record(payload))
+            temp_file.flush()
+            os.fsync(temp_file.fileno())
+
+        # Once the marker is down the complete temp segment is committed, a crash before the
+        # replace or the cleanup is finished on the next open. Without the marker a crash
+        # leaves the old segments as they were and the temp segment is dropped.
+        marker_path = os.path.join(self.directory_path, _COMPACTING_MARKER)
+        with open(marker_path, "w") as marker_file:
+            marker_file.write(str(target))
+            marker_file.flush()
+            os.fsync(marker_file.fileno())
+        _sync_directory(self.directory_path)
+        self._finish_compaction()
+
+    def _finish_compaction(self):
+        marker_path = os.path.join(self.directory_path, _COMPACTING_MARKER)
+        if not os.path.isfile(marker_path):
+            for name in os.listdir(self.directory_path):
+                if name.endswith(_SEGMENT_SUFFIX + ".temp"):
+                    os.remove(os.path.join(self.directory_path, name))
+            return
+        with open(marker_path, "r") as marker_file:
+            target = int(marker_file.read())
+        temp_path = self._segment_path(target) + ".temp"
+        if os.path.isfile(temp_path):
+            os.replace(temp_path, self._segment_path(target))
+            _sync_directory(self.directory_path)
+        for index in self._segment_indexes():
+            if index < target:
+                os.remove(self._segment_path(index))
+        os.remove(marker_path)
+        _sync_directory(self.directory_path)
+
+    def _roll(self):
+        self.close()
+        self._active_index += 1
+        self._open_active()
+        sealed_count = len(self._segment_indexes()) - 1
+        if self.compact_segments and sealed_count >= self.compact_segments:
+            self.compact()
+
+    def _open_active(self):
+        self._active_file = open(self._segment_path(self._active_index), "ab")
+
+    def _segment_path(self, index):
+        return os.path.join(
+            self.directory_path,
+            "{index:08d}{suffix}".format(index=index, suffix=_SEGMENT_SUFFIX),
+        )
+
+    def _segment_indexes(self):
+        return sorted(
+            int(name[: -len(_SEGMENT_SUFFIX)])
+            for name in os.listdir(self.directory_path)
+            if name.endswith(_SEGMENT_SUFFIX)
+        )
+
+    @staticmethod
+    def _truncate_torn_tail(segment_path):
+        valid_bytes = 0
+        for payload in _read_segment(segment_path):
+            valid_bytes += FRAME_HEADER.size + len(payload)
+        if valid_bytes != os.path.getsize(segment_path):
+            with open(segment_path, "rb+") as segment_file:
+                segment_file.truncate(valid_bytes)
+
+
+def _sync_directory(directory_path):
+    # Makes renames and removals in the directory durable, not possible on Windows.
+    if not hasattr(os, "O_DIRECTORY"):
+        return
+    directory_fd = os.open(directory_path, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(directory_fd)
+    finally:
+        os.close(directory_fd)
+
+
+def _read_segment(segment_path) -> Iterator[bytes]:
+    """
+    Yields payloads in order, stopping at the first short or corrupt frame.
+    """
+    with open(segment_path, "rb") as segment_file:
+        while True:
+            header = segment_file.read(FRAME_HEADER.size)
+            if len(header) < FRAME_HEADER.size:
+                return
+            length, checksum = FRAME_HEADER.unpack(header)
+            payload = segment_file.read(length)
+            if len(payload) < length or zlib.crc32(payload) != checksum:
+                return
+            yield payload
+
+
+class _TestRecordLog(TestCase):
+    def setUp(self):
+        test_setup()
+        self.log_path = config.read("TEST", "TEST_RECORD_LOG_PATH")
+        if os.path.exists(self.log_path):
+            shutil.rmtree(self.log_path)
+
+    def tearDown(self):
+        if os.path.exists(self.log_path):
+            shutil.rmtree(self.log_path)
+
+    def test_append_and_read(self):
+        record_log = RecordLog(self.log_path)
+        record_log.append(b"one")
+        record_log.append(b"two")
+        self.assertEqual(list(record_log), [b"one", b"two"])
+        record_log.close()
+
+        self.assertEqual(list(RecordLog(self.log_path)), [b"one", b"two"])
+
+    def test_segments_roll(self):
+        record_log = RecordLog(self.log_path, max_segment_bytes=1, compact_segments=0)
+        for i in range(5):
+            record_log.append(str(i).encode())
+        record_log.close()
+        self.assertEqual(len(record_log._segment_indexes()), 5)
+        self.assertEqual(
+            list(RecordLog(self.log_path)), [str(i).encode() for i in range(5)]
+        )
+
+    def test_torn_tail_truncated(self):
+        record_log = RecordLog(self.log_path)
+        record_log.append(b"complete")
+        record_log.close()
+        segment_path = record_log._segment_path(1)
+        with open(segment_path, "ab") as segment_file:
+            segment_file.write(FRAME_HEADER.pack(100, 0) + b"partial")
+
+        record_log = RecordLog(self.log_path)
+        record_log.append(b"after")
+        self.assertEqual(list(record_log), [b"complete", b"after"])
+        record_log.close()
+
+    def test_corrupt_frame_stops_segment(self):
+        record_log = RecordLog(self.log_path)
+        record_log.append(b"good")
+        record_log.append(b"flipped")
+        record_log.close()
+        segment_path = record_log._segment_path(1)
+        with open(segment_path, "rb+") as segment_file:
+            segment_file.seek(-1, os.SEEK_END)
+            segment_file.write(b"X")
+        self.assertEqual(list(RecordLog(self.log_path)), [b"good"])
+
+    def test_compaction_keeps_latest_per_key(self):
+        record_log = RecordLog(
+            self.log_path,
+            max_segment_bytes=1,
+            compact_segments=3,
+            key=lambda payload: payload[:1],
+        )
+        for payload in [b"a1", b"b1", b"a2", b"c1", b"b2"]:
+            record_log.append(payload)
+        record_log.compact()
+        # Only sealed segments are compacted, the active segment still holds b2.
+        self.assertEqual(list(record_log), [b"b1", b"a2", b"c1", b"b2"])
+        record_log.close()
+
+    def test_rewrite_replaces_every_record(self):
+        record_log = RecordLog(self.log_path, max_segment_bytes=1, compact_segments=0)
+        for payload in [b"a", b"b", b"c"]:
+            record_log.append(payload)
+        record_log.rewrite([b"b", b"d"])
+        record_log.append(b"e")
+        self.assertEqual(list(record_log), [b"b", b"d", b"e"])
+        record_log.close()
+        self.assertEqual(list(RecordLog(self.log_path)), [b"b", b"d", b"e"])
+
+    def test_interrupted_compaction_finished_on_open(self):
+        record_log = RecordLog(self.log_path, max_segment_bytes=1, compact_segments=0)
+        for payload in [b"a", b"b", b"c"]:
+            record_log.append(payload)
+        record_log.close()
+        # Simulate a crash after the merged segment replaced segment 2 but before cleanup.
+        with open(record_log._segment_path(2), "wb") as segment_file:
+            for payload in [b"a", b"b"]:
+                segment_file.write(
+                    FRAME_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+                )
+        with open(os.path.join(self.log_path, _COMPACTING_MARKER), "w") as marker:
+            marker.write("2")
+
+        self.assertEqual(list(RecordLog(self.log_path)), [b"a", b"b", b"c"])
+
+    def test_compaction_interrupted_before_replace(self):
+        record_log = RecordLog(self.log_path, max_segment_bytes=1, compact_segments=0)
+        for payload in [b"a", b"b", b"c"]:
+            record_log.append(payload)
+        record_log.close()
+        # A crash after the marker, the merged segment is still a temp file.
+        with open(record_log._segment_path(2) + ".temp", "wb") as temp_file:
+            temp_file.write(frame_record(b"a") + frame_record(b"b"))
+        with open(os.path.join(self.log_path, _COMPACTING_MARKER), "w") as marker:
+            marker.write("2")
+
+        self.assertEqual(list(RecordLog(self.log_path)), [b"a", b"b", b"c"])
+        self.assertEqual(RecordLog(self.log_path)._segment_indexes(), [2, 3])
+
+    def test_stale_temp_segment_dropped(self):
+        record_log = RecordLog(self.log_path, max_segment_bytes=1, compact_segments=0)
+        for payload in [b"a", b"b", b"c"]:
+            record_log.append(payload)
+        record_log.close()
+        # A crash while the temp segment was written, before the marker.
+        with open(record_log._segment_path(2) + ".temp", "wb") as temp_file:
+            temp_file.write(frame_record(b"a"))
+
+        self.assertEqual(list(RecordLog(self.log_path)), [b"a", b"b", b"c"])
+        self.assertFalse(os.path.exists(record_log._segment_path(2) + ".temp"))
@@ -0,0 +1,283 @@
+import queue
+import threading
+import time
+import traceback
+from typing import Callable, Iterable, Optional
+from unittest import TestCase
+
+import logger
+from logger import Level
+from test_utils import test_setup
+
+_WORKER_DONE = object()
+_NO_MORE_KEYS = object()
+
+
+def process_in_pool(
+    keys: Iterable,
+    worker_count: int,
+    setup_worker: Callable[[int], object],
+    process_key: Callable[[object, object], object],
+    handle_result: Callable[[object, object], None],
+    teardown_worker: Optional[Callable[[object], None]] = None,
+    total: Optional[int] = None,
+    description="Items",
+    progress_seconds=30.0,
+    stream=False,
+    result_outcome: Optional[Callable[[object], Optional[bool]]] = None,
+):
+    """
+    Runs process_key(worker_state, key) for every key on worker_count threads, each with
+    its own state from setup_worker(worker_index) (e.g. a browser). Results are handed to
+    handle_result(key, result) on the calling thread only, so it can be the single writer.
+    A key whose processing raises is reported with a None result. With stream=True
+    process_key returns an iterable and every item it yields is handed over as it comes.
+    Progress counts a result as succeeded when result_outcome(result) is True, failed when
+    False and not at all when None (markers that aren't items), by default succeeded
+    unless None. Returns the number of succeeded results.
+    """
+    if result_outcome is None:
+        result_outcome = _not_none
+
+    task_queue = queue.Queue(maxsize=worker_count * 2)
+    result_queue = queue.Queue()
+    stop = threading.Event()
+    log = logger.get_logger()
+
+    def feed():
+        for key in keys:
+            while not stop.is_set():
+                try:
+                    task_queue.put(key, timeout=0.1)
+                    break
+                except queue.Full:
+                    continue
+            if stop.is_set():
+                return
+        for _ in range(worker_count):
+            while not stop.is_set():
+                try:
+                    task_queue.put(_NO_MORE_KEYS, timeout=0.1)
+                    break
+                except queue.Full:
+                    continue
+
+    def work(worker_index):
+        state = None
+        try:
+            state = setup_worker(worker_index)
+            while not stop.is_set():
+                try:
+                    key = task_queue.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                if key is _NO_MORE_KEYS:
+                    break
+                try:
+                    if stream:
+                        for result in process_key(state, key):
+                            result_queue.put((key, result))
+                            if stop.is_set():
+                                break
+                        continue
+                    result = process_key(state, key)
+                except Exception:
+                    log.log(
+                        "Worker " + str(worker_index) + " failed on: " + str(key),
+                        Level.ERROR,
+                    )
+                    log.log(traceback.format_exc(), Level.ERROR)
+                    result = None
+                result_queue.put((key, result))
+        except Exception:
+            log.log("Worker " + str(worker_index) + " stopped.", Level.ERROR)
+            log.log(traceback.format_exc(), Level.ERROR)
+        finally:
+            if state is not None and teardown_worker is not None:
+                try:
+                    teardown_worker(state)
+                except Exception:
+                    log.log(traceback.format_exc(), Level.ERROR)
+            result_queue.put(_WORKER_DONE)
+
+    threads = [threading.Thread(target=feed, daemon=True)] + [
+        threading.Thread(target=work, args=(i,), daemon=True)
+        for i in range(worker_count)
+    ]
+    for thread in threads:
+        thread.start()
+
+    done = 0
+    succeeded = 0
+    workers_running = worker_count
+    start = time.monotonic()
+    last_progress = start
+    try:
+        while workers_running:
+            item = result_queue.get()
+            if item is _WORKER_DONE:
+                workers_running -= 1
+                continue
+            key, result = item
+            handle_result(key, result)
+            outcome = result_outcome(result)
+            if outcome is None:
+                continue
+            done += 1
+            if outcome:
+                succeeded += 1
+
+            now = time.monotonic()
+            if now - last_progress >= progress_seconds:
+                last_progress = now
+                log.log(
+                    progress_message(description, done, succeeded, total, now - start),
+                    Level.SUMMARY,
+                )
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+        log.log(
+            progress_message(
+                description, done, succeeded, total, time.monotonic() - start
+            ),
+            Level.SUMMARY,
+        )
+    return succeeded
+
+
+def _not_none(result):
+    return result is not None
+
+
+def progress_message(description, done, succeeded, total, elapsed):
+    message = description + " progress: " + str(done)
+    if total:
+        message += " / " + str(total) + " ({:.1f}%)".format(done / total * 100)
+    message += (
+        ", failed: "
+        + str(done - succeeded)
+        + ", rate: "
+        + "{:.2f}/s".format(done / elapsed if elapsed > 0 else 0.0)
+    )
+    return message
+
+
+class _TestWorkerPool(TestCase):
+    def setUp(self):
+        test_setup()
+
+    def test_every_key_handled_once_on_caller_thread(self):
+        handled = []
+        caller = threading.current_thread()
+
+        def handle_result(key, result):
+            self.assertIs(threading.current_thread(), caller)
+            handled.append((key, result))
+
+        succeeded = process_in_pool(
+            iter(range(50)),
+            4,
+            setup_worker=lambda worker_index: worker_index,
+            process_key=lambda state, key: key * 2,
+            handle_result=handle_result,
+            total=50,
+        )
+        self.assertEqual(succeeded, 50)
+        self.assertEqual(sorted(handled), [(key, key * 2) for key in range(50)])
+
+    def test_failed_keys_reported_as_none(self):
+        handled = {}
+
+        def process_key(state, key):
+            if key % 5 == 0:
+                raise RuntimeError("Scrape failure.")
+            return key
+
+        succeeded = process_in_pool(
+            range(20),
+            3,
+            setup_worker=lambda worker_index: None,
+            process_key=process_key,
+            handle_result=handled.__setitem__,
+        )
+        self.assertEqual(succeeded, 16)
+        self.assertEqual(len(handled), 20)
+        self.assertIsNone(handled[10])
+
+    def test_stream_results(self):
+        handled = []
+
+        def process_key(state, key):
+            for part in range(3):
+                if key == 2 and part == 1:
+                    raise RuntimeError("Scrape failure.")
+                yield part
+
+        succeeded = process_in_pool(
+            range(4),
+            2,
+            setup_worker=lambda worker_index: None,
+            process_key=process_key,
+            handle_result=lambda key, result: handled.append((key, result)),
+            stream=True,
+        )
+        self.assertEqual(succeeded, 10)
+        self.assertEqual(
+            sorted(handled, key=str),
+            sorted(
+                [(key, part) for key in [0, 1, 3] for part in range(3)]
+                + [(2, 0), (2, None)],
+                key=str,
+            ),
+        )
+
+    def test_result_outcome(self):
+        def process_key(state, key):
+            yield "item", key
+            yield "item", None
+            yield "marker", None
+
+        succeeded = process_in_pool(
+            range(4),
+            2,
+            setup_worker=lambda worker_index: None,
+            process_key=process_key,
+            handle_result=lambda key, result: None,
+            stream=True,
+            result_outcome=lambda result: (
+                None if result[0] == "marker" else result[1] is not None
+            ),
+        )
+        self.assertEqual(succeeded, 4)
+
+    def test_teardown_and_stop_on_writer_error(self):
+        torn_down = []
+
+        def handle_result(key, result):
+            raise IOError("Disk full.")
+
+        with self.assertRaises(IOError):
+            process_in_pool(
+                range(1000),
+                2,
+                setup_worker=lambda worker_index: worker_index,
+                process_key=lambda state, key: key,
+                handle_result=handle_result,
+                teardown_worker=torn_down.append,
+            )
+        self.assertEqual(sorted(torn_down), [0, 1])
+
+    def test_all_workers_fail_setup(self):
+        def setup_worker(worker_index):
+            raise RuntimeError("No browser.")
+
+        succeeded = process_in_pool(
+            range(1000),
+            2,
+            setup_worker=setup_worker,
+            process_key=lambda state, key: key,
+            handle_result=lambda key, result: None,
+        )
+        self.assertEqual(succeeded, 0)
@@ -0,0 +1,266 @@
+from collections import defaultdict
+import time
+from typing import Callable, Optional
+from unittest import TestCase
+
+from selenium.common.exceptions import (
+    NoSuchElementException,
+    StaleElementReferenceException,
+    TimeoutException,
+)
+
+import logger
+from logger import Level
+from test_utils import test_setup
+
+# Polled conditions treat these as "not yet" rather than failures, the DOM is mid update.
+_TRANSIENT_EXCEPTIONS = (NoSuchElementException, StaleElementReferenceException)
+
+# Resources requested so far plus any jQuery ajax calls still open.
+_NETWORK_STATE_SCRIPT = """
+return [
+    document.readyState,
+    performance.getEntriesByType('resource').length,
+    window.jQuery ? window.jQuery.active : 0
+];
+"""
+
+
+class WaitRecorder:
+    """
+    How long each named wait actually took, to tune timeouts from real crawls.
+    """
+
+    def __init__(self):
+        self.durations = defaultdict(list)
+        self.timeouts = defaultdict(int)
+
+    def record(self, description, duration, timed_out=False):
+        self.durations[description].append(duration)
+        if timed_out:
+            self.timeouts[description] += 1
+
+    def summary(self):
+        lines = []
+        for description, durations in sorted(self.durations.items()):
+            lines.append(
+                "{description}: {count} waits, avg {avg:.2f}s, max {max:.2f}s, {timeouts} timeouts".format(
+                    description=description,
+                    count=len(durations),
+                    avg=sum(durations) / len(durations),
+                    max=max(durations),
+                    timeouts=self.timeouts[description],
+                )
+            )
+        return "\n".join(lines)
+
+
+def wait_for(
+    condition: Callable[[], object],
+    timeout=10.0,
+    description="condition",
+    recorder: Optional[WaitRecorder] = None,
+    initial_poll=0.05,
+    max_poll=0.5,
+    backoff=1.5,
+):
+    """
+    Polls condition() until it returns a truthy value and returns that value. The poll
+    interval starts at initial_poll and grows by backoff up to max_poll. Raises selenium's
+    TimeoutException once timeout seconds have passed.
+    """
+    start = time.monotonic()
+    poll = initial_poll
+    while True:
+        try:
+            value = condition()
+        except _TRANSIENT_EXCEPTIONS:
+            value = None
+        elapsed = time.monotonic() - start
+        if value:
+            if recorder is not None:
+                recorder.record(description, elapsed)
+            return value
+        if elapsed >= timeout:
+            if recorder is not None:
+                recorder.record(description, elapsed, timed_out=True)
+            raise TimeoutException(
+                "Timed out after {:.1f}s waiting for: {}".format(elapsed, description)
+            )
+        time.sleep(min(poll, max(timeout - elapsed, 0)))
+        poll = min(poll * backoff, max_poll)
+
+
+def stable(value: Callable[[], object], stable_for=0.5):
+    """
+    Condition that is met once value() has returned the same thing for stable_for seconds.
+    """
+    last_value = None
+    since = None
+
+    def condition():
+        nonlocal last_value, since
+        current = value()
+        now = time.monotonic()
+        if since is None or current != last_value:
+            last_value = current
+            since = now
+            return False
+        return now - since >= stable_for
+
+    return condition
+
+
+class Waiter:
+    def __init__(self, driver, timeout=10.0, recorder: Optional[WaitRecorder] = None):
+        self.driver = driver
+        self.timeout = timeout
+        self.recorder = recorder if recorder is not None else WaitRecorder()
+
+    def until(self, condition, description, timeout=None):
+        return wait_for(
+            condition,
+            timeout=self.timeout if timeout is None else timeout,
+            description=description,
+            recorder=self.recorder,
+        )
+
+    def element_present(self, xpath, timeout=None):
+        return self.until(
+            lambda: self.driver.find_element_by_xpath(xpath),
+            "present " + xpath,
+            timeout,
+        )
+
+    def element_clickable(self, xpath, timeout=None):
+        def clickable():
+            element = self.driver.find_element_by_xpath(xpath)
+            if element.is_displayed() and element.is_enabled():
+                return element
+            return None
+
+        return self.until(clickable, "clickable " + xpath, timeout)
+
+    def elements_present(self, xpath, count=1, timeout=None):
+        def present():
+            elements = self.driver.find_elements_by_xpath(xpath)
+            return elements if len(elements) >= count else None
+
+        return self.until(present, "present " + str(count) + " " + xpath, timeout)
+
+    def count_stable(self, xpath, stable_for=0.5, minimum=1, timeout=None):
+        """
+        Waits until at least minimum elements match xpath and their count stopped changing.
+        """
+        count = stable(
+            lambda: len(self.driver.find_elements_by_xpath(xpath)), stable_for
+        )
+
+        def settled():
+            return count() and len(self.driver.find_elements_by_xpath(xpath)) >= minimum
+
+        self.until(settled, "stable count " + xpath, timeout)
+        return self.driver.find_elements_by_xpath(xpath)
+
+    def network_idle(self, idle_for=0.5, timeout=None):
+        """
+        Waits until the document is loaded, no jQuery ajax call is open and no new resource
+        has been requested for idle_for seconds.
+        """
+        network_state = stable(
+            lambda: tuple(self.driver.execute_script(_NETWORK_STATE_SCRIPT)), idle_for
+        )
+
+        def idle():
+            if not network_state():
+                return False
+            ready_state, _, open_requests = self.driver.execute_script(
+                _NETWORK_STATE_SCRIPT
+            )
+            return ready_state == "complete" and open_requests == 0
+
+        return self.until(idle, "network idle", timeout)
+
+    def log_summary(self, level=Level.DETAIL):
+        logger.get_logger().log("Wait times:\n" + self.recorder.summary(), level)
+
+
+class _FakeElement:
+    def __init__(self, displayed=True):
+        self.displayed = displayed
+
+    def is_displayed(self):
+        return self.displayed
+
+    def is_enabled(self):
+        return True
+
+
+class _FakeDriver:
+    """
+    Elements appear one poll at a time until target_count is reached.
+    """
+
+    def __init__(self, target_count=3, visible_after=0):
+        self.target_count = target_count
+        self.visible_after = visible_after
+        self.polls = 0
+
+    def find_elements_by_xpath(self, xpath):
+        self.polls += 1
+        return [_FakeElement()] * min(self.polls, self.target_count)
+
+    def find_element_by_xpath(self, xpath):
+        self.polls += 1
+        if self.polls <= self.visible_after:
+            raise NoSuchElementException(xpath)
+        return _FakeElement(displayed=self.polls > self.visible_after + 1)
+
+
+class _TestWaits(TestCase):
+    def setUp(self):
+        test_setup()
+
+    def test_wait_for_returns_value(self):
+        calls = []
+
+        def condition():
+            calls.append(1)
+            return "ready" if len(calls) >= 3 else None
+
+        recorder = WaitRecorder()
+        self.assertEqual(
+            wait_for(condition, timeout=1, recorder=recorder, description="ready"),
+            "ready",
+        )
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(len(recorder.durations["ready"]), 1)
+
+    def test_wait_for_timeout_recorded(self):
+        recorder = WaitRecorder()
+        with self.assertRaises(TimeoutException):
+            wait_for(lambda: False, timeout=0.1, recorder=recorder, description="never")
+        self.assertEqual(recorder.timeouts["never"], 1)
+
+    def test_poll_backoff(self):
+        poll_times = []
+
+        def condition():
+            poll_times.append(time.monotonic())
+            return len(poll_times) >= 5
+
+        wait_for(condition, timeout=5, initial_poll=0.01, backoff=2, max_poll=1)
+        gaps = [b - a for a, b in zip(poll_times, poll_times[1:])]
+        self.assertGreater(gaps[-1], gaps[0])
+
+    def test_element_clickable_waits_for_visibility(self):
+        driver = _FakeDriver(visible_after=2)
+        waiter = Waiter(driver, timeout=2)
+        element = waiter.element_clickable("//button")
+        self.assertTrue(element.is_displayed())
+        self.assertEqual(driver.polls, 4)
+
+    def test_count_stable(self):
+        driver = _FakeDriver(target_count=3)
+        waiter = Waiter(driver, timeout=2)
+        self.assertEqual(len(waiter.count_stable("//div", stable_for=0.05)), 3)